@@ -0,0 +1,6 @@
+"""Micro-benchmarks for hot paths. Run each from the repo root, e.g.
+
+    python -m bench.pending
+
+They print timings only; nothing here runs as part of the bot.
+"""
@@ -0,0 +1,24 @@
+"""Small timing helpers shared by the benchmarks."""
+
+import time
+from typing import Callable
+
+
+def best_of(func: Callable[[], object], repeat: int = 5, number: int = 1) -> float:
+    """Best wall time of ``number`` calls to func, in seconds per call."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def fmt(seconds: float) -> str:
+    """Format a duration with a sensible unit."""
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.1f} ms"
+    return f"{seconds:.2f} s"
@@ -0,0 +1,114 @@
+"""Cost of the approved-user check against the number of approved users.
+
+Columns, with the sender's ID in the worst position (last):
+- list scan: ``sender_id in config.telegram.approved_users`` (the old check)
+- frozenset: the per-snapshot set AuthMiddleware uses now
+- allowlist: ``sender_id in Allowlist`` (one os.stat plus a set lookup)
+- middleware: a full AuthMiddleware call for an approved message
+
+Below the table: the config reload the old CLI forced on every approval,
+against one append to the allowlist file.
+
+    python -m bench.auth
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from aiogram.types import Chat, Message, User
+
+from bench._timing import best_of, fmt
+from bot.allowlist import Allowlist
+from bot.config import ConfigProvider
+from bot.middleware.auth import AuthMiddleware
+
+SIZES = (10, 1_000, 10_000, 100_000)
+CALLS = 1000
+
+
+def _write_config(path: Path, approved: list[int]) -> None:
+    path.write_text(json.dumps({
+        "telegram": {"bot_token": "0:bench", "approved_users": approved},
+        "agent_zero": {"api_key": "bench"},
+    }))
+
+
+def _message(user_id: int) -> Message:
+    return Message(
+        message_id=1,
+        date=0,
+        chat=Chat(id=user_id, type="private"),
+        from_user=User(id=user_id, is_bot=False, first_name="bench"),
+        text="hello",
+    )
+
+
+def _time_middleware(config_path: Path, sender: int) -> float:
+    middleware = AuthMiddleware()
+    provider = ConfigProvider(config_path)
+    data = {"config_provider": provider, "state_manager": None, "config": provider.get()}
+    event = _message(sender)
+
+    async def _handler(event, data):
+        return None
+
+    async def _calls() -> None:
+        for _ in range(CALLS):
+            await middleware(_handler, event, data)
+
+    def _run() -> None:
+        asyncio.run(_calls())
+
+    return best_of(_run) / CALLS
+
+
+def main() -> None:
+    print(f"{'users':>7}  {'list scan':>10}  {'frozenset':>10}  {'allowlist':>10}  {'middleware':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in SIZES:
+            approved = list(range(1_000_000, 1_000_000 + size))
+            sender = approved[-1]
+            as_set = frozenset(approved)
+
+            allowlist_path = Path(tmp) / f"allowlist-{size}.txt"
+            allowlist_path.write_text("".join(f"+{user_id}\n" for user_id in approved))
+            allowlist = Allowlist(allowlist_path)
+            assert sender in allowlist
+
+            config_path = Path(tmp) / f"config-{size}.json"
+            _write_config(config_path, approved)
+
+            print(
+                f"{size:>7}  "
+                f"{fmt(best_of(lambda: sender in approved, number=CALLS)):>10}  "
+                f"{fmt(best_of(lambda: sender in as_set, number=CALLS)):>10}  "
+                f"{fmt(best_of(lambda: sender in allowlist, number=CALLS)):>10}  "
+                f"{fmt(_time_middleware(config_path, sender)):>10}"
+            )
+
+        size = SIZES[-1]
+        config_path = Path(tmp) / f"config-{size}.json"
+        provider = ConfigProvider(config_path)
+        provider.get()
+        os.utime(config_path, ns=(time.time_ns(), time.time_ns()))
+        reload_cost = best_of(lambda: provider.get(), repeat=1)
+
+        allowlist = Allowlist(Path(tmp) / f"allowlist-{size}.txt")
+        allowlist.refresh()
+        with open(allowlist.path, "a", encoding="utf-8") as f:
+            f.write("+42\n")
+        start = time.perf_counter()
+        assert 42 in allowlist
+        append_cost = time.perf_counter() - start
+
+        print()
+        print(f"approve with {size} users: config reload {fmt(reload_cost)}, "
+              f"allowlist append picked up in {fmt(append_cost)}")
+
+
+if __name__ == "__main__":
+    main()
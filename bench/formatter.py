@@ -0,0 +1,42 @@
+"""Markdown formatter throughput on 10 KB, 100 KB and 1 MB responses.
+
+Documents are built by repeating the agent-style responses of the golden
+corpus (tests/golden/agent_response_*.md) up to each size.
+
+    python -m bench.formatter
+"""
+
+from pathlib import Path
+
+from bench._timing import best_of, fmt
+from bot.formatters import format_response, iter_format_response
+
+GOLDEN = Path(__file__).resolve().parent.parent / "tests" / "golden"
+SIZES = (10_000, 100_000, 1_000_000)
+
+
+def make_response(size: int) -> str:
+    """Concatenate golden agent responses until the text is ``size`` chars."""
+    pieces = [p.read_text(encoding="utf-8") for p in sorted(GOLDEN.glob("agent_response_*.md"))]
+    parts: list[str] = []
+    total = 0
+    while total < size:
+        piece = pieces[len(parts) % len(pieces)]
+        parts.append(piece)
+        total += len(piece) + 2
+    return "\n\n".join(parts)[:size]
+
+
+def main() -> None:
+    print(f"{'size':>9}  {'chunks':>6}  {'format_response':>15}  {'first chunk':>11}")
+    for size in SIZES:
+        text = make_response(size)
+        chunks = len(format_response(text))
+        repeat = 5 if size < 1_000_000 else 3
+        total = best_of(lambda: format_response(text), repeat=repeat)
+        first = best_of(lambda: next(iter_format_response(text)), repeat=repeat)
+        print(f"{size:>9}  {chunks:>6}  {fmt(total):>15}  {fmt(first):>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Incremental vs. full re-formatting of a streamed response.
+
+A response is cut into 1-7 character tokens and delivered ten tokens per
+update, like a streaming A0 answer. For each update the old approach runs
+format_response() on everything received so far; IncrementalFormatter
+only renders what changed. For 200 KB the full re-format is timed on
+every 20th update and extrapolated.
+
+    python -m bench.incremental
+"""
+
+import random
+import time
+
+from bench._timing import fmt
+from bench.formatter import make_response
+from bot.formatters import IncrementalFormatter, format_response
+
+RUNS = ((10_000, 1), (50_000, 1), (200_000, 20))
+
+
+def _updates(text: str, seed: int = 1) -> list[str]:
+    rnd = random.Random(seed)
+    tokens: list[str] = []
+    pos = 0
+    while pos < len(text):
+        size = rnd.randint(1, 7)
+        tokens.append(text[pos:pos + size])
+        pos += size
+    return ["".join(tokens[i:i + 10]) for i in range(0, len(tokens), 10)]
+
+
+def main() -> None:
+    print(f"{'size':>9}  {'updates':>7}  {'full re-format':>14}  {'worst':>8}  {'incremental':>11}  {'worst':>8}")
+    for size, sample in RUNS:
+        text = make_response(size)
+        updates = _updates(text)
+
+        formatter = IncrementalFormatter()
+        chunks: list[str] = []
+        worst_incremental = 0.0
+        started = time.perf_counter()
+        for update in updates:
+            t = time.perf_counter()
+            final, _ = formatter.feed(update)
+            chunks.extend(final)
+            worst_incremental = max(worst_incremental, time.perf_counter() - t)
+        chunks.extend(formatter.finish())
+        incremental = time.perf_counter() - started
+        assert chunks == format_response(text)
+
+        received = ""
+        full = worst_full = 0.0
+        for i, update in enumerate(updates):
+            received += update
+            if i % sample == 0:
+                t = time.perf_counter()
+                format_response(received)
+                elapsed = time.perf_counter() - t
+                full += elapsed * sample
+                worst_full = max(worst_full, elapsed)
+
+        print(
+            f"{size:>9}  {len(updates):>7}  {fmt(full):>14}  {fmt(worst_full):>8}  "
+            f"{fmt(incremental):>11}  {fmt(worst_incremental):>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Per-update cost of the pending-verification checks.
+
+Every unapproved update runs cleanup_expired() plus
+get_pending_for_user(). With the user index and expiry heap this should
+stay flat as the number of pending codes grows.
+
+    python -m bench.pending
+"""
+
+import tempfile
+from pathlib import Path
+
+from bench._timing import best_of, fmt
+from bot.state import StateManager
+
+
+class _MemoryStateManager(StateManager):
+    """StateManager that never touches disk, to time the in-memory work."""
+
+    def _persist(self, op, record) -> None:
+        self._writes_requested += 1
+
+
+def main() -> None:
+    print(f"{'pending':>8}  per update (cleanup_expired + get_pending_for_user)")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in (10, 1_000, 100_000):
+            sm = _MemoryStateManager(Path(tmp) / "state.json")
+            for i in range(count):
+                sm.add_pending(code=f"C{i:06d}", user_id=i)
+            probe = count // 2
+
+            def _update() -> None:
+                sm.cleanup_expired(max_age_minutes=10)
+                sm.get_pending_for_user(probe, max_age_minutes=10)
+
+            print(f"{count:>8}  {fmt(best_of(_update, number=1000))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Per-mutation latency of the state backends.
+
+Times set_user_context() with N users already in state. The json backend
+rewrites the whole file on every change, the journal appends one line
+and sqlite runs one small transaction. Each runs without an event loop
+(synchronous persistence), so the numbers are the full cost of a write.
+
+    python -m bench.state_backends
+"""
+
+import tempfile
+from pathlib import Path
+
+from bench._timing import best_of, fmt
+from bot.state import StateManager
+from bot.state_journal import JournalStateManager
+from bot.state_sqlite import SqliteStateManager
+
+BACKENDS = {
+    "json": lambda path: StateManager(path),
+    "journal": lambda path: JournalStateManager(path, max_journal_bytes=1 << 40),
+    "sqlite": lambda path: SqliteStateManager(path),
+}
+
+
+def _populate(sm: StateManager, users: int) -> None:
+    """Load N users without timing it (one bulk save)."""
+    for user_id in range(users):
+        sm._apply_set_user_context(user_id, f"ctx-{user_id}", None)
+
+
+def main() -> None:
+    print(f"{'users':>6}" + "".join(f"{name:>14}" for name in BACKENDS))
+    for users in (10, 1_000, 10_000):
+        row = f"{users:>6}"
+        for name, factory in BACKENDS.items():
+            with tempfile.TemporaryDirectory() as tmp:
+                sm = factory(Path(tmp) / "state.db")
+                sm.load()
+                if isinstance(sm, SqliteStateManager):
+                    for user_id in range(users):
+                        sm.set_user_context(user_id, f"ctx-{user_id}")
+                else:
+                    _populate(sm, users)
+                    sm.save()
+                counter = iter(range(10**9))
+
+                def _mutate() -> None:
+                    sm.set_user_context(next(counter) % users, "ctx-new")
+
+                number = 20 if name == "json" and users >= 1_000 else 200
+                row += f"{fmt(best_of(_mutate, repeat=3, number=number)):>14}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
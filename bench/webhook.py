@@ -0,0 +1,105 @@
+"""Ack latency and throughput of the webhook server under load.
+
+POSTs synthetic message updates to a local WebhookServer, from 1, 10 and
+50 concurrent senders, and reports updates/s plus the ack latency seen
+by the sender (p50, p99, max). Every update is handled by a stand-in for
+an A0 round-trip that sleeps HANDLER_SECONDS, so the numbers show that
+acknowledging an update does not wait for its handler.
+
+    python -m bench.webhook
+"""
+
+import asyncio
+import itertools
+import time
+
+import aiohttp
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message
+from aiohttp import web
+
+from bench._timing import fmt
+from bot.config import WebhookConfig
+from bot.webhook import WebhookServer
+
+UPDATES = 2_000
+HANDLER_SECONDS = 0.5
+SECRET = "bench-secret"
+
+
+def _update(update_id: int) -> dict:
+    user_id = 1_000 + update_id % 50
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "bench"},
+            "text": f"question {update_id}",
+        },
+    }
+
+
+async def _load(url: str, concurrency: int, ids: "itertools.count[int]") -> tuple[float, list[float]]:
+    """Send UPDATES updates from ``concurrency`` senders; return wall time and ack latencies."""
+    latencies: list[float] = []
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+    remaining = iter(range(UPDATES))
+
+    async with aiohttp.ClientSession(headers=headers) as session:
+        async def _sender() -> None:
+            for _ in remaining:
+                started = time.perf_counter()
+                async with session.post(url, json=_update(next(ids))) as resp:
+                    await resp.read()
+                    resp.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(_sender() for _ in range(concurrency)))
+        return time.perf_counter() - started, latencies
+
+
+async def _run() -> None:
+    dispatcher = Dispatcher()
+
+    @dispatcher.message()
+    async def _handle(message: Message) -> None:
+        await asyncio.sleep(HANDLER_SECONDS)
+
+    bot = Bot("123456:bench")
+    config = WebhookConfig(host="127.0.0.1", port=0, secret_token=SECRET)
+    server = WebhookServer(dispatcher, bot, config)
+    runner = web.AppRunner(server.build_app())
+    await runner.setup()
+    site = web.TCPSite(runner, config.host, config.port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f"http://{config.host}:{port}{config.path}"
+
+    ids = itertools.count(1)
+    print(f"{UPDATES} updates per row, handler takes {fmt(HANDLER_SECONDS)}")
+    print(f"{'senders':>8}{'updates/s':>12}{'ack p50':>12}{'ack p99':>12}{'ack max':>12}")
+    try:
+        for concurrency in (1, 10, 50):
+            elapsed, latencies = await _load(url, concurrency, ids)
+            latencies.sort()
+            print(
+                f"{concurrency:>8}{UPDATES / elapsed:>12.0f}"
+                f"{fmt(latencies[len(latencies) // 2]):>12}"
+                f"{fmt(latencies[int(len(latencies) * 0.99)]):>12}"
+                f"{fmt(latencies[-1]):>12}"
+            )
+        print(f"server: {server.stats}")
+    finally:
+        await runner.cleanup()
+        await bot.session.close()
+
+
+def main() -> None:
+    asyncio.run(_run())
+
+
+if __name__ == "__main__":
+    main()
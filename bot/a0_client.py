@@ -6,6 +6,8 @@ creation, and custom exception types.
 
 import asyncio
 import logging
+import random
+import time
 from typing import Any
 
 import aiohttp
@@ -22,7 +24,20 @@ class A0Error(Exception):
 
 
 class A0ConnectionError(A0Error):
-    """Raised when the A0 server is unreachable."""
+    """Raised when the A0 server is unreachable.
+
+    Attributes:
+        connect_failed: True if the failure happened while connecting, i.e.
+            the request never reached A0 and is safe to retry.
+    """
+
+    def __init__(self, message: str = "", connect_failed: bool = False) -> None:
+        self.connect_failed = connect_failed
+        super().__init__(message)
+
+
+class A0CircuitOpenError(A0ConnectionError):
+    """Raised without contacting A0 while the circuit breaker is open."""
 
 
 class A0TimeoutError(A0Error):
@@ -43,6 +58,97 @@ class A0APIError(A0Error):
         super().__init__(f"A0 API error {status}: {body[:200]}")
 
 
+# ------------------------------------------------------------------
+# Circuit Breaker
+# ------------------------------------------------------------------
+
+class CircuitBreaker:
+    """Fail fast while A0 is down instead of waiting out every connect.
+
+    States:
+    - closed: requests flow; consecutive failures are counted.
+    - open: after ``failure_threshold`` consecutive failures, requests fail
+      immediately for ``reset_timeout`` seconds.
+    - half_open: after the timeout, one probe request is let through;
+      success closes the breaker, failure re-opens it.
+
+    Only reachability failures count (connect errors and retryable
+    statuses); slow responses and application errors prove A0 is up.
+
+    Args:
+        failure_threshold: Consecutive failures that open the breaker (0 = never).
+        reset_timeout: Seconds to stay open before probing.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.opens = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        """Current state, moving open → half_open once the timeout has passed."""
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self._reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def before_request(self) -> bool:
+        """Admit a request or raise A0CircuitOpenError.
+
+        Returns:
+            True if the request is the half-open probe; the caller must
+            call ``release_probe()`` once it ends, however it ends.
+        """
+        state = self.state
+        if state == self.CLOSED:
+            return False
+        if state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            logger.info("A0 circuit breaker half-open — sending probe request")
+            return True
+        self.rejected += 1
+        raise A0CircuitOpenError("Agent Zero circuit breaker is open", connect_failed=True)
+
+    def release_probe(self) -> None:
+        """Let the next request probe; called when the probe request ends."""
+        self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        """A0 answered — close the breaker."""
+        if self._state != self.CLOSED:
+            logger.info("A0 circuit breaker closed")
+        self._state = self.CLOSED
+        self._failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """A0 was unreachable — count it and open the breaker if needed."""
+        self._failures += 1
+        self._probe_in_flight = False
+        if not self._failure_threshold:
+            return
+        if self._state == self.HALF_OPEN or (
+            self._state == self.CLOSED and self._failures >= self._failure_threshold
+        ):
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+            self.opens += 1
+            logger.warning(
+                "A0 circuit breaker opened after %d failure(s); failing fast for %.0fs",
+                self._failures, self._reset_timeout,
+            )
+
+
 # ------------------------------------------------------------------
 # Client
 # ------------------------------------------------------------------
@@ -51,58 +157,235 @@ class A0Client:
     """Async HTTP client for Agent Zero API endpoints.
 
     Uses lazy session creation — the aiohttp.ClientSession is created
-    on the first API call, not at instantiation time.
+    on the first API call, not at instantiation time. The session owns a
+    tuned connector (keep-alive, DNS cache, pool limits, or a Unix socket)
+    that every A0 request, health checks included, goes through.
 
     Args:
         base_url: The A0 server base URL (e.g. "http://agent-zero:80").
         api_key: The API key for X-API-KEY authentication.
         timeout: Request timeout in seconds (None/0 = no timeout, wait indefinitely).
+        connect_timeout: Seconds to wait for a connection to be established
+            (None/0 = bounded only by ``timeout``). A request that times out
+            while connecting never reached A0, so it is retried.
+        connection_limit: Total connection pool size (0 = unlimited).
+        connection_limit_per_host: Per-host connection limit (0 = unlimited).
+        keepalive_timeout: Seconds an idle connection is kept for reuse.
+        dns_cache_ttl: Seconds resolved addresses are cached (None = forever).
+        unix_socket: Connect through this Unix-domain socket instead of TCP.
+        retries: Extra attempts for connect failures and retryable statuses.
+        retry_backoff: Base delay in seconds for jittered exponential backoff.
+        retry_backoff_max: Upper bound in seconds for a single backoff delay.
+        retry_statuses: HTTP statuses that mean A0 did not process the
+            request. Leave 504 out: a gateway timeout can arrive after A0
+            started working, and /api_message is not idempotent.
+        breaker_threshold: Consecutive failures that open the circuit breaker
+            (0 = disabled).
+        breaker_reset_timeout: Seconds the breaker stays open before probing.
     """
 
-    def __init__(self, base_url: str, api_key: str, timeout: int | None = None) -> None:
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        timeout: int | None = None,
+        connect_timeout: float | None = 10.0,
+        connection_limit: int = 100,
+        connection_limit_per_host: int = 0,
+        keepalive_timeout: float = 30.0,
+        dns_cache_ttl: int | None = 300,
+        unix_socket: str | None = None,
+        retries: int = 2,
+        retry_backoff: float = 0.25,
+        retry_backoff_max: float = 5.0,
+        retry_statuses: tuple[int, ...] = (502, 503),
+        breaker_threshold: int = 5,
+        breaker_reset_timeout: float = 30.0,
+    ) -> None:
         self._base_url = base_url.rstrip("/")
         self._api_key = api_key
+        self._connect_timeout = connect_timeout if connect_timeout and connect_timeout > 0 else None
         # Handle None/0/negative as "no timeout" (wait indefinitely)
         if timeout is None or timeout <= 0:
-            self._timeout = aiohttp.ClientTimeout(total=None)
+            self._timeout = self._client_timeout(None)
         else:
-            self._timeout = aiohttp.ClientTimeout(total=timeout)
+            self._timeout = self._client_timeout(timeout)
+        self._connection_limit = connection_limit
+        self._connection_limit_per_host = connection_limit_per_host
+        self._keepalive_timeout = keepalive_timeout
+        self._dns_cache_ttl = dns_cache_ttl
+        self._unix_socket = unix_socket
+        self._retries = max(retries, 0)
+        self._retry_backoff = retry_backoff
+        self._retry_backoff_max = retry_backoff_max
+        self._retry_statuses = frozenset(retry_statuses)
+        self._breaker = CircuitBreaker(breaker_threshold, breaker_reset_timeout)
+        self._retries_performed = 0
         self._session: aiohttp.ClientSession | None = None
+        self._requests = 0
+        self._connections_created = 0
+        self._connections_reused = 0
+
+    @property
+    def breaker_state(self) -> str:
+        """State of the circuit breaker: closed, open or half_open."""
+        return self._breaker.state
+
+    @property
+    def stats(self) -> dict[str, int | str]:
+        """Connection reuse, retry and circuit breaker counters."""
+        return {
+            "requests": self._requests,
+            "connections_created": self._connections_created,
+            "connections_reused": self._connections_reused,
+            "retries": self._retries_performed,
+            "breaker_state": self._breaker.state,
+            "breaker_opens": self._breaker.opens,
+            "breaker_rejected": self._breaker.rejected,
+        }
+
+    def _client_timeout(self, total: float | None) -> aiohttp.ClientTimeout:
+        """Build a timeout with the given total and the connect timeout."""
+        return aiohttp.ClientTimeout(total=total, sock_connect=self._connect_timeout)
+
+    def _build_connector(self) -> aiohttp.BaseConnector:
+        """Create the connector shared by every request of the session."""
+        if self._unix_socket:
+            return aiohttp.UnixConnector(
+                path=self._unix_socket,
+                limit=self._connection_limit,
+                limit_per_host=self._connection_limit_per_host,
+                keepalive_timeout=self._keepalive_timeout,
+            )
+        return aiohttp.TCPConnector(
+            limit=self._connection_limit,
+            limit_per_host=self._connection_limit_per_host,
+            keepalive_timeout=self._keepalive_timeout,
+            use_dns_cache=True,
+            ttl_dns_cache=self._dns_cache_ttl,
+        )
+
+    def _build_trace_config(self) -> aiohttp.TraceConfig:
+        """Count requests and new vs. reused connections."""
+        trace = aiohttp.TraceConfig()
+
+        async def _on_request_start(*_: Any) -> None:
+            self._requests += 1
+
+        async def _on_connection_create_end(*_: Any) -> None:
+            self._connections_created += 1
+
+        async def _on_connection_reuseconn(*_: Any) -> None:
+            self._connections_reused += 1
+
+        trace.on_request_start.append(_on_request_start)
+        trace.on_connection_create_end.append(_on_connection_create_end)
+        trace.on_connection_reuseconn.append(_on_connection_reuseconn)
+        return trace
 
     async def _get_session(self) -> aiohttp.ClientSession:
         """Return the existing session or lazily create one."""
         if self._session is None or self._session.closed:
             self._session = aiohttp.ClientSession(
+                connector=self._build_connector(),
                 headers={"X-API-KEY": self._api_key},
                 timeout=self._timeout,
+                trace_configs=[self._build_trace_config()],
+            )
+            logger.debug(
+                "Created new aiohttp session for A0 client (transport: %s)",
+                f"unix:{self._unix_socket}" if self._unix_socket else "tcp",
             )
-            logger.debug("Created new aiohttp session for A0 client")
         return self._session
 
     async def _request(
-        self, method: str, path: str, json_body: dict[str, Any] | None = None,
+        self,
+        method: str,
+        path: str,
+        json_body: dict[str, Any] | None = None,
+        timeout: aiohttp.ClientTimeout | None = None,
     ) -> dict[str, Any] | None:
-        """Send an HTTP request to A0 with error mapping.
+        """Send an HTTP request to A0 with retries and circuit breaking.
+
+        Connect failures and retryable statuses are retried with jittered
+        exponential backoff. A failed connect never reached A0; the
+        default statuses (502, 503) are what a proxy answers when A0 is
+        down or refuses work. Timeouts, 504 and other errors are not
+        retried, since A0 may already be processing the request.
 
         Args:
             method: HTTP method (GET, POST, etc.).
             path: API path (e.g. "/api_message").
             json_body: Optional JSON body.
+            timeout: Per-request timeout overriding the session's.
 
         Returns:
             Parsed JSON response dict, or None for empty responses.
 
         Raises:
+            A0CircuitOpenError: If the circuit breaker is open.
             A0ConnectionError: If the server is unreachable.
             A0TimeoutError: If the request times out.
             A0APIError: If the server returns a non-2xx status.
         """
+        attempt = 0
+        while True:
+            probe = self._breaker.before_request()
+            try:
+                result = await self._request_once(method, path, json_body, timeout)
+            except A0APIError as e:
+                if e.status not in self._retry_statuses:
+                    self._breaker.record_success()
+                    raise
+                self._breaker.record_failure()
+                error: A0Error = e
+            except A0ConnectionError as e:
+                self._breaker.record_failure()
+                if not e.connect_failed:
+                    raise
+                error = e
+            except A0TimeoutError:
+                # A0 accepted the request but is slow — it is reachable
+                self._breaker.record_success()
+                raise
+            else:
+                self._breaker.record_success()
+                return result
+            finally:
+                if probe:
+                    # A probe cancelled mid-flight must not block every later probe
+                    self._breaker.release_probe()
+
+            if attempt >= self._retries:
+                raise error
+            attempt += 1
+            self._retries_performed += 1
+            delay = random.uniform(
+                0, min(self._retry_backoff_max, self._retry_backoff * 2 ** (attempt - 1)),
+            )
+            logger.warning(
+                "A0 %s %s failed (%s) — retry %d/%d in %.2fs",
+                method, path, error, attempt, self._retries, delay,
+            )
+            await asyncio.sleep(delay)
+
+    async def _request_once(
+        self,
+        method: str,
+        path: str,
+        json_body: dict[str, Any] | None = None,
+        timeout: aiohttp.ClientTimeout | None = None,
+    ) -> dict[str, Any] | None:
+        """Send a single HTTP request to A0 with error mapping."""
         url = f"{self._base_url}{path}"
         session = await self._get_session()
+        kwargs: dict[str, Any] = {"json": json_body}
+        if timeout is not None:
+            kwargs["timeout"] = timeout
 
         try:
             logger.debug("A0 %s %s body=%s", method, url, json_body)
-            async with session.request(method, url, json=json_body) as resp:
+            async with session.request(method, url, **kwargs) as resp:
                 body_text = await resp.text()
 
                 if resp.status >= 400:
@@ -119,9 +402,11 @@ class A0Client:
 
         except A0APIError:
             raise
-        except aiohttp.ClientConnectorError as e:
+        except (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError) as e:
+            # ConnectionTimeoutError is also an asyncio.TimeoutError, but
+            # the request never reached A0
             logger.error("A0 connection error: %s", e)
-            raise A0ConnectionError(str(e)) from e
+            raise A0ConnectionError(str(e) or "Connection timed out", connect_failed=True) from e
         except asyncio.TimeoutError as e:
             logger.error("A0 request timed out: %s %s", method, url)
             raise A0TimeoutError(f"Request timed out: {method} {url}") from e
@@ -139,6 +424,7 @@ class A0Client:
         context_id: str | None = None,
         project_name: str | None = None,
         attachments: list[str] | None = None,
+        wait_forever: bool = False,
     ) -> dict[str, str]:
         """Send a message to Agent Zero.
 
@@ -147,6 +433,8 @@ class A0Client:
             context_id: Existing context/chat ID (omit to auto-create).
             project_name: Optional project name for the context.
             attachments: Optional list of attachment references.
+            wait_forever: Ignore the configured timeout and wait until A0
+                answers (used by detached jobs).
 
         Returns:
             Dict with "context_id" and "response" keys.
@@ -166,7 +454,10 @@ class A0Client:
             context_id or "<new>", project_name or "<default>", len(message),
         )
 
-        result = await self._request("POST", "/api_message", json_body=payload)
+        result = await self._request(
+            "POST", "/api_message", json_body=payload,
+            timeout=self._client_timeout(None) if wait_forever else None,
+        )
 
         if result is None:
             raise A0APIError(0, "Empty response from /api_message")
@@ -176,6 +467,69 @@ class A0Client:
             "response": result.get("response", ""),
         }
 
+    async def health_check(self, timeout: float = 5.0) -> int:
+        """Ping the A0 base URL through the shared connection pool.
+
+        Not subject to retries or the circuit breaker, but its outcome is
+        recorded by the breaker.
+
+        Args:
+            timeout: Seconds to wait for the response.
+
+        Returns:
+            The HTTP status code A0 answered with.
+
+        Raises:
+            A0ConnectionError: If the server is unreachable.
+            A0TimeoutError: If the server does not answer in time.
+        """
+        session = await self._get_session()
+        try:
+            async with session.get(
+                self._base_url, timeout=self._client_timeout(timeout),
+            ) as resp:
+                status = resp.status
+        except aiohttp.ConnectionTimeoutError as e:
+            self._breaker.record_failure()
+            raise A0ConnectionError(str(e) or "Connection timed out", connect_failed=True) from e
+        except asyncio.TimeoutError as e:
+            raise A0TimeoutError(f"Health check timed out: {self._base_url}") from e
+        except aiohttp.ClientError as e:
+            self._breaker.record_failure()
+            raise A0ConnectionError(str(e)) from e
+
+        # Health checks bypass the breaker but feed it, so /status can
+        # close an open breaker as soon as A0 is back.
+        if status in self._retry_statuses:
+            self._breaker.record_failure()
+        else:
+            self._breaker.record_success()
+        return status
+
+    async def get_log(
+        self, context_id: str, length: int = 1, timeout: float = 5.0,
+    ) -> dict[str, Any]:
+        """Fetch the latest log entries of a context (``/api_log_get``).
+
+        Used to follow a running request, so — like health checks — it is
+        neither retried nor subject to the circuit breaker.
+
+        Args:
+            context_id: The context/chat ID.
+            length: Number of most recent log items to return.
+            timeout: Seconds to wait for the response.
+
+        Returns:
+            The "log" object: ``progress``, ``progress_active``,
+            ``total_items`` and the latest ``items``.
+        """
+        result = await self._request_once(
+            "POST", "/api_log_get",
+            json_body={"context_id": context_id, "length": length},
+            timeout=self._client_timeout(timeout),
+        )
+        return (result or {}).get("log") or {}
+
     async def reset_chat(self, context_id: str) -> None:
         """Reset a chat's history in Agent Zero.
 
@@ -195,8 +549,8 @@ class A0Client:
         await self._request("POST", "/api_terminate_chat", json_body={"context_id": context_id})
 
     async def close(self) -> None:
-        """Close the underlying aiohttp session."""
+        """Close the underlying aiohttp session and its connection pool."""
         if self._session and not self._session.closed:
             await self._session.close()
-            logger.debug("A0 client session closed")
+            logger.debug("A0 client session closed (%s)", self.stats)
             self._session = None
@@ -0,0 +1,123 @@
+"""Burst aggregation of rapid consecutive messages.
+
+Telegram splits long pastes into several messages, and users often send
+quick follow-ups. Messages from the same user to the same conversation
+that arrive within a debounce window are merged, so Agent Zero gets a
+single request and the user a single answer.
+"""
+
+import asyncio
+import logging
+import time
+
+from aiogram.types import Message
+
+logger = logging.getLogger(__name__)
+
+# A burst is closed at the latest after this many windows, even if the
+# user keeps typing, so a steady stream of messages cannot stall forever.
+MAX_WINDOWS = 5
+
+# Telegram clients split a paste into messages of at most this many
+# UTF-16 code units, cutting at the last line or word break before the
+# limit — so a part that came out of a split is at least
+# CLIENT_SPLIT_LENGTH - CLIENT_SPLIT_SLACK long.
+CLIENT_SPLIT_LENGTH = 4096
+CLIENT_SPLIT_SLACK = 64
+
+
+class MessageAggregator:
+    """Merge messages per key that arrive within a sliding window.
+
+    Args:
+        window_ms: Debounce window in milliseconds (0 = disabled).
+    """
+
+    def __init__(self, window_ms: int = 0) -> None:
+        self._window = max(window_ms, 0) / 1000
+        self._bursts: dict[str, list[Message]] = {}
+        self._batches = 0
+        self._merged = 0
+        self._batch_max = 0
+
+    @property
+    def enabled(self) -> bool:
+        """True when a debounce window is configured."""
+        return self._window > 0
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Counters for answered batches and messages merged into them."""
+        return {
+            "open_bursts": len(self._bursts),
+            "batches": self._batches,
+            "merged": self._merged,
+            "batch_max": self._batch_max,
+        }
+
+    async def collect(self, key: str, message: Message) -> list[Message] | None:
+        """Add a message to its key's burst.
+
+        The first message of a burst waits until no new message has
+        arrived for one window (capped at MAX_WINDOWS windows) and gets
+        the whole burst back. Later messages of the same burst return None
+        — their text is answered as part of the first one.
+
+        Args:
+            key: Burst key (user and conversation).
+            message: The incoming message.
+
+        Returns:
+            The messages of the burst, in arrival order, or None.
+        """
+        if not self.enabled:
+            return [message]
+
+        burst = self._bursts.get(key)
+        if burst is not None:
+            burst.append(message)
+            return None
+
+        burst = self._bursts[key] = [message]
+        deadline = time.monotonic() + self._window * MAX_WINDOWS
+        try:
+            while True:
+                seen = len(burst)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(min(self._window, remaining))
+                if len(burst) == seen:
+                    break
+        finally:
+            del self._bursts[key]
+
+        self._batches += 1
+        self._merged += len(burst) - 1
+        self._batch_max = max(self._batch_max, len(burst))
+        if len(burst) > 1:
+            logger.info("Merged %d messages into one request (%s)", len(burst), key)
+        return burst
+
+
+def _was_split(text: str) -> bool:
+    """True if a message is long enough to be one part of a client split."""
+    return len(text.encode("utf-16-le")) // 2 >= CLIENT_SPLIT_LENGTH - CLIENT_SPLIT_SLACK
+
+
+def merge_texts(messages: list[Message]) -> str:
+    """Join the texts of a burst into one message for Agent Zero.
+
+    Clients cut a paste at a line or word break and Telegram trims each
+    part, so the break itself is lost: a message that filled a client
+    split is continued by the next one after a single space. Real
+    follow-ups start on a new line.
+    """
+    texts = [m.text for m in messages if m.text]
+    if not texts:
+        return ""
+    parts = [texts[0]]
+    for previous, text in zip(texts, texts[1:]):
+        parts.append(" " if _was_split(previous) else "\n")
+        parts.append(text)
+    return "".join(parts)
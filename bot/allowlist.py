@@ -0,0 +1,159 @@
+"""External allowlist of approved user IDs.
+
+An append-only text file, one entry per line:
+
+    +123456789    approve
+    -123456789    revoke
+    123456789     approve (the sign is optional)
+    # comment
+
+Later lines win, so approving or revoking is a single appended line and
+readers only have to parse what was appended since they last looked —
+config.json is neither rewritten nor re-validated. When the file is
+replaced (new inode) or truncated it is read again from the start.
+"""
+
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class Allowlist:
+    """Set of approved user IDs backed by an append-only file.
+
+    Membership checks cost one ``os.stat`` plus a set lookup; only lines
+    appended since the previous check are parsed.
+
+    Args:
+        path: Path to the allowlist file. A missing file is an empty list.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self._path = Path(path)
+        self._members: set[int] = set()
+        self._inode: int | None = None
+        self._offset = 0  # Bytes applied so far (always at a line boundary)
+        self._lines = 0
+        self._checks = 0
+        self._full_loads = 0
+        self._incremental_loads = 0
+
+    @property
+    def path(self) -> Path:
+        """The allowlist file."""
+        return self._path
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Members, file lines and reload counters."""
+        return {
+            "members": len(self._members),
+            "lines": self._lines,
+            "checks": self._checks,
+            "full_loads": self._full_loads,
+            "incremental_loads": self._incremental_loads,
+        }
+
+    def __contains__(self, user_id: int) -> bool:
+        self.refresh()
+        return user_id in self._members
+
+    def members(self) -> frozenset[int]:
+        """Return the current approved IDs."""
+        self.refresh()
+        return frozenset(self._members)
+
+    def refresh(self) -> None:
+        """Apply whatever changed in the file since the last call."""
+        self._checks += 1
+        try:
+            st = os.stat(self._path)
+        except OSError:
+            if self._inode is not None:
+                logger.warning("Allowlist %s disappeared, treating it as empty", self._path)
+                self._reset(None)
+            return
+
+        if st.st_ino != self._inode or st.st_size < self._offset:
+            self._reset(st.st_ino)
+            self._full_loads += 1
+        elif st.st_size == self._offset:
+            return
+        else:
+            self._incremental_loads += 1
+
+        with open(self._path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read(st.st_size - self._offset)
+        # Leave a partially written last line for the next call
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].decode("utf-8", errors="replace").splitlines():
+            self._apply(line)
+        self._offset += end
+
+    def _reset(self, inode: int | None) -> None:
+        """Forget everything read so far."""
+        self._members = set()
+        self._inode = inode
+        self._offset = 0
+        self._lines = 0
+
+    def _apply(self, line: str) -> None:
+        """Apply one line of the file."""
+        self._lines += 1
+        entry = line.strip()
+        if not entry or entry.startswith("#"):
+            return
+        try:
+            user_id = int(entry.lstrip("+-"))
+        except ValueError:
+            logger.warning("Ignoring invalid allowlist line in %s: %r", self._path, entry)
+            return
+        if entry.startswith("-"):
+            self._members.discard(user_id)
+        else:
+            self._members.add(user_id)
+
+    def add(self, user_id: int) -> None:
+        """Approve a user by appending ``+<id>``."""
+        self._append(f"+{user_id}\n")
+
+    def remove(self, user_id: int) -> None:
+        """Revoke a user by appending ``-<id>``."""
+        self._append(f"-{user_id}\n")
+
+    def _append(self, line: str) -> None:
+        """Append a line with a single O_APPEND write."""
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self._path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode("utf-8"))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def needs_compaction(self) -> bool:
+        """True when most lines of the file are superseded entries."""
+        self.refresh()
+        return self._lines > 2 * len(self._members) + 64
+
+    def compact(self) -> None:
+        """Atomically rewrite the file with one line per current member."""
+        members = sorted(self.members())
+        dir_ = self._path.parent
+        dir_.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=str(dir_), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.writelines(f"+{user_id}\n" for user_id in members)
+            os.replace(tmp_path, str(self._path))
+        except Exception:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        logger.info("Allowlist %s compacted to %d entries", self._path, len(members))
@@ -9,6 +9,8 @@ Usage:
     python -m bot.cli pending            — List all pending verifications
     python -m bot.cli users              — List all approved user IDs
     python -m bot.cli revoke <USER_ID>   — Revoke an approved user
+    python -m bot.cli migrate-state <STATE_JSON>
+                                         — Import a state.json into the sqlite backend
 """
 
 import argparse
@@ -19,8 +21,9 @@ import sys
 from datetime import datetime, timezone
 from pathlib import Path
 
+from bot.allowlist import Allowlist
 from bot.config import load as load_config, save as save_config, BotConfig
-from bot.state import StateManager
+from bot.state import StateManager, create_state_manager
 
 logger = logging.getLogger(__name__)
 
@@ -48,15 +51,35 @@ def get_paths() -> tuple[Path, Path]:
     return config_path, state_path
 
 
+def _allowlist(config: BotConfig) -> Allowlist | None:
+    """Return the configured approved_users_file allowlist, if any."""
+    path = config.telegram.approved_users_file
+    return Allowlist(path) if path else None
+
+
+def _approved_users(config: BotConfig) -> frozenset[int]:
+    """All approved user IDs: config.json plus the allowlist file."""
+    allowlist = _allowlist(config)
+    approved = frozenset(config.telegram.approved_users)
+    return approved | allowlist.members() if allowlist is not None else approved
+
+
+def _compact_if_needed(allowlist: Allowlist) -> None:
+    """Rewrite the allowlist once superseded lines dominate it."""
+    if allowlist.needs_compaction():
+        allowlist.compact()
+
+
 def cmd_approve(args: argparse.Namespace) -> None:
     """Approve a pending user by verification code.
 
-    Moves the user_id to config.approved_users, removes the pending
+    Appends the user_id to the approved_users_file allowlist when one is
+    configured (otherwise to config.approved_users), removes the pending
     verification, and optionally sends a Telegram notification.
     """
     config_path, state_path = get_paths()
     config = load_config(config_path)
-    state_manager = StateManager(state_path)
+    state_manager = create_state_manager(config, state_path)
     state_manager.load()
 
     code = args.code.upper()
@@ -82,21 +105,28 @@ def cmd_approve(args: argparse.Namespace) -> None:
     username = pending.username
 
     # Check if already approved (shouldn't happen, but be safe)
-    if user_id in config.telegram.approved_users:
+    if user_id in _approved_users(config):
         print("\u2139\ufe0f User {} (@{}) is already approved.".format(user_id, username or "unknown"))
         state_manager.remove_pending(code)
         sys.exit(0)
 
     # Add to approved users
-    config.telegram.approved_users.append(user_id)
-    save_config(config_path, config)
+    allowlist = _allowlist(config)
+    if allowlist is not None:
+        allowlist.add(user_id)
+        _compact_if_needed(allowlist)
+        target = str(allowlist.path)
+    else:
+        config.telegram.approved_users.append(user_id)
+        save_config(config_path, config)
+        target = "config.json approved_users"
 
     # Remove pending verification
     state_manager.remove_pending(code)
 
     print("\u2705 Approved user {} (@{})".format(user_id, username or "unknown"))
     print("   Code: {}".format(code))
-    print("   Added to config.json approved_users")
+    print("   Added to {}".format(target))
 
     # T-08: Send Telegram notification
     _send_approval_notification(config, user_id)
@@ -144,8 +174,8 @@ def _send_approval_notification(config: BotConfig, user_id: int) -> None:
 
 def cmd_pending(args: argparse.Namespace) -> None:
     """List all pending verifications with details."""
-    _, state_path = get_paths()
-    state_manager = StateManager(state_path)
+    config_path, state_path = get_paths()
+    state_manager = create_state_manager(load_config(config_path), state_path)
     state_manager.load()
 
     pending = state_manager.state.pending_verifications
@@ -180,11 +210,11 @@ def cmd_pending(args: argparse.Namespace) -> None:
 
 
 def cmd_users(args: argparse.Namespace) -> None:
-    """List all approved user IDs from config.json."""
+    """List all approved user IDs (config.json and the allowlist file)."""
     config_path, _ = get_paths()
     config = load_config(config_path)
 
-    users = config.telegram.approved_users
+    users = sorted(_approved_users(config))
     if not users:
         print("No approved users.")
         return
@@ -208,15 +238,53 @@ def cmd_revoke(args: argparse.Namespace) -> None:
         print("\u274c Invalid user ID: {} (must be an integer)".format(args.user_id))
         sys.exit(1)
 
-    if user_id not in config.telegram.approved_users:
+    if user_id not in _approved_users(config):
         print("\u274c User {} is not in the approved users list.".format(user_id))
         sys.exit(1)
 
-    config.telegram.approved_users.remove(user_id)
-    save_config(config_path, config)
-
     print("\u2705 Revoked user {}".format(user_id))
-    print("   Removed from config.json approved_users")
+    allowlist = _allowlist(config)
+    if allowlist is not None and user_id in allowlist:
+        allowlist.remove(user_id)
+        _compact_if_needed(allowlist)
+        print("   Removed from {}".format(allowlist.path))
+    if user_id in config.telegram.approved_users:
+        config.telegram.approved_users.remove(user_id)
+        save_config(config_path, config)
+        print("   Removed from config.json approved_users")
+
+
+def cmd_migrate_state(args: argparse.Namespace) -> None:
+    """Import an existing state.json into the configured sqlite database."""
+    from bot.state_sqlite import SqliteStateManager
+
+    config_path, state_path = get_paths()
+    config = load_config(config_path)
+    if config.state_backend != "sqlite":
+        print("\u274c state_backend is '{}' — set it to 'sqlite' first.".format(config.state_backend))
+        sys.exit(1)
+
+    source = Path(args.source)
+    if not source.exists():
+        print("\u274c Source state file not found: {}".format(source))
+        sys.exit(1)
+    if source.resolve() == state_path.resolve():
+        print("\u274c Source and target are the same file: {}".format(source))
+        sys.exit(1)
+
+    json_state = StateManager(source)
+    json_state.load()
+    state = json_state.state
+
+    target = SqliteStateManager(state_path)
+    target.load()
+    target.import_state(state)
+
+    print("\u2705 Imported {} into {}".format(source, state_path))
+    print("   Users: {}".format(len(state.users)))
+    print("   Chats: {}".format(sum(len(u.chats) for u in state.users.values())))
+    print("   Pending verifications: {}".format(len(state.pending_verifications)))
+    print("   Auto context: {}".format(state.auto_context_id or "-"))
 
 
 def build_parser() -> argparse.ArgumentParser:
@@ -269,6 +337,18 @@ def build_parser() -> argparse.ArgumentParser:
     )
     revoke_parser.set_defaults(func=cmd_revoke)
 
+    # migrate-state <STATE_JSON>
+    migrate_parser = subparsers.add_parser(
+        "migrate-state",
+        help="Import an existing state.json into the sqlite state backend",
+    )
+    migrate_parser.add_argument(
+        "source",
+        type=str,
+        help="Path to the state.json to import",
+    )
+    migrate_parser.set_defaults(func=cmd_migrate_state)
+
     return parser
 
 
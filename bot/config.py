@@ -8,9 +8,11 @@ import json
 import logging
 import os
 import tempfile
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Literal
 
-from pydantic import BaseModel, Field, computed_field
+from pydantic import BaseModel, Field, computed_field, model_validator
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +21,24 @@ class TelegramConfig(BaseModel):
     """Telegram bot configuration."""
     bot_token: str
     approved_users: list[int] = Field(default_factory=list)
+    approved_users_file: str | None = None  # Append-only allowlist (see bot.allowlist), merged in
     parse_mode: str = "HTML"
+    debounce_ms: int = 0  # Merge messages arriving within this window into one request (0 = off)
+    dedup_window: int = 1000  # Recent messages remembered to drop redeliveries (0 = off)
+
+    # Flood protection for unapproved senders (see bot.middleware.auth)
+    unapproved_rate: float = 0.2  # Updates per second accepted from one unapproved sender (0 = off)
+    unapproved_burst: int = 3  # Back-to-back updates allowed for a quiet unapproved sender
+    verification_rate: float = 1.0  # New verification codes issued per second (0 = unlimited)
+    verification_burst: int = 5  # Codes that may be issued back to back
+    max_pending_verifications: int = 100  # Outstanding codes before new senders are ignored
+
+    # Outbound pacing of sends/edits (see bot.middleware.outbound)
+    send_rate_global: float = 30.0  # Sends per second across all chats (0 = no pacing)
+    send_rate_per_chat: float = 1.0  # Sends per second per chat (0 = unlimited)
+    send_burst_per_chat: int = 1  # Back-to-back sends allowed for an idle chat
+    send_priority_max_length: int = 500  # Texts up to this length jump ahead of long chunks
+    send_retry_after_max: int = 3  # Retries after a 429 (retry_after is honoured)
 
 
 class AgentZeroConfig(BaseModel):
@@ -30,9 +49,36 @@ class AgentZeroConfig(BaseModel):
     default_project: str | None = None  # Deprecated: use fixed_project_name
     fixed_project_name: str | None = None  # All messages go to this project
     fixed_context_id: str | None = None  # If set, use this context; else auto-create
+    context_mode: Literal["shared", "per_user"] = "shared"  # per_user: one context per user
+    queue_max_depth: int = 10  # Messages allowed to wait per conversation (0 = unbounded)
+    max_in_flight: int = 8  # A0 calls running at once, shared fairly across users (0 = no cap)
+    user_backlog: int = 5  # Messages one user may have outstanding, queued or running (0 = unbounded)
     timeout: int | None = None  # Seconds to wait for A0 response. None = wait indefinitely
+    connect_timeout: float = 10.0  # Seconds to wait for a connection to A0 (0 = only timeout applies)
+    detached_jobs: bool = False  # Run requests as persisted background jobs (no timeout)
     lifetime_hours: int = 24
 
+    # Live progress: poll the A0 log API and show the current step
+    progress_updates: bool = False
+    progress_poll_ms: int = 1000  # Poll interval while A0 makes progress
+    progress_poll_max_ms: int = 8000  # Poll interval ceiling while nothing changes
+    progress_edit_interval_ms: int = 3000  # Minimum time between message edits
+
+    # Connection pool for all A0 traffic
+    connection_limit: int = 100  # Total pooled connections (0 = unlimited)
+    connection_limit_per_host: int = 0  # Per-host limit (0 = unlimited)
+    keepalive_timeout: float = 30.0  # Seconds idle connections are kept for reuse
+    dns_cache_ttl: int | None = 300  # Seconds to cache DNS lookups (None = forever)
+    unix_socket: str | None = None  # Reach A0 through this Unix socket instead of TCP
+
+    # Retries and circuit breaker
+    retries: int = 2  # Extra attempts for connect failures / retry_statuses
+    retry_backoff_ms: int = 250  # Base of the jittered exponential backoff
+    retry_backoff_max_ms: int = 5000  # Cap for a single backoff delay
+    retry_statuses: list[int] = Field(default_factory=lambda: [502, 503])  # Not 504: A0 may be working
+    breaker_threshold: int = 5  # Consecutive failures that open the breaker (0 = off)
+    breaker_reset_seconds: float = 30.0  # How long the breaker fails fast before probing
+
     # Deprecated: use timeout instead
     timeout_seconds: int | None = None
 
@@ -47,11 +93,37 @@ class AgentZeroConfig(BaseModel):
         return f"{host}:{self.port}"
 
 
+class WebhookConfig(BaseModel):
+    """Webhook server settings (used when run_mode is "webhook")."""
+    url: str | None = None  # Public HTTPS URL; registered with Telegram on startup if set
+    path: str = "/webhook"  # Path the server accepts updates on
+    host: str = "0.0.0.0"
+    port: int = 8080
+    # Checked against X-Telegram-Bot-Api-Secret-Token; required in webhook mode
+    secret_token: str | None = Field(default=None, pattern=r"^[A-Za-z0-9_-]{1,256}$")
+    drop_pending_updates: bool = False  # Discard updates queued while the bot was down
+
+
 class BotConfig(BaseModel):
     """Top-level bot configuration."""
     telegram: TelegramConfig
     agent_zero: AgentZeroConfig
+    run_mode: Literal["polling", "webhook"] = "polling"
+    webhook: WebhookConfig = Field(default_factory=WebhookConfig)
     state_file: str = "/data/state.json"
+    state_backend: Literal["json", "journal", "sqlite"] = "json"
+    state_flush_interval_ms: int = 0  # json backend: 0 = save on every change; >0 = write-behind
+    state_journal_max_bytes: int = 1_048_576  # journal backend: compact past this size
+
+    @model_validator(mode="after")
+    def _require_webhook_secret(self) -> "BotConfig":
+        """Without a secret token the webhook would accept any POST as an update."""
+        if self.run_mode == "webhook" and not self.webhook.secret_token:
+            raise ValueError(
+                "run_mode is webhook but webhook.secret_token is not set — "
+                "set it to a random string (1-256 characters: A-Z, a-z, 0-9, _ and -)"
+            )
+        return self
 
 
 def load(path: str | Path = "config.json") -> BotConfig:
@@ -120,3 +192,120 @@ def save(path: str | Path, config: BotConfig) -> None:
         except OSError:
             pass
         raise
+
+
+# ------------------------------------------------------------------
+# Hot-Reload Snapshot Provider
+# ------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """A validated configuration together with the file identity it came from.
+
+    Snapshots are shared between concurrent handlers and must be treated
+    as read-only; a CLI edit produces a new snapshot instead of mutating
+    the current one.
+
+    Attributes:
+        config: The validated configuration.
+        version: Monotonic counter, incremented on every successful reload.
+        stat_key: (inode, size, mtime_ns) of the file when it was parsed.
+        approved_users: ``config.telegram.approved_users`` as a set, built
+            once so the per-update access check is a hash lookup.
+    """
+    config: BotConfig
+    version: int
+    stat_key: tuple[int, int, int]
+    approved_users: frozenset[int] = field(init=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "approved_users", frozenset(self.config.telegram.approved_users))
+
+
+class ConfigProvider:
+    """Serve config snapshots, re-parsing config.json only when it changes.
+
+    Every call to ``get()`` costs a single ``os.stat``. The file is only
+    read, decoded and validated again when its inode, size or mtime
+    differ from the current snapshot. Because ``save()`` replaces the file
+    via ``os.replace``, CLI edits (``approve``/``revoke``) always produce a
+    new inode and are picked up on the next update.
+
+    If a reload fails (e.g. a half-written or invalid file), the previous
+    snapshot keeps being served and the failure is counted; the broken
+    file is not retried until it changes again.
+
+    Args:
+        path: Path to the config.json file.
+        initial: Optional already-loaded config to seed the first snapshot.
+    """
+
+    def __init__(self, path: str | Path, initial: BotConfig | None = None) -> None:
+        self._path = Path(path)
+        self._snapshot: ConfigSnapshot | None = None
+        self._failed_key: tuple[int, int, int] | None = None
+        self._checks = 0
+        self._reloads = 0
+        self._reload_errors = 0
+        if initial is not None:
+            self._snapshot = ConfigSnapshot(initial, 0, self._stat_key() or (0, 0, 0))
+
+    @property
+    def path(self) -> Path:
+        """The config file being watched."""
+        return self._path
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Counters for checks, successful reloads and failed reloads."""
+        return {
+            "version": self._snapshot.version if self._snapshot else 0,
+            "checks": self._checks,
+            "reloads": self._reloads,
+            "reload_errors": self._reload_errors,
+        }
+
+    def _stat_key(self) -> tuple[int, int, int] | None:
+        """Return the (inode, size, mtime_ns) identity of the file, or None."""
+        try:
+            st = os.stat(self._path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def snapshot(self) -> ConfigSnapshot:
+        """Return the current snapshot, reloading first if the file changed.
+
+        Raises:
+            FileNotFoundError / json.JSONDecodeError / pydantic.ValidationError:
+                Only when no snapshot has been loaded yet.
+        """
+        self._checks += 1
+        key = self._stat_key()
+        current = self._snapshot
+
+        if current is not None and (
+            key is None or key == current.stat_key or key == self._failed_key
+        ):
+            return current
+
+        try:
+            config = load(self._path)
+        except Exception as e:
+            if current is None:
+                raise
+            # Remember the broken file so it is not re-parsed on every update
+            self._failed_key = key
+            self._reload_errors += 1
+            logger.error("Failed to reload config from %s: %s", self._path, e)
+            return current
+
+        version = current.version + 1 if current else 1
+        self._snapshot = ConfigSnapshot(config, version, key or (0, 0, 0))
+        self._reloads += 1
+        logger.info("Configuration reloaded (version %d)", version)
+        return self._snapshot
+
+    def get(self) -> BotConfig:
+        """Return the current validated config (see ``snapshot()``)."""
+        return self.snapshot().config
@@ -0,0 +1,150 @@
+"""Agent Zero context routing.
+
+Decides which A0 context a user's message goes to and persists contexts
+that A0 creates on the fly.
+
+Modes (``agent_zero.context_mode``):
+- ``shared`` (default): every approved user talks to one conversation —
+  ``fixed_context_id`` if configured, else the persisted ``auto_context_id``.
+- ``per_user``: every user gets their own context, created lazily on their
+  first message and persisted via ``set_user_context``/``add_chat``, so
+  concurrent users no longer queue behind one in-flight conversation.
+
+Context creation is single-flight: while one message is creating a
+conversation's context, concurrent messages for the same conversation
+wait for it instead of making A0 create (and orphan) contexts of their own.
+"""
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from bot.config import BotConfig
+from bot.state import StateManager
+
+logger = logging.getLogger(__name__)
+
+
+def project_for(config: BotConfig) -> str | None:
+    """Return the project all messages go to.
+
+    Priority: fixed_project_name > default_project (deprecated) > None.
+    """
+    project_name = config.agent_zero.fixed_project_name
+    if project_name is None:
+        project_name = config.agent_zero.default_project
+    return project_name
+
+
+class ContextRouter:
+    """Resolve and persist the A0 context for each user.
+
+    Args:
+        state_manager: Where auto-created contexts are persisted.
+    """
+
+    def __init__(self, state_manager: StateManager) -> None:
+        self._state_manager = state_manager
+        # conversation key -> future resolved when its creator finishes
+        self._creating: dict[str, asyncio.Future] = {}
+        self._creations = 0
+        self._waits = 0
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Counters for context creations and messages that waited on one."""
+        return {
+            "creating": len(self._creating),
+            "creations": self._creations,
+            "waits": self._waits,
+        }
+
+    @staticmethod
+    def is_per_user(config: BotConfig) -> bool:
+        """True when each user is routed to their own context."""
+        return config.agent_zero.context_mode == "per_user"
+
+    def conversation_key(self, config: BotConfig, user_id: int) -> str:
+        """Return a stable key for the conversation a user's messages join."""
+        if self.is_per_user(config):
+            return f"user:{user_id}"
+        if config.agent_zero.fixed_context_id:
+            return f"fixed:{config.agent_zero.fixed_context_id}"
+        return "auto"
+
+    @asynccontextmanager
+    async def acquire(
+        self, config: BotConfig, user_id: int,
+    ) -> AsyncIterator[tuple[str | None, str]]:
+        """Resolve the context for a message, serialising its creation.
+
+        Yields the same tuple as ``resolve()``. When the context is None
+        the caller becomes the creator: it must send to A0 and call
+        ``remember()`` inside the block. Concurrent callers for the same
+        conversation wait until the creator's block exits and resolve
+        again — if the creator failed, one of them takes over.
+        """
+        key = self.conversation_key(config, user_id)
+        while True:
+            context_id, source = self.resolve(config, user_id)
+            creating = self._creating.get(key)
+            if context_id is not None or creating is None:
+                break
+            self._waits += 1
+            await asyncio.wait([creating])
+
+        if context_id is not None:
+            yield context_id, source
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._creating[key] = future
+        self._creations += 1
+        try:
+            yield None, source
+        finally:
+            del self._creating[key]
+            future.set_result(None)
+
+    def resolve(self, config: BotConfig, user_id: int) -> tuple[str | None, str]:
+        """Return the context a user's next message should use.
+
+        Returns:
+            Tuple of (context_id or None to let A0 create one, source label
+            — "fixed", "auto" or "user").
+        """
+        if self.is_per_user(config):
+            user = self._state_manager.get_user(user_id)
+            return (user.context_id if user else None), "user"
+
+        if config.agent_zero.fixed_context_id is not None:
+            return config.agent_zero.fixed_context_id, "fixed"
+        return self._state_manager.get_auto_context_id(), "auto"
+
+    def remember(
+        self,
+        config: BotConfig,
+        user_id: int,
+        context_id: str,
+        project_name: str | None,
+    ) -> None:
+        """Persist a context that A0 returned, if it is a newly created one."""
+        if not context_id:
+            return
+
+        if self.is_per_user(config):
+            user = self._state_manager.get_user(user_id)
+            if user is not None and user.context_id == context_id:
+                return
+            self._state_manager.set_user_context(user_id, context_id, project_name)
+            self._state_manager.add_chat(user_id, context_id, project_name)
+            logger.info("Auto-created and persisted context_id %s for user %d", context_id, user_id)
+            return
+
+        if (
+            config.agent_zero.fixed_context_id is None
+            and self._state_manager.get_auto_context_id() is None
+        ):
+            self._state_manager.set_auto_context_id(context_id)
+            logger.info("Auto-created and persisted context_id: %s", context_id)
@@ -0,0 +1,152 @@
+"""Per-conversation request queue in front of Agent Zero.
+
+Agent Zero processes one message per context at a time. The dispatcher
+lets at most one request per conversation run, keeps the rest in FIFO
+order behind it, caps how many may wait, and lets different
+conversations run in parallel.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# Called with the caller's queue position (1 = next in line) whenever it
+# changes, and with 0 once a caller that had to wait starts running.
+PositionCallback = Callable[[int], Awaitable[None]]
+
+
+class QueueFullError(Exception):
+    """Raised when a conversation already has the maximum number of waiters."""
+
+
+class _Waiter:
+    """One queued request."""
+
+    __slots__ = ("future", "on_position", "enqueued_at")
+
+    def __init__(self, future: asyncio.Future, on_position: PositionCallback | None) -> None:
+        self.future = future
+        self.on_position = on_position
+        self.enqueued_at = time.monotonic()
+
+
+class ContextDispatcher:
+    """FIFO, bounded, one-at-a-time execution per conversation key.
+
+    Args:
+        max_depth: Maximum number of requests waiting behind the running
+            one for a single conversation (0 = unbounded).
+    """
+
+    def __init__(self, max_depth: int = 10) -> None:
+        self._max_depth = max_depth
+        # key -> waiters; the head of each deque is the running request
+        self._queues: dict[str, deque[_Waiter]] = {}
+        self._rejected = 0
+        self._waited = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._depth_max = 0
+
+    @property
+    def stats(self) -> dict[str, int | float]:
+        """Queue depth and wait-time metrics."""
+        return {
+            "conversations": len(self._queues),
+            "queued": sum(len(q) - 1 for q in self._queues.values()),
+            "depth_max": self._depth_max,
+            "rejected": self._rejected,
+            "waited": self._waited,
+            "wait_avg_s": self._wait_total / self._waited if self._waited else 0.0,
+            "wait_max_s": self._wait_max,
+        }
+
+    def depth(self, key: str) -> int:
+        """Number of requests waiting (not running) for a conversation."""
+        queue = self._queues.get(key)
+        return len(queue) - 1 if queue else 0
+
+    @asynccontextmanager
+    async def slot(
+        self, key: str, on_position: PositionCallback | None = None,
+    ) -> AsyncIterator[None]:
+        """Wait for this conversation's turn, then run the block.
+
+        Args:
+            key: Conversation key (see ContextRouter.conversation_key).
+            on_position: Optional callback for queue position updates.
+
+        Raises:
+            QueueFullError: If ``max_depth`` requests are already waiting.
+        """
+        queue = self._queues.setdefault(key, deque())
+        if self._max_depth and len(queue) > self._max_depth:
+            self._rejected += 1
+            raise QueueFullError(f"Queue for {key} is full ({self._max_depth} waiting)")
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), on_position)
+        queue.append(waiter)
+
+        if len(queue) > 1:
+            self._depth_max = max(self._depth_max, len(queue) - 1)
+            self._notify(waiter, len(queue) - 1)
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                if waiter.future.done() and not waiter.future.cancelled():
+                    # Granted just before being cancelled — pass the turn on
+                    self._release(key, waiter)
+                else:
+                    index = queue.index(waiter)
+                    del queue[index]
+                    self._notify_positions(key, start=index)
+                raise
+
+            waited = time.monotonic() - waiter.enqueued_at
+            self._waited += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            self._notify(waiter, 0)
+
+        try:
+            yield
+        finally:
+            self._release(key, waiter)
+
+    def _release(self, key: str, waiter: _Waiter) -> None:
+        """Remove the running request and start the next one in line."""
+        queue = self._queues[key]
+        queue.remove(waiter)
+        if not queue:
+            del self._queues[key]
+            return
+        head = queue[0]
+        if not head.future.done():
+            head.future.set_result(None)
+        self._notify_positions(key)
+
+    def _notify_positions(self, key: str, start: int = 1) -> None:
+        """Tell every waiter from ``start`` on (never the head) its position."""
+        queue = self._queues.get(key)
+        if not queue:
+            return
+        for position in range(max(start, 1), len(queue)):
+            self._notify(queue[position], position)
+
+    def _notify(self, waiter: _Waiter, position: int) -> None:
+        """Fire a position callback without blocking the queue."""
+        if waiter.on_position is None:
+            return
+        task = asyncio.ensure_future(waiter.on_position(position))
+        task.add_done_callback(_log_callback_error)
+
+
+def _log_callback_error(task: asyncio.Future) -> None:
+    """Log failures of position callbacks (e.g. Telegram edit errors)."""
+    if not task.cancelled() and task.exception() is not None:
+        logger.debug("Queue position callback failed: %s", task.exception())
@@ -0,0 +1,215 @@
+"""Fair sharing of Agent Zero capacity between users.
+
+A scheduler stage behind the per-conversation queue: a request asks for
+capacity only once it is at the head of its conversation, so at most
+``max_in_flight`` A0 calls run at once, and when more are waiting,
+capacity is handed out by deficit round-robin across users, so one
+chatty user cannot crowd everybody else out. Each user's backlog —
+everything they have outstanding, queued or running — is bounded;
+beyond it new messages are shed with a reply.
+
+Commands never pass through here — they do not call A0 — so /status,
+/help and friends are never stuck behind A0 traffic.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from bot.dispatch import QueueFullError
+
+logger = logging.getLogger(__name__)
+
+
+class UserBacklogFullError(QueueFullError):
+    """Raised when a user already has the maximum number of outstanding messages."""
+
+
+class _Request:
+    """One request waiting for capacity."""
+
+    __slots__ = ("future", "cost", "enqueued_at")
+
+    def __init__(self, future: asyncio.Future, cost: float) -> None:
+        self.future = future
+        self.cost = cost
+        self.enqueued_at = time.monotonic()
+
+
+class _UserQueue:
+    """A user's waiting requests and DRR deficit counter."""
+
+    __slots__ = ("requests", "deficit", "in_turn")
+
+    def __init__(self) -> None:
+        self.requests: deque[_Request] = deque()
+        self.deficit = 0.0
+        self.in_turn = False
+
+
+class FairScheduler:
+    """Global in-flight cap shared across users by deficit round-robin.
+
+    Requests enter with ``admit()`` (which bounds a user's backlog) and
+    take capacity with ``slot()`` right around the A0 call.
+
+    Args:
+        max_in_flight: A0 calls running at the same time (0 = no limit,
+            the stage is disabled).
+        user_backlog: Requests a single user may have outstanding,
+            waiting or running (0 = unbounded).
+        quantum: Credit a user receives per round; with the default cost
+            of 1 per request this is plain round-robin.
+    """
+
+    def __init__(self, max_in_flight: int = 8, user_backlog: int = 5, quantum: float = 1.0) -> None:
+        self._max_in_flight = max_in_flight
+        self._user_backlog = user_backlog
+        self._quantum = quantum
+        self._users: dict[int, _UserQueue] = {}
+        # user_id -> requests admitted and not yet finished
+        self._outstanding: dict[int, int] = {}
+        # Users with waiting requests, in round-robin order
+        self._active: deque[int] = deque()
+        self._in_flight = 0
+        self._in_flight_max = 0
+        self._granted = 0
+        self._shed = 0
+        self._waited = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @property
+    def stats(self) -> dict[str, int | float]:
+        """In-flight and backlog sizes, shed requests and wait times."""
+        return {
+            "in_flight": self._in_flight,
+            "in_flight_max": self._in_flight_max,
+            "outstanding": sum(self._outstanding.values()),
+            "waiting": sum(len(q.requests) for q in self._users.values()),
+            "users_waiting": len(self._active),
+            "granted": self._granted,
+            "shed": self._shed,
+            "wait_avg_s": self._wait_total / self._waited if self._waited else 0.0,
+            "wait_max_s": self._wait_max,
+        }
+
+    @asynccontextmanager
+    async def admit(self, user_id: int) -> AsyncIterator[None]:
+        """Count a request against its user's backlog for the whole block.
+
+        Wraps everything the request does, including waiting in its
+        conversation queue, so ``user_backlog`` bounds all of a user's
+        outstanding requests.
+
+        Raises:
+            UserBacklogFullError: If the user already has ``user_backlog``
+                requests outstanding.
+        """
+        if self._max_in_flight <= 0:
+            yield
+            return
+
+        outstanding = self._outstanding.get(user_id, 0)
+        if self._user_backlog and outstanding >= self._user_backlog:
+            self._shed += 1
+            raise UserBacklogFullError(
+                f"User {user_id} already has {self._user_backlog} message(s) outstanding"
+            )
+        self._outstanding[user_id] = outstanding + 1
+        try:
+            yield
+        finally:
+            remaining = self._outstanding[user_id] - 1
+            if remaining:
+                self._outstanding[user_id] = remaining
+            else:
+                del self._outstanding[user_id]
+
+    @asynccontextmanager
+    async def slot(self, user_id: int, cost: float = 1.0) -> AsyncIterator[None]:
+        """Wait for a share of A0 capacity, then run the block.
+
+        Take it right around the A0 call — a request still queued behind
+        its conversation must not hold capacity.
+
+        Args:
+            user_id: Telegram user ID the request is accounted to.
+            cost: Relative cost of the request.
+        """
+        if self._max_in_flight <= 0:
+            yield
+            return
+
+        queue = self._users.get(user_id)
+        if queue is None:
+            queue = self._users[user_id] = _UserQueue()
+            self._active.append(user_id)
+
+        request = _Request(asyncio.get_running_loop().create_future(), cost)
+        queue.requests.append(request)
+        self._dispatch()
+
+        try:
+            await request.future
+        except asyncio.CancelledError:
+            if request.future.done() and not request.future.cancelled():
+                # Granted just before being cancelled — give the capacity back
+                self._in_flight -= 1
+            else:
+                self._forget(user_id, request)
+            self._dispatch()
+            raise
+
+        waited = time.monotonic() - request.enqueued_at
+        if waited > 0.001:
+            self._waited += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self._dispatch()
+
+    def _forget(self, user_id: int, request: _Request) -> None:
+        """Remove a cancelled request that was still waiting."""
+        queue = self._users.get(user_id)
+        if queue is None or request not in queue.requests:
+            return
+        queue.requests.remove(request)
+        if not queue.requests:
+            del self._users[user_id]
+            self._active.remove(user_id)
+
+    def _dispatch(self) -> None:
+        """Admit waiting requests by deficit round-robin while capacity lasts."""
+        while self._in_flight < self._max_in_flight and self._active:
+            user_id = self._active[0]
+            queue = self._users[user_id]
+            if not queue.in_turn:
+                queue.deficit += self._quantum
+                queue.in_turn = True
+
+            head = queue.requests[0]
+            if head.cost > queue.deficit:
+                # Turn over — move on to the next user
+                queue.in_turn = False
+                self._active.rotate(-1)
+                continue
+
+            queue.deficit -= head.cost
+            queue.requests.popleft()
+            head.future.set_result(None)
+            self._in_flight += 1
+            self._granted += 1
+            self._in_flight_max = max(self._in_flight_max, self._in_flight)
+
+            if not queue.requests:
+                # Idle users do not bank credit
+                del self._users[user_id]
+                self._active.popleft()
@@ -2,11 +2,15 @@
 
 Converts Agent Zero's markdown output into Telegram-compatible HTML,
 handling code blocks, inline formatting, links, headers, blockquotes,
-tables, and images. Splits long messages at safe boundaries.
+tables, and images. Splits long messages at safe boundaries and repairs
+HTML Telegram would reject before it is sent.
 """
 
+import copy
 import re
 import logging
+from html import unescape
+from typing import Iterator
 
 logger = logging.getLogger(__name__)
 
@@ -31,387 +35,1000 @@ def _escape_html(text: str) -> str:
     )
 
 
+def _escape_attribute(text: str) -> str:
+    """Escape text for a double-quoted attribute value (adds ``"``)."""
+    return _escape_html(text).replace('"', "&quot;")
+
+
 # ------------------------------------------------------------------
-# Block-Level Extraction (pre-processing)
+# Block Pass
 # ------------------------------------------------------------------
 
-# Placeholder pattern that won't appear in normal text
-_BLOCK_PLACEHOLDER = "««BLK_{idx}»»"
+# Fenced code block opener: ```lang plus an optional newline
+_FENCE_OPEN = re.compile(r"```(\w*)\n?")
 
+# Table separator row, e.g. |---|:---:|
+_TABLE_SEPARATOR = re.compile(r"[\|\-:\s]+")
 
-def _extract_fenced_blocks(text: str) -> tuple[str, dict[int, str]]:
-    """Extract fenced code blocks and replace with placeholders.
+# Replacement for horizontal rules (---, ***, ___)
+_HORIZONTAL_RULE = "—" * 20
 
-    This prevents inline formatting rules from mangling code content.
-    Code content is HTML-escaped inside the blocks.
 
-    Returns:
-        Tuple of (text_with_placeholders, {index: html_block}).
-    """
-    blocks: dict[int, str] = {}
-    counter = 0
-
-    def _replace_block(match: re.Match) -> str:
-        nonlocal counter
-        lang = match.group(1) or ""
-        code = match.group(2)
-        # Escape HTML inside code blocks
-        escaped_code = _escape_html(code)
-        # Strip single leading/trailing newline if present
-        if escaped_code.startswith("\n"):
-            escaped_code = escaped_code[1:]
-        if escaped_code.endswith("\n"):
-            escaped_code = escaped_code[:-1]
-
-        if lang:
-            html = f'<pre><code class="language-{_escape_html(lang)}">{escaped_code}</code></pre>'
-        else:
-            html = f"<pre><code>{escaped_code}</code></pre>"
+class _Html(str):
+    """A piece of output that is already Telegram HTML."""
+
+    __slots__ = ()
 
-        idx = counter
-        blocks[idx] = html
-        counter += 1
-        return _BLOCK_PLACEHOLDER.format(idx=idx)
 
-    # Match fenced code blocks: ```lang\n...\n```
-    pattern = re.compile(r"```(\w*)\n?(.*?)```", re.DOTALL)
-    result = pattern.sub(_replace_block, text)
-    return result, blocks
+def _fenced_block(lang: str, code: str) -> _Html:
+    """Render a fenced code block; the content is escaped, not formatted."""
+    escaped_code = _escape_html(code)
+    # Strip single leading/trailing newline if present
+    if escaped_code.startswith("\n"):
+        escaped_code = escaped_code[1:]
+    if escaped_code.endswith("\n"):
+        escaped_code = escaped_code[:-1]
 
+    if lang:
+        return _Html(f'<pre><code class="language-{_escape_html(lang)}">{escaped_code}</code></pre>')
+    return _Html(f"<pre><code>{escaped_code}</code></pre>")
 
-def _extract_tables(text: str, blocks: dict[int, str]) -> str:
-    """Detect markdown tables and convert to monospace <pre> blocks.
 
-    A table is detected as consecutive lines containing pipe characters
-    in a tabular pattern (at least 3 pipe-separated segments).
+def _split_lines(text: str) -> list[str | list[str]]:
+    """Split text into lines, cutting fenced code blocks out as HTML.
+
+    A fence pairs with the next ``` after it, wherever that is, so a code
+    block may start or end in the middle of a line. Such a line is
+    returned as a list of text and ``_Html`` pieces; all others are
+    plain strings.
     """
-    counter = max(blocks.keys(), default=-1) + 1
-    lines = text.split("\n")
-    result_lines: list[str] = []
-    table_buffer: list[str] = []
+    lines: list[str | list[str]] = []
+    current: list[str] = []
+
+    def _add_text(chunk: str) -> None:
+        nonlocal current
+        parts = chunk.split("\n")
+        if parts[0]:
+            current.append(parts[0])
+        for part in parts[1:]:
+            lines.append(_join_line(current))
+            current = [part] if part else []
+
+    pos = 0
+    while True:
+        start = text.find("```", pos)
+        if start == -1:
+            break
+        opener = _FENCE_OPEN.match(text, start)
+        close = text.find("```", opener.end())
+        if close == -1:
+            break  # Unclosed fence — the rest stays plain text
+        _add_text(text[pos:start])
+        current.append(_fenced_block(opener.group(1), text[opener.end():close]))
+        pos = close + 3
 
-    def _flush_table() -> None:
-        nonlocal counter
-        if not table_buffer:
-            return
-        # Filter out separator lines (e.g. |---|---|)
-        content_lines = []
-        for line in table_buffer:
-            stripped = line.strip()
-            # Check if it's a separator line: only |, -, :, spaces
-            if re.match(r"^[\|\-:\s]+$", stripped):
-                continue
-            content_lines.append(line)
-
-        if content_lines:
-            # Escape HTML entities in table content
-            table_text = _escape_html("\n".join(content_lines))
-            html = f"<pre>{table_text}</pre>"
-            blocks[counter] = html
-            result_lines.append(_BLOCK_PLACEHOLDER.format(idx=counter))
-            counter += 1
-        table_buffer.clear()
-
-    for line in lines:
-        stripped = line.strip()
-        # A table line has pipes and at least 3 segments
-        if "|" in stripped:
-            cells = stripped.split("|")
-            if len(cells) >= 3:
-                table_buffer.append(line)
-                continue
+    _add_text(text[pos:])
+    lines.append(_join_line(current))
+    return lines
 
-        # Not a table line
-        _flush_table()
-        result_lines.append(line)
 
-    _flush_table()
-    return "\n".join(result_lines)
+def _join_line(pieces: list[str]) -> str | list[str]:
+    """Collapse a line's pieces to a string unless it holds a code block."""
+    if any(isinstance(piece, _Html) for piece in pieces):
+        return pieces
+    return "".join(pieces)
 
 
-# ------------------------------------------------------------------
-# Inline Formatting
-# ------------------------------------------------------------------
+def _is_table_row(stripped: str) -> bool:
+    """A table row has at least 3 pipe-separated segments."""
+    return stripped.count("|") >= 2
 
-def _convert_inline(text: str) -> str:
-    """Apply inline markdown-to-HTML conversions on already-escaped text.
 
-    At this point, all plain-text < > & are already escaped as entities.
-    The markdown syntax characters (*, _, `, [, ], etc.) are still raw.
+def _table_block(rows: list[str]) -> _Html | None:
+    """Render table rows as a monospace block, dropping separator rows."""
+    content = [row for row in rows if not _TABLE_SEPARATOR.fullmatch(row.strip())]
+    if not content:
+        return None
+    table_text = _escape_html("\n".join(content))
+    return _Html(f"<pre>{table_text}</pre>")
 
-    Inline code is extracted to placeholders FIRST to prevent formatting
-    rules from mangling code content (e.g. *args, **kwargs, __init__).
+
+def _line_element(stripped: str) -> _Html | str | None:
+    """Convert a header, blockquote or horizontal rule line.
+
+    Returns rendered HTML for headers and blockquotes, the rule text for
+    horizontal rules, or None for an ordinary line.
+    """
+    first = stripped[:1]
+    if first == "#":
+        # Header: 1-6 hashes, whitespace, then text
+        level = len(stripped) - len(stripped.lstrip("#"))
+        rest = stripped[level:]
+        if level <= 6 and rest[:1].isspace():
+            return _Html(f"<b>{_convert_inline(rest.lstrip())}</b>")
+    elif first == ">":
+        rest = stripped[1:]
+        if rest[:1].isspace():
+            rest = rest[1:]
+        return _Html(f"<blockquote>{_convert_inline(rest)}</blockquote>")
+    if first in ("-", "*", "_") and len(stripped) >= 3 and not stripped.strip("-*_"):
+        return _HORIZONTAL_RULE
+    return None
+
+
+def _iter_blocks(text: str) -> Iterator[str]:
+    """Convert markdown to HTML pieces, yielding each as soon as it is done.
+
+    Code blocks, tables, headers and blockquotes are rendered as they are
+    met. Consecutive ordinary lines up to a blank line are collected into
+    one run and inline-formatted together, so inline code and links may
+    span lines within a paragraph but never reach into another paragraph
+    or a block.
     """
-    # Step 1: Extract inline code to placeholders FIRST
-    inline_blocks: dict[int, str] = {}
-    inline_counter = 0
+    out: list[str] = []
+    run: list[str] = []  # Markdown text waiting for inline formatting
+    table: list[str] = []
+    first_line = True
+
+    def _flush_run() -> None:
+        if run:
+            out.append(_convert_inline("".join(run)))
+            run.clear()
+
+    def _emit(line: str | list[str]) -> None:
+        nonlocal first_line
+        if not first_line:
+            run.append("\n")
+        first_line = False
+        if isinstance(line, list):
+            for piece in line:
+                if isinstance(piece, _Html):
+                    _flush_run()
+                    out.append(piece)
+                else:
+                    run.append(piece)
+        elif isinstance(line, _Html):
+            _flush_run()
+            out.append(line)
+        else:
+            run.append(line)
+            if not line.strip():
+                _flush_run()  # End of a paragraph
 
-    def _protect_inline_code(match: re.Match) -> str:
-        nonlocal inline_counter
-        idx = inline_counter
-        inline_blocks[idx] = f"<code>{match.group(1)}</code>"
-        inline_counter += 1
-        return f"\u00abICODE_{idx}\u00bb"
+    def _flush_table() -> None:
+        if table:
+            block = _table_block(table)
+            table.clear()
+            if block is not None:
+                _emit(block)
+
+    for line in _split_lines(text):
+        if isinstance(line, list):
+            # A line holding a code block is never a table row or header
+            _flush_table()
+            _emit(line)
+            yield from out
+            out.clear()
+            continue
 
-    text = re.sub(r"`([^`]+)`", _protect_inline_code, text)
+        stripped = line.strip()
+        if "|" in stripped and _is_table_row(stripped):
+            table.append(line)
+            continue
+        _flush_table()
 
-    # Step 2: Images: ![alt](url) -> <a href="url">[Image: alt]</a>
-    def _image(m: re.Match) -> str:
-        alt = m.group(1)
-        url = m.group(2)
-        return f'<a href="{url}">[Image: {alt}]</a>'
+        element = _line_element(stripped) if stripped else None
+        _emit(line if element is None else element)
+        if out:
+            yield from out
+            out.clear()
 
-    text = re.sub(r"!\[([^\]]*)\]\(([^)]+)\)", _image, text)
+    _flush_table()
+    _flush_run()
+    yield from out
 
-    # Links: [text](url) -> <a href="url">text</a>
-    def _link(m: re.Match) -> str:
-        link_text = m.group(1)
-        url = m.group(2)
-        return f'<a href="{url}">{link_text}</a>'
 
-    text = re.sub(r"\[([^\]]+)\]\(([^)]+)\)", _link, text)
+# ------------------------------------------------------------------
+# Inline Pass
+# ------------------------------------------------------------------
 
-    # Bold: **text** or __text__ -> <b>text</b>
-    text = re.sub(r"\*\*(.+?)\*\*", r"<b>\1</b>", text)
-    text = re.sub(r"__(.+?)__", r"<b>\1</b>", text)
+# Images, links, emphasis delimiters and line breaks, in one pattern.
+# Link text stops at any bracket or line break and a URL at whitespace or
+# "[", so a failed link attempt never scans past the next "[" — unclosed
+# links cost linear time instead of a rescan to the end of the text.
+_INLINE_TOKEN = re.compile(
+    r"!\[([^\[\]\n]*)\]\(([^)\s\[]+)\)"
+    r"|\[([^\[\]\n]+)\]\(([^)\s\[]+)\)"
+    r"|\*\*|__|~~|\*|_|\n"
+)
+
+# Emphasis delimiters in the order they are paired: (marker, tag,
+# needs word boundaries). Spans paired earlier are opaque to later ones.
+_EMPHASIS = (
+    ("**", "b", False),
+    ("__", "b", False),
+    ("*", "i", True),
+    ("_", "i", True),
+    ("~~", "s", False),
+)
+
+# Stands in for inline code while scanning: not a word character and
+# not markup, so code content can never pair with anything outside it
+_CODE_MASK = "\ue000"
+
+
+def _is_word(char: str) -> bool:
+    """Same test as the regex ``\\w`` class."""
+    return char.isalnum() or char == "_"
+
+
+class _Token:
+    """An inline delimiter, link or image found by the tokenizer."""
+
+    __slots__ = ("match", "kind", "start", "end", "layer", "html")
+
+    def __init__(self, match: re.Match | None, kind: str, start: int, end: int) -> None:
+        self.match = match
+        self.kind = kind
+        self.start = start
+        self.end = end
+        self.layer: int | None = None  # Emphasis layer that paired it
+        self.html = ""
+
+
+class _InlineRenderer:
+    """Render one run of markdown text to Telegram HTML.
+
+    Inline code spans are located first and masked out. The masked text
+    is tokenized once with ``_INLINE_TOKEN``; emphasis delimiters are then
+    paired on the token list — per delimiter kind, leftmost opener with the
+    nearest closer on the same line — and the tokens are rendered in one
+    left-to-right walk.
+    """
 
-    # Italic: *text* or _text_ -> <i>text</i>
-    text = re.sub(r"(?<!\w)\*(?!\*)(.+?)(?<!\*)\*(?!\w)", r"<i>\1</i>", text)
-    text = re.sub(r"(?<!\w)_(?!_)(.+?)(?<!_)_(?!\w)", r"<i>\1</i>", text)
+    def __init__(self, text: str) -> None:
+        self._text = text
+        self._codes = self._find_code_spans(text)
+        self._next_code = 0
+        self._masked = self._mask(text, self._codes) if self._codes else text
+        self._out: list[str] = []
+
+    def render(self) -> str:
+        """Return the HTML for the whole text."""
+        self._render(0, len(self._text))
+        return "".join(self._out)
+
+    @staticmethod
+    def _find_code_spans(text: str) -> list[tuple[int, int]]:
+        """Return (start, end) of each `code` span, backticks included."""
+        spans: list[tuple[int, int]] = []
+        start = text.find("`")
+        while start != -1:
+            end = text.find("`", start + 1)
+            if end == -1:
+                break
+            if end == start + 1:
+                # Empty span: the second backtick may open the next one
+                start = end
+                continue
+            spans.append((start, end + 1))
+            start = text.find("`", end + 1)
+        return spans
+
+    @staticmethod
+    def _mask(text: str, spans: list[tuple[int, int]]) -> str:
+        """Replace every code span with mask characters of equal length."""
+        parts: list[str] = []
+        pos = 0
+        for start, end in spans:
+            parts.append(text[pos:start])
+            parts.append(_CODE_MASK * (end - start))
+            pos = end
+        parts.append(text[pos:])
+        return "".join(parts)
+
+    def _tokenize(self, lo: int, hi: int) -> list[_Token]:
+        """Find all tokens in text[lo:hi]."""
+        tokens: list[_Token] = []
+        for m in _INLINE_TOKEN.finditer(self._masked, lo, hi):
+            if m.group(2) is not None:
+                kind = "image"
+            elif m.group(4) is not None:
+                kind = "link"
+            else:
+                kind = m.group()
+            tokens.append(_Token(m, kind, m.start(), m.end()))
+        return tokens
+
+    def _render(self, lo: int, hi: int) -> None:
+        """Render text[lo:hi] (a whole run, or a link's text)."""
+        tokens = self._tokenize(lo, hi)
+        if tokens:
+            tokens = self._pair(tokens, lo, hi)
+        out = self._out
+        pos = lo
+        for token in tokens:
+            self._emit_text(pos, token.start)
+            pos = token.end
+            if token.kind == "image":
+                m = token.match
+                out.append(f'<a href="{self._escaped(*m.span(2))}">[Image: ')
+                self._render(*m.span(1))
+                out.append("]</a>")
+            elif token.kind == "link":
+                m = token.match
+                out.append(f'<a href="{self._escaped(*m.span(4))}">')
+                self._render(*m.span(3))
+                out.append("</a>")
+            elif token.layer is not None:
+                out.append(token.html)
+            else:
+                out.append(token.kind)
+        self._emit_text(pos, hi)
 
-    # Strikethrough: ~~text~~ -> <s>text</s>
-    text = re.sub(r"~~(.+?)~~", r"<s>\1</s>", text)
+    def _escaped(self, lo: int, hi: int) -> str:
+        """Escaped raw text[lo:hi] (for URLs; code spans are not rendered)."""
+        return _escape_attribute(self._text[lo:hi])
 
-    # Step 3: Restore inline code from placeholders
-    for idx, html in inline_blocks.items():
-        text = text.replace(f"\u00abICODE_{idx}\u00bb", html)
+    def _emit_text(self, lo: int, hi: int) -> None:
+        """Write text[lo:hi] escaped, rendering the code spans inside it."""
+        if lo >= hi:
+            return
+        text, codes, out = self._text, self._codes, self._out
+        while self._next_code < len(codes) and codes[self._next_code][0] < hi:
+            start, end = codes[self._next_code]
+            self._next_code += 1
+            if start < lo:
+                continue
+            out.append(_escape_html(text[lo:start]))
+            out.append(f"<code>{_escape_html(text[start + 1:end - 1])}</code>")
+            lo = end
+        out.append(_escape_html(text[lo:hi]))
+
+    def _pair(self, tokens: list[_Token], lo: int, hi: int) -> list[_Token]:
+        """Pair emphasis delimiters, one delimiter kind at a time."""
+        for layer, (marker, tag, bounded) in enumerate(_EMPHASIS):
+            if marker in ("*", "_"):
+                tokens = self._split_unpaired(tokens, marker + marker)
+            stack: list[int | None] = []
+            opener: int | None = None
+            for idx, token in enumerate(tokens):
+                if token.layer is not None and token.layer < layer:
+                    # Boundary of an earlier span: pair inside it separately
+                    if not token.html.startswith("</"):
+                        stack.append(opener)
+                        opener = None
+                    else:
+                        opener = stack.pop()
+                    continue
+                kind = token.kind
+                if kind == "\n":
+                    opener = None
+                elif kind != marker:
+                    continue
+                elif opener is None:
+                    if not bounded or self._can_open(tokens, idx, lo, hi, layer):
+                        opener = idx
+                elif token.start > tokens[opener].end and (
+                    not bounded or self._can_close(tokens, idx, lo, hi, layer)
+                ):
+                    first = tokens[opener]
+                    first.layer = token.layer = layer
+                    first.html = f"<{tag}>"
+                    token.html = f"</{tag}>"
+                    opener = None
+        return tokens
+
+    @staticmethod
+    def _split_unpaired(tokens: list[_Token], double: str) -> list[_Token]:
+        """Turn unpaired ** / __ into two single delimiters for italics."""
+        if not any(t.kind == double and t.layer is None for t in tokens):
+            return tokens
+        result: list[_Token] = []
+        for t in tokens:
+            if t.kind == double and t.layer is None:
+                result.append(_Token(None, double[0], t.start, t.start + 1))
+                result.append(_Token(None, double[0], t.start + 1, t.end))
+            else:
+                result.append(t)
+        return result
+
+    def _char_before(self, tokens: list[_Token], idx: int, lo: int, layer: int) -> str:
+        """The character before a token as seen by this layer."""
+        start = tokens[idx].start
+        if start == lo:
+            return ">"  # Start of the run or link text
+        if idx and tokens[idx - 1].end == start:
+            prev = tokens[idx - 1]
+            if prev.layer is not None and prev.layer < layer:
+                return ">"  # Already a tag
+        return self._masked[start - 1]
+
+    def _char_after(self, tokens: list[_Token], idx: int, hi: int, layer: int) -> str:
+        """The character after a token as seen by this layer."""
+        end = tokens[idx].end
+        if end == hi:
+            return "<"  # End of the run or link text
+        if idx + 1 < len(tokens) and tokens[idx + 1].start == end:
+            nxt = tokens[idx + 1]
+            if nxt.layer is not None and nxt.layer < layer:
+                return "<"  # Already a tag
+        return self._masked[end]
+
+    def _can_open(self, tokens: list[_Token], idx: int, lo: int, hi: int, layer: int) -> bool:
+        """Italic opener: no word character before, not doubled after."""
+        marker = tokens[idx].kind
+        return (
+            not _is_word(self._char_before(tokens, idx, lo, layer))
+            and self._char_after(tokens, idx, hi, layer) != marker
+        )
+
+    def _can_close(self, tokens: list[_Token], idx: int, lo: int, hi: int, layer: int) -> bool:
+        """Italic closer: not doubled before, no word character after."""
+        marker = tokens[idx].kind
+        return (
+            self._char_before(tokens, idx, lo, layer) != marker
+            and not _is_word(self._char_after(tokens, idx, hi, layer))
+        )
 
-    return text
+
+def _convert_inline(text: str) -> str:
+    """Convert inline markdown (code, links, images, emphasis) to HTML.
+
+    Plain text is escaped; code span content is escaped but not
+    formatted.
+    """
+    if "`" not in text and _INLINE_TOKEN.search(text) is None:
+        return _escape_html(text)
+    return _InlineRenderer(text).render()
 
 
 # ------------------------------------------------------------------
-# Line-Level Formatting
+# Message Splitting
 # ------------------------------------------------------------------
 
-def _convert_line_elements(text: str) -> str:
-    """Convert line-level markdown elements (headers, blockquotes, HRs).
+# One atom of Telegram HTML: a tag, a run of newlines or a run of other text
+_HTML_ATOM = re.compile(r"<(/?)([a-zA-Z][\w-]*)[^>]*>|\n+|[^<\n]+|<")
 
-    Operates on already-escaped text. Markdown syntax chars are still raw.
-    """
-    lines = text.split("\n")
-    result: list[str] = []
+# Entities and the text between them, for cutting text that holds entities
+_ENTITY_ATOM = re.compile(r"&#?\w+;|[^&]+|&")
 
-    for line in lines:
-        stripped = line.strip()
 
-        # Skip placeholder lines
-        if "««BLK_" in stripped:
-            result.append(line)
-            continue
+def _utf16_len(text: str) -> int:
+    """Length of text in UTF-16 code units, the unit Telegram counts in."""
+    if text.isascii():
+        return len(text)
+    return len(text.encode("utf-16-le")) // 2
 
-        # Headers: # Header -> <b>Header</b>
-        header_match = re.match(r"^(#{1,6})\s+(.+)$", stripped)
-        if header_match:
-            header_text = header_match.group(2)
-            result.append(f"<b>{header_text}</b>")
-            continue
 
-        # Blockquotes: &gt; text -> <blockquote>text</blockquote>
-        # Note: > is escaped to &gt; at this point
-        bq_match = re.match(r"^&gt;\s?(.*)$", stripped)
-        if bq_match:
-            bq_text = bq_match.group(1)
-            result.append(f"<blockquote>{bq_text}</blockquote>")
-            continue
+def _utf16_prefix(text: str, units: int) -> str:
+    """Longest prefix of text that is at most ``units`` UTF-16 code units."""
+    if text.isascii():
+        return text[:units]
+    encoded = text.encode("utf-16-le")[:2 * units]
+    # Do not cut a surrogate pair in half
+    if len(encoded) >= 2 and 0xD8 <= encoded[-1] <= 0xDB:
+        encoded = encoded[:-2]
+    return encoded.decode("utf-16-le")
 
-        # Horizontal rules: --- or *** or ___
-        if re.match(r"^[-*_]{3,}$", stripped):
-            result.append("\u2014" * 20)
-            continue
 
-        result.append(line)
+class _ChunkSplitter:
+    """Cut Telegram HTML into chunks that fit the message length limit.
 
-    return "\n".join(result)
+    HTML is fed in pieces as it is produced and walked once, atom by atom,
+    keeping the stack of open tags.
+    Length is counted the way Telegram counts it: the displayed text in
+    UTF-16 code units, so tags are free and an entity is one character.
+    When a chunk is full it is cut at its last paragraph break (outside
+    <pre>), else its last line break, else mid-text; the tags open at the
+    cut are closed at the end of the chunk and reopened at the start of
+    the next one. Only the text after the cut is carried over, so no text
+    is scanned twice. Leading newlines are dropped and runs of blank
+    lines collapse to one.
+
+    Args:
+        max_length: Maximum UTF-16 code units of text per chunk.
+    """
+
+    def __init__(self, max_length: int = MAX_MESSAGE_LENGTH) -> None:
+        self._max_length = max_length
+        self._stack: tuple[tuple[str, str], ...] = ()  # (name, opening tag)
+        self._pieces: list[str] = []
+        self._used = 0
+        # Places the current chunk may be cut: (piece index, used, open tags)
+        self._paragraph_break: tuple[int, int, tuple] | None = None
+        self._line_break: tuple[int, int, tuple] | None = None
+        self._newline_run = 0  # Newlines since the last other atom
+        self._run_start: tuple[int, int, tuple] | None = None
+        self._chunks: list[str] = []
+
+    def feed(self, html: str) -> list[str]:
+        """Add HTML (whole atoms) and return the chunks it completed."""
+        for match in _HTML_ATOM.finditer(html):
+            atom = match.group()
+            first = atom[0]
+            if first == "<" and match.group(2):
+                self._tag(atom, match.group(1), match.group(2).lower())
+            elif first == "\n":
+                self._newlines(atom)
+            else:
+                self._newline_run = 0
+                width = _utf16_len(unescape(atom) if "&" in atom else atom)
+                if self._used + width <= self._max_length:
+                    # Fast path: the text fits in the current chunk
+                    self._pieces.append(atom)
+                    self._used += width
+                else:
+                    self._text(atom, width)
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+    def fork(self) -> "_ChunkSplitter":
+        """Return an independent copy of the splitter in its current state."""
+        other = copy.copy(self)
+        other._pieces = list(self._pieces)
+        other._chunks = list(self._chunks)
+        return other
+
+    def close(self) -> list[str]:
+        """Return the remaining chunks, closing any tags left open."""
+        if self._used:
+            self._cut((len(self._pieces), self._used, self._stack))
+        self._pieces = []
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+    def _tag(self, tag: str, closing: str, name: str) -> None:
+        if closing:
+            for depth in range(len(self._stack) - 1, -1, -1):
+                if self._stack[depth][0] == name:
+                    self._stack = self._stack[:depth]
+                    break
+        else:
+            self._stack += ((name, tag),)
+        self._pieces.append(tag)
+        self._newline_run = 0
+
+    def _newlines(self, atom: str) -> None:
+        if not self._pieces:
+            return  # Leading newlines of the message
+        # Runs of blank lines collapse to one, even across feed() calls
+        count = min(len(atom), 2 - self._newline_run)
+        if count <= 0:
+            return
+        if self._newline_run == 0:
+            # A run of newlines is a place to cut, unless a tag was just opened
+            last = self._pieces[-1]
+            self._run_start = None
+            if self._used and not (last[0] == "<" and last[1] != "/"):
+                self._run_start = self._line_break = (len(self._pieces), self._used, self._stack)
+        self._newline_run += count
+        if (
+            self._newline_run == 2
+            and self._run_start is not None
+            and all(name != "pre" for name, _ in self._stack)
+        ):
+            self._paragraph_break = self._run_start
+        self._text(atom[:count], count)
+
+    def _text(self, atom: str, width: int) -> None:
+        while self._used + width > self._max_length:
+            cut = self._paragraph_break or self._line_break
+            if cut is not None:
+                self._cut(cut)
+                if atom[0] == "\n" and not self._used:
+                    return  # Cut right at this line break: drop it
+                continue
+            if "&" in atom and _ENTITY_ATOM.fullmatch(atom) is None:
+                # Cut between entities, never inside one
+                for match in _ENTITY_ATOM.finditer(atom):
+                    part = match.group()
+                    self._text(part, _utf16_len(unescape(part) if part[0] == "&" else part))
+                return
+            # No break in this chunk: fill it up with part of the atom
+            head = ""
+            if atom[0] != "&":
+                head = _utf16_prefix(atom, self._max_length - self._used)
+                space = head.rfind(" ")
+                if space >= len(head) // 2:
+                    head = head[:space + 1]
+            if not head and not self._used:
+                head = atom[:1]  # Always make progress
+            if head:
+                self._pieces.append(head)
+                self._used += _utf16_len(head)
+                atom = atom[len(head):]
+                width = _utf16_len(atom)
+            self._cut((len(self._pieces), self._used, self._stack))
+            if not atom:
+                return
+        self._pieces.append(atom)
+        self._used += width
+
+    def _cut(self, cut: tuple[int, int, tuple]) -> None:
+        """End the current chunk at ``cut`` and carry the rest over."""
+        index, used, stack = cut
+        closing = "".join(f"</{name}>" for name, _ in reversed(stack))
+        chunk = ("".join(self._pieces[:index]) + closing).strip()
+        if chunk:
+            self._chunks.append(chunk)
+
+        # Line breaks at the cut are dropped, not carried
+        rest = self._pieces[index:]
+        skip = dropped = 0
+        while skip < len(rest) and rest[skip][0] == "\n":
+            dropped += len(rest[skip])
+            skip += 1
+        opening = [tag for _, tag in stack]
+        self._pieces = opening + rest[skip:]
+        self._used -= used + dropped
+
+        line = self._line_break
+        self._paragraph_break = self._line_break = None
+        if line is not None and line[0] > index + skip:
+            shifted = (line[0] - index - skip + len(opening), line[1] - used - dropped, line[2])
+            if shifted[1] > 0:
+                self._line_break = shifted
+        self._newline_run = 0
+        self._run_start = None
 
 
 # ------------------------------------------------------------------
-# Message Splitting
+# Validation
 # ------------------------------------------------------------------
 
-def _split_message(html: str, max_length: int = MAX_MESSAGE_LENGTH) -> list[str]:
-    """Split an HTML message into chunks that fit Telegram's limit.
-
-    Strategy:
-    1. Try to split at double newlines (paragraph breaks).
-    2. Avoid splitting inside a <pre>...</pre> block.
-    3. If a single pre block exceeds max_length, split at line boundaries
-       within it, properly closing and reopening tags.
-    4. Account for tag overhead when closing/reopening pre blocks.
+# Tags Telegram's HTML parse mode accepts
+_ALLOWED_TAGS = frozenset({
+    "b", "strong", "i", "em", "u", "ins", "s", "strike", "del", "span",
+    "tg-spoiler", "a", "tg-emoji", "code", "pre", "blockquote",
+})
+
+# Named entities Telegram accepts (all numeric entities are accepted)
+_NAMED_ENTITIES = frozenset({"lt", "gt", "amp", "quot"})
+
+# A tag, an entity, or a markup character that is neither
+_MARKUP = re.compile(
+    r"<(/?)([a-zA-Z][\w-]*)((?:[^<>\"']|\"[^\"]*\"|'[^']*')*)>"
+    r"|&(#[xX][0-9a-fA-F]+|#\d+|[a-zA-Z]\w*);"
+    r"|[<>&]"
+)
+
+_ATTRIBUTE = re.compile(r"""([\w-]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""")
+
+
+def _attributes(text: str) -> dict[str, str]:
+    """Parse a tag's attributes (values are left HTML-escaped)."""
+    return {
+        m.group(1).lower(): m.group(2) or m.group(3) or m.group(4) or ""
+        for m in _ATTRIBUTE.finditer(text)
+    }
+
+
+def _tag_problem(name: str, attrs: str, parent: str | None, open_names: set[str]) -> str | None:
+    """Return why an opening tag would be rejected here, or None if it is fine."""
+    if name not in _ALLOWED_TAGS:
+        return f"unsupported tag <{name}>"
+    if parent == "code" or (parent == "pre" and name != "code"):
+        return f"<{name}> inside <{parent}>"
+    if name in ("a", "blockquote") and name in open_names:
+        return f"nested <{name}>"
+    if name == "a":
+        href = _attributes(attrs).get("href", "").strip()
+        if not href or any(char.isspace() for char in href):
+            return "link without a valid href"
+    elif name == "span" and _attributes(attrs).get("class") != "tg-spoiler":
+        return "<span> without class=tg-spoiler"
+    elif name == "tg-emoji" and "emoji-id" not in _attributes(attrs):
+        return "<tg-emoji> without emoji-id"
+    return None
+
+
+def _entity_ok(name: str) -> bool:
+    """Whether Telegram accepts the entity ``&name;``."""
+    if name[0] != "#":
+        return name in _NAMED_ENTITIES
+    code = int(name[2:], 16) if name[1] in "xX" else int(name[1:])
+    return 0 < code <= 0x10FFFF and not 0xD800 <= code <= 0xDFFF
+
+
+def repair_html(html: str) -> tuple[str, list[str]]:
+    """Make HTML acceptable to Telegram's parser, in one pass.
+
+    Unsupported or misplaced tags (anything inside <code>, anything but
+    <code> inside <pre>, nested links or quotes, links without an href)
+    are dropped and their text kept; stray closing tags are dropped;
+    misnested tags are closed and reopened; tags left open are closed;
+    stray <, >, & and entities Telegram does not know are escaped.
 
     Args:
-        html: The full HTML string.
-        max_length: Maximum characters per chunk.
+        html: HTML to check.
 
     Returns:
-        List of HTML chunks, each within max_length.
+        The repaired HTML (unchanged if it was fine) and a description
+        of each problem found.
     """
-    if len(html) <= max_length:
-        return [html]
-
-    CLOSE_TAGS = "</code></pre>"
-    OPEN_TAGS = "<pre><code>"
-    TAG_OVERHEAD = len(CLOSE_TAGS)  # 13 chars reserved for closing
-
-    chunks: list[str] = []
-    remaining = html
-    in_pre = False  # Track if we're continuing a split pre block
-
-    while remaining:
-        if len(remaining) <= max_length:
-            chunks.append(remaining.strip())
-            break
-
-        # Reduce effective limit if we might need to append closing tags
-        effective_limit = max_length - TAG_OVERHEAD if in_pre else max_length
-        # Safety floor: never go below half the limit
-        effective_limit = max(effective_limit, max_length // 2)
-
-        candidate = remaining[:effective_limit]
-
-        # Count pre tag balance in the candidate
-        pre_opens = candidate.count("<pre")
-        pre_closes = candidate.count("</pre>")
-        currently_in_pre = in_pre or (pre_opens > pre_closes)
-
-        split_pos = -1
-
-        if currently_in_pre:
-            # Try to find the closing </pre> within the full max_length
-            close_pos = remaining.find("</pre>")
-            if close_pos != -1:
-                end_pos = close_pos + len("</pre>")
-                if end_pos <= max_length:
-                    # We can include the entire pre block
-                    split_pos = end_pos
-                    currently_in_pre = False
+    out: list[str] = []
+    problems: list[str] = []
+    # Open tags: (name, opening tag, kept). Dropped ones are tracked too
+    # so that their closing tags are dropped with them.
+    stack: list[tuple[str, str, bool]] = []
+    pos = 0
+
+    for match in _MARKUP.finditer(html):
+        out.append(html[pos:match.start()])
+        pos = match.end()
+        token = match.group()
+        name = match.group(2)
+
+        if name is not None:
+            name = name.lower()
+            if not match.group(1):
+                kept = [entry for entry in stack if entry[2]]
+                problem = _tag_problem(
+                    name, match.group(3), kept[-1][0] if kept else None,
+                    {entry[0] for entry in kept},
+                )
+                if problem is not None:
+                    problems.append(problem)
                 else:
-                    # Pre block too long — split at line boundary within it
-                    split_pos = candidate.rfind("\n")
-                    if split_pos <= 0:
-                        split_pos = effective_limit
+                    if name != match.group(2):
+                        token = f"<{name}{match.group(3)}>"
+                    out.append(token)
+                stack.append((name, token, problem is None))
+                continue
+
+            depth = next((i for i in range(len(stack) - 1, -1, -1) if stack[i][0] == name), None)
+            if depth is None:
+                problems.append(f"stray </{name}>")
+                continue
+            if not stack[depth][2]:
+                del stack[depth]  # Closes a dropped tag
+                continue
+            inner = [entry for entry in stack[depth + 1:] if entry[2]]
+            if inner:
+                problems.append(f"misnested </{name}>")
+            for entry in reversed(inner):
+                out.append(f"</{entry[0]}>")
+            out.append(f"</{name}>")
+            del stack[depth:]
+            for entry in inner:
+                out.append(entry[1])
+                stack.append(entry)
+        elif match.group(4) is not None:
+            if _entity_ok(match.group(4)):
+                out.append(token)
             else:
-                # No closing tag found at all — split at line boundary
-                split_pos = candidate.rfind("\n")
-                if split_pos <= 0:
-                    split_pos = effective_limit
+                problems.append(f"unsupported entity {token}")
+                out.append(_escape_html(unescape(token)))
         else:
-            # Not in pre — prefer paragraph breaks, then line breaks
-            split_pos = candidate.rfind("\n\n")
-            if split_pos <= 0:
-                split_pos = candidate.rfind("\n")
-            if split_pos <= 0:
-                split_pos = effective_limit
+            problems.append(f"unescaped {token}")
+            out.append(_escape_html(token))
 
-        chunk = remaining[:split_pos].strip()
-        remaining = remaining[split_pos:].strip()
+    out.append(html[pos:])
+    for name, _, kept in reversed(stack):
+        if kept:
+            problems.append(f"unclosed <{name}>")
+            out.append(f"</{name}>")
 
-        if chunk:
-            # Check if this chunk has unclosed <pre> tags
-            chunk_pre_opens = chunk.count("<pre")
-            chunk_pre_closes = chunk.count("</pre>")
-
-            if chunk_pre_opens > chunk_pre_closes:
-                # Need to append closing tags — check if it fits
-                if len(chunk) + len(CLOSE_TAGS) > max_length:
-                    # Closing tags would push over limit — trim the chunk
-                    overshoot = len(chunk) + len(CLOSE_TAGS) - max_length
-                    # Find a line break to trim at
-                    trim_pos = chunk.rfind("\n", 0, len(chunk) - overshoot)
-                    if trim_pos > 0:
-                        remaining = chunk[trim_pos:].lstrip() + "\n" + remaining
-                        chunk = chunk[:trim_pos]
-                chunk += CLOSE_TAGS
-                in_pre = True
-            else:
-                in_pre = False
+    if not problems:
+        return html, problems
+    return "".join(out), problems
 
-            chunks.append(chunk)
-        else:
-            # Avoid infinite loop on empty chunks
-            if remaining:
-                # Force progress
-                chunks.append(remaining[:max_length].strip())
-                remaining = remaining[max_length:].strip()
-            in_pre = False
 
-        # Re-open pre block for continuation if needed
-        if in_pre and remaining and not remaining.startswith("<pre"):
-            remaining = OPEN_TAGS + remaining
+class HtmlValidator:
+    """Check chunks locally before they are sent to Telegram.
 
-    return [c for c in chunks if c]
+    prepare() repairs what Telegram would reject (see repair_html()) and
+    splits a chunk whose text is over the length limit, so a chunk
+    should not need a second or third API call through the plain-text
+    fallback; record_fallback() and record_truncation() count the times
+    it still does.
+
+    Args:
+        max_length: Maximum UTF-16 code units of text per message.
+    """
+
+    def __init__(self, max_length: int = MAX_MESSAGE_LENGTH) -> None:
+        self._max_length = max_length
+        self._checked = 0
+        self._repaired = 0
+        self._split = 0
+        self._fallbacks = 0
+        self._truncated = 0
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Chunks checked, repaired and split, and fallbacks still needed."""
+        return {
+            "checked": self._checked,
+            "repaired": self._repaired,
+            "split": self._split,
+            "fallbacks": self._fallbacks,
+            "truncated": self._truncated,
+        }
+
+    def prepare(self, html: str) -> list[str]:
+        """Return the chunk repaired, as one or more messages."""
+        self._checked += 1
+        html, problems = repair_html(html)
+        if problems:
+            self._repaired += 1
+            logger.warning(
+                "Repaired HTML before sending (%d problems): %s",
+                len(problems), "; ".join(problems[:5]),
+            )
+        if _utf16_len(html) <= self._max_length:
+            return [html]
+        splitter = _ChunkSplitter(self._max_length)
+        parts = splitter.feed(html) + splitter.close()
+        if len(parts) > 1:
+            self._split += 1
+        return parts or [html]
+
+    def record_fallback(self) -> None:
+        """Count a chunk Telegram rejected anyway and got as plain text."""
+        self._fallbacks += 1
+
+    def record_truncation(self) -> None:
+        """Count a chunk whose plain text was rejected too and got truncated."""
+        self._truncated += 1
 
 
 # ------------------------------------------------------------------
 # Public API
 # ------------------------------------------------------------------
 
-def format_response(markdown_text: str) -> list[str]:
-    """Convert A0 markdown response to Telegram-safe HTML chunks.
+def iter_format_response(markdown_text: str) -> Iterator[str]:
+    """Convert A0 markdown response to Telegram-safe HTML chunks, lazily.
 
-    Pipeline:
-    1. Extract fenced code blocks (content escaped, replaced with placeholders)
-    2. Extract tables (content escaped, replaced with placeholders)
-    3. Escape all remaining plain text (< > &)
-    4. Convert line-level elements (headers, blockquotes)
-    5. Convert inline formatting (bold, italic, code, links, images)
-    6. Restore code blocks and tables from placeholders
-    7. Clean up and split into Telegram-sized chunks
+    Two passes over the text:
+    1. Block pass: cut out fenced code blocks and classify each line
+       (table row, header, blockquote, rule or ordinary text).
+    2. Inline pass: tokenize each paragraph of ordinary text once and
+       render code, links, images and emphasis.
+    The HTML is fed to the splitter as it is produced, so each chunk is
+    yielded as soon as it is complete and the first one can be sent while
+    the rest of a long response is still being formatted.
 
     Args:
         markdown_text: Raw markdown text from Agent Zero.
 
-    Returns:
-        List of HTML strings, each within Telegram's 4096-char limit.
+    Yields:
+        HTML strings, each within Telegram's 4096-char limit.
     """
     if not markdown_text or not markdown_text.strip():
-        return []
+        return
+
+    splitter = _ChunkSplitter()
+    # Feed the splitter about a message's worth of HTML at a time
+    pending: list[str] = []
+    pending_size = 0
+    for piece in _iter_blocks(markdown_text):
+        pending.append(piece)
+        pending_size += len(piece)
+        if pending_size >= MAX_MESSAGE_LENGTH:
+            yield from splitter.feed("".join(pending))
+            pending.clear()
+            pending_size = 0
+    yield from splitter.feed("".join(pending))
+    yield from splitter.close()
 
-    text = markdown_text
 
-    # Step 1: Extract fenced code blocks (protect from all processing)
-    text, blocks = _extract_fenced_blocks(text)
+def format_response(markdown_text: str) -> list[str]:
+    """Convert A0 markdown response to Telegram-safe HTML chunks.
 
-    # Step 2: Extract tables (protect from inline processing)
-    text = _extract_tables(text, blocks)
+    Args:
+        markdown_text: Raw markdown text from Agent Zero.
 
-    # Step 3: Escape ALL remaining plain text
-    # Split on placeholders to avoid escaping them
-    parts = re.split(r"(««BLK_\d+»»)", text)
-    escaped_parts = []
-    for part in parts:
-        if part.startswith("««BLK_"):
-            escaped_parts.append(part)  # Placeholder — pass through
-        else:
-            escaped_parts.append(_escape_html(part))
-    text = "".join(escaped_parts)
+    Returns:
+        List of HTML strings, each within Telegram's 4096-char limit
+        (see iter_format_response).
+    """
+    return list(iter_format_response(markdown_text))
 
-    # Step 4: Convert line-level elements (headers, blockquotes, HRs)
-    text = _convert_line_elements(text)
 
-    # Step 5: Apply inline formatting (bold, italic, code, links, images)
-    text = _convert_inline(text)
+class IncrementalFormatter:
+    """Format a markdown response that arrives in pieces.
 
-    # Step 6: Restore code blocks and tables
-    for idx, html in blocks.items():
-        placeholder = _BLOCK_PLACEHOLDER.format(idx=idx)
-        text = text.replace(placeholder, html)
+    Re-running format_response() on the whole text after every update is
+    quadratic over the life of a response. Here, text up to the last
+    stable block boundary — the end of a blank line outside any code
+    block, where the block and inline passes start afresh anyway — is
+    converted once and fed to a splitter that is kept between calls, so
+    the chunks it completes are final. Only the text after that boundary
+    is rendered again on each update, on a copy of the splitter. A fenced
+    block that is still open is shown as if it were closed at the end.
 
-    # Step 7: Clean up excessive blank lines
-    text = re.sub(r"\n{3,}", "\n\n", text)
-    text = text.strip()
+    Once finish() has run, the chunks returned by feed() and finish()
+    together match format_response() on the whole text.
 
-    # Step 8: Split into Telegram-sized chunks
-    return _split_message(text)
+    Args:
+        max_length: Maximum UTF-16 code units of text per chunk.
+    """
+
+    def __init__(self, max_length: int = MAX_MESSAGE_LENGTH) -> None:
+        self._splitter = _ChunkSplitter(max_length)
+        self._pending = ""  # Text after the last stable boundary
+        self._scanned = 0  # End of the complete lines scanned in _pending
+        self._fence_search = 0  # Where to look for the next ``` in _pending
+        self._in_fence = False  # A fence opened in the scanned text is unclosed
+
+    def feed(self, markdown_text: str) -> tuple[list[str], list[str]]:
+        """Append text to the response.
+
+        Returns:
+            The chunks finalised by this text, and the provisional chunks
+            that currently follow them (the last one is the growing tail).
+        """
+        self._pending += markdown_text
+        boundary = self._scan()
+        final: list[str] = []
+        if boundary:
+            stable, self._pending = self._pending[:boundary], self._pending[boundary:]
+            self._scanned -= boundary
+            self._fence_search -= boundary
+            for piece in _iter_blocks(stable):
+                final.extend(self._splitter.feed(piece))
+        return final, self._render_tail()
+
+    def finish(self) -> list[str]:
+        """Format the rest of the response and return its chunks."""
+        chunks: list[str] = []
+        for piece in _iter_blocks(self._pending):
+            chunks.extend(self._splitter.feed(piece))
+        chunks.extend(self._splitter.close())
+        self._pending = ""
+        self._scanned = self._fence_search = 0
+        self._in_fence = False
+        return chunks
+
+    def _scan(self) -> int:
+        """Scan newly completed lines; return the last stable boundary (0 = none).
+
+        Fences are paired the way _split_lines() pairs them: an opener
+        with the next ``` after it, even on the same line.
+        """
+        text = self._pending
+        end = text.rfind("\n") + 1
+        boundary = 0
+        line_start = self._scanned
+        while line_start < end:
+            line_end = text.index("\n", line_start) + 1
+            while True:
+                fence = text.find("```", max(self._fence_search, line_start), line_end)
+                if fence == -1:
+                    break
+                if self._in_fence:
+                    self._fence_search = fence + 3
+                else:
+                    self._fence_search = _FENCE_OPEN.match(text, fence).end()
+                self._in_fence = not self._in_fence
+            if not self._in_fence and text[line_start:line_end].isspace():
+                boundary = line_end
+            line_start = line_end
+        self._scanned = end
+        return boundary
+
+    def _render_tail(self) -> list[str]:
+        """Format the text after the stable boundary on a copy of the splitter."""
+        tail = self._pending
+        in_fence = self._in_fence
+        search = max(self._fence_search, self._scanned)
+        while True:
+            fence = tail.find("```", search)
+            if fence == -1:
+                break
+            search = fence + 3 if in_fence else _FENCE_OPEN.match(tail, fence).end()
+            in_fence = not in_fence
+        if in_fence:
+            tail += "```"  # Show the open block as code while it streams
+
+        splitter = self._splitter.fork()
+        chunks: list[str] = []
+        for piece in _iter_blocks(tail):
+            chunks.extend(splitter.feed(piece))
+        chunks.extend(splitter.close())
+        return chunks
 
 
 def strip_html(text: str) -> str:
@@ -0,0 +1,194 @@
+"""Detached A0 jobs.
+
+With ``agent_zero.detached_jobs`` enabled, each message becomes a job that
+is persisted through the StateManager and runs in its own task, so the
+aiogram handler returns immediately and Agent Zero may take as long as it
+needs — the answer is delivered to the chat whenever it arrives.
+
+Jobs survive restarts: on startup, jobs that were still queued are run
+again, and jobs that were already running (A0 had received the message,
+but its answer was lost with the process) are reported to their chat.
+"""
+
+import asyncio
+import logging
+import uuid
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+
+from bot.a0_client import A0Client
+from bot.config import ConfigProvider
+from bot.contexts import ContextRouter
+from bot.dispatch import ContextDispatcher
+from bot.fair import FairScheduler
+from bot.progress import ProgressStreamer
+from bot.relay import (
+    RELAY_ERRORS,
+    deliver_response,
+    describe_error,
+    queue_position_reporter,
+    relay_to_a0,
+)
+from bot.state import JobState, StateManager
+
+logger = logging.getLogger(__name__)
+
+INTERRUPTED_TEXT = (
+    "⚠️ The bot restarted while Agent Zero was working on this message, "
+    "so its answer could not be delivered. You can find it in the Agent Zero "
+    "web UI, or send the message again."
+)
+
+
+class JobManager:
+    """Run, track and resume detached A0 requests.
+
+    Args:
+        bot: Bot used to deliver results.
+        state_manager: Where jobs are persisted.
+        a0_client: The A0 API client.
+        context_router: Resolves and persists contexts.
+        context_dispatcher: Per-conversation request queue.
+        fair_scheduler: Global in-flight cap shared across users.
+        config_provider: Source of the current config for each job.
+        progress_streamer: Mirrors A0 progress into the processing message.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        state_manager: StateManager,
+        a0_client: A0Client,
+        context_router: ContextRouter,
+        context_dispatcher: ContextDispatcher,
+        fair_scheduler: FairScheduler,
+        config_provider: ConfigProvider,
+        progress_streamer: ProgressStreamer,
+    ) -> None:
+        self._bot = bot
+        self._state_manager = state_manager
+        self._a0_client = a0_client
+        self._context_router = context_router
+        self._context_dispatcher = context_dispatcher
+        self._fair_scheduler = fair_scheduler
+        self._config_provider = config_provider
+        self._progress_streamer = progress_streamer
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._resumed = 0
+        self._interrupted = 0
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Counters for submitted, finished and restart-affected jobs."""
+        return {
+            "active": len(self._tasks),
+            "submitted": self._submitted,
+            "completed": self._completed,
+            "failed": self._failed,
+            "resumed": self._resumed,
+            "interrupted": self._interrupted,
+        }
+
+    def submit(
+        self, chat_id: int, user_id: int, text: str, processing_message_id: int,
+    ) -> JobState:
+        """Persist a new job and start running it in the background.
+
+        Args:
+            chat_id: Chat the answer is delivered to.
+            user_id: Telegram user ID of the sender.
+            text: The message text for A0.
+            processing_message_id: The "⏳ Processing..." message to update.
+
+        Returns:
+            The persisted JobState.
+        """
+        job = self._state_manager.add_job(
+            job_id=uuid.uuid4().hex[:8],
+            chat_id=chat_id,
+            user_id=user_id,
+            message=text,
+            processing_message_id=processing_message_id,
+        )
+        self._submitted += 1
+        self._start(job)
+        return job
+
+    async def resume(self) -> None:
+        """Re-run queued jobs and report interrupted ones after a restart."""
+        for job in self._state_manager.list_jobs():
+            if job.job_id in self._tasks:
+                continue
+            if job.status == "running":
+                logger.warning("Job %s was interrupted by a restart", job.job_id)
+                self._interrupted += 1
+                await self._edit(job, INTERRUPTED_TEXT)
+                self._state_manager.remove_job(job.job_id)
+            else:
+                logger.info("Resuming queued job %s", job.job_id)
+                self._resumed += 1
+                self._start(job)
+
+    async def close(self) -> None:
+        """Cancel running job tasks; their jobs stay persisted for resume()."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _start(self, job: JobState) -> None:
+        """Run a job in its own task."""
+        task = asyncio.create_task(self._run(job), name=f"a0-job-{job.job_id}")
+        self._tasks[job.job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.job_id, None))
+
+    async def _run(self, job: JobState) -> None:
+        """Relay a job to A0, deliver the outcome and stop tracking it.
+
+        Cancellation (shutdown) leaves the job persisted, so the next
+        start can resume or report it.
+        """
+        config = self._config_provider.get()
+        try:
+            result = await relay_to_a0(
+                job.message,
+                job.user_id,
+                config,
+                self._a0_client,
+                self._context_router,
+                self._context_dispatcher,
+                self._fair_scheduler,
+                on_position=queue_position_reporter(
+                    self._bot, job.chat_id, job.processing_message_id,
+                ),
+                on_start=lambda: self._state_manager.set_job_status(job.job_id, "running"),
+                progress=self._progress_streamer.follower(
+                    self._bot, job.chat_id, job.processing_message_id, config,
+                ),
+                wait_forever=True,
+            )
+            await deliver_response(
+                self._bot, job.chat_id, job.processing_message_id, result.get("response", ""),
+            )
+            self._completed += 1
+        except RELAY_ERRORS as e:
+            self._failed += 1
+            await self._edit(job, describe_error(e, job.user_id))
+        except Exception:
+            self._failed += 1
+            logger.exception("Job %s failed", job.job_id)
+        self._state_manager.remove_job(job.job_id)
+
+    async def _edit(self, job: JobState, text: str) -> None:
+        """Replace a job's processing message, ignoring Telegram errors."""
+        try:
+            await self._bot.edit_message_text(
+                text=text, chat_id=job.chat_id, message_id=job.processing_message_id,
+            )
+        except TelegramAPIError as e:
+            logger.warning("Could not update job %s in chat %d: %s", job.job_id, job.chat_id, e)
@@ -1,8 +1,9 @@
-"""Bot entry point: initialize, wire dependencies, and start polling."""
+"""Bot entry point: initialize, wire dependencies, and start polling or the webhook server."""
 
 import asyncio
 import logging
 import sys
+from dataclasses import dataclass
 from pathlib import Path
 
 from aiogram import Bot, Dispatcher
@@ -10,9 +11,19 @@ from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 
 from bot.a0_client import A0Client
-from bot.config import load as load_config
+from bot.aggregate import MessageAggregator
+from bot.config import BotConfig, ConfigProvider
+from bot.contexts import ContextRouter
+from bot.dispatch import ContextDispatcher
+from bot.fair import FairScheduler
+from bot.jobs import JobManager
+from bot.progress import ProgressStreamer
 from bot.middleware.auth import AuthMiddleware
-from bot.state import StateManager
+from bot.middleware.dedup import DedupMiddleware
+from bot.middleware.outbound import OutboundScheduler
+from bot.relay import html_validator
+from bot.state import StateManager, create_state_manager
+from bot.webhook import WebhookServer
 from bot.routers import commands, messages
 
 logger = logging.getLogger(__name__)
@@ -30,31 +41,34 @@ def setup_logging() -> None:
     logging.getLogger("aiohttp").setLevel(logging.WARNING)
 
 
-async def main() -> None:
-    """Main async entry point."""
-    setup_logging()
-    logger.info("Starting Agent Zero Telegram Bot...")
-
-    # Load configuration
-    config_path = Path("config.json")
-    try:
-        config = load_config(config_path)
-    except Exception as e:
-        logger.error("Failed to load configuration: %s", e)
-        sys.exit(1)
-
-    logger.info("Configuration loaded. A0 endpoint: %s", config.agent_zero.base_url)
+def create_bot(config: BotConfig) -> Bot:
+    """Create the Bot instance."""
+    return Bot(
+        token=config.telegram.bot_token,
+        default=DefaultBotProperties(
+            parse_mode=ParseMode.HTML,
+        ),
+    )
 
-    # Initialize state manager
-    state_manager = StateManager(config.state_file)
-    state_manager.load()
-    logger.info("State manager initialized (state file: %s)", config.state_file)
 
-    # Initialize A0 client
+def create_a0_client(config: BotConfig) -> A0Client:
+    """Create the A0 client from the agent_zero config section."""
     a0_client = A0Client(
         base_url=config.agent_zero.base_url,
         api_key=config.agent_zero.api_key,
         timeout=config.agent_zero.timeout,
+        connect_timeout=config.agent_zero.connect_timeout,
+        connection_limit=config.agent_zero.connection_limit,
+        connection_limit_per_host=config.agent_zero.connection_limit_per_host,
+        keepalive_timeout=config.agent_zero.keepalive_timeout,
+        dns_cache_ttl=config.agent_zero.dns_cache_ttl,
+        unix_socket=config.agent_zero.unix_socket,
+        retries=config.agent_zero.retries,
+        retry_backoff=config.agent_zero.retry_backoff_ms / 1000,
+        retry_backoff_max=config.agent_zero.retry_backoff_max_ms / 1000,
+        retry_statuses=tuple(config.agent_zero.retry_statuses),
+        breaker_threshold=config.agent_zero.breaker_threshold,
+        breaker_reset_timeout=config.agent_zero.breaker_reset_seconds,
     )
     timeout_log = config.agent_zero.timeout if config.agent_zero.timeout else "infinite"
     logger.info(
@@ -62,40 +76,169 @@ async def main() -> None:
         config.agent_zero.base_url,
         timeout_log,
     )
+    return a0_client
+
+
+@dataclass
+class Runtime:
+    """Everything needed to handle updates in one process."""
+    bot: Bot
+    dispatcher: Dispatcher
+    state_manager: StateManager
+    a0_client: A0Client
+    job_manager: JobManager
+    outbound: OutboundScheduler | None
+
+    async def close(self) -> None:
+        """Stop background work and release connections."""
+        await self.job_manager.close()
+        if self.outbound is not None:
+            await self.outbound.close()
+        await self.state_manager.close()
+        logger.info("State writes: %s", self.state_manager.stats)
+        await self.a0_client.close()
+        await self.bot.session.close()
+
+
+def create_runtime(
+    config: BotConfig,
+    config_path: Path,
+    config_provider: ConfigProvider,
+    state_manager: StateManager,
+) -> Runtime:
+    """Build the bot, dispatcher and handler dependencies.
+
+    Args:
+        config: Configuration snapshot at startup.
+        config_path: Path of config.json (used by the CLI-style commands).
+        config_provider: Hot-reloading config source.
+        state_manager: A loaded StateManager.
+    """
+    a0_client = create_a0_client(config)
+    bot = create_bot(config)
+    dp = Dispatcher()
 
-    # Initialize bot and dispatcher
-    bot = Bot(
-        token=config.telegram.bot_token,
-        default=DefaultBotProperties(
-            parse_mode=ParseMode.HTML,
-        ),
+    # Pace every send/edit through one outbound queue
+    outbound: OutboundScheduler | None = None
+    if config.telegram.send_rate_global > 0:
+        outbound = OutboundScheduler(
+            global_rate=config.telegram.send_rate_global,
+            chat_rate=config.telegram.send_rate_per_chat,
+            chat_burst=config.telegram.send_burst_per_chat,
+            priority_max_length=config.telegram.send_priority_max_length,
+            max_retry_after=config.telegram.send_retry_after_max,
+        )
+        bot.session.middleware(outbound)
+        logger.info(
+            "Outbound scheduler registered (%.1f/s global, %.1f/s per chat)",
+            config.telegram.send_rate_global,
+            config.telegram.send_rate_per_chat,
+        )
+
+    context_router = ContextRouter(state_manager)
+    context_dispatcher = ContextDispatcher(config.agent_zero.queue_max_depth)
+    fair_scheduler = FairScheduler(
+        max_in_flight=config.agent_zero.max_in_flight,
+        user_backlog=config.agent_zero.user_backlog,
+    )
+    progress_streamer = ProgressStreamer(a0_client)
+    job_manager = JobManager(
+        bot, state_manager, a0_client, context_router, context_dispatcher, fair_scheduler,
+        config_provider, progress_streamer,
     )
-    dp = Dispatcher()
 
     # Inject dependencies via workflow_data
     dp.workflow_data["config"] = config
     dp.workflow_data["config_path"] = config_path
+    dp.workflow_data["config_provider"] = config_provider
     dp.workflow_data["state_manager"] = state_manager
     dp.workflow_data["a0_client"] = a0_client
-
-    # Register middleware
-    dp.message.outer_middleware(AuthMiddleware())
-    dp.callback_query.outer_middleware(AuthMiddleware())
+    dp.workflow_data["context_router"] = context_router
+    dp.workflow_data["context_dispatcher"] = context_dispatcher
+    dp.workflow_data["fair_scheduler"] = fair_scheduler
+    dp.workflow_data["message_aggregator"] = MessageAggregator(config.telegram.debounce_ms)
+    dp.workflow_data["job_manager"] = job_manager
+    dp.workflow_data["progress_streamer"] = progress_streamer
+    dp.workflow_data["outbound_scheduler"] = outbound
+    dp.workflow_data["html_validator"] = html_validator
+
+    # Register middleware (one instance, so rate limits span update types)
+    auth = AuthMiddleware(
+        sender_rate=config.telegram.unapproved_rate,
+        sender_burst=config.telegram.unapproved_burst,
+        challenge_rate=config.telegram.verification_rate,
+        challenge_burst=config.telegram.verification_burst,
+        max_pending=config.telegram.max_pending_verifications,
+    )
+    dp.message.outer_middleware(auth)
+    dp.callback_query.outer_middleware(auth)
+    dp.workflow_data["auth_middleware"] = auth
     logger.info("Auth middleware registered")
 
+    # Drop redelivered updates (after auth, so spam never writes state)
+    if config.telegram.dedup_window > 0:
+        dedup = DedupMiddleware(state_manager, config.telegram.dedup_window)
+        dp.message.outer_middleware(dedup)
+        dp.callback_query.outer_middleware(dedup)
+        dp.workflow_data["dedup_middleware"] = dedup
+        logger.info("Dedup middleware registered (window: %d)", config.telegram.dedup_window)
+
     # Register routers
     dp.include_router(commands.router)
     dp.include_router(messages.router)
 
-    logger.info("Routers registered. Starting long polling...")
+    return Runtime(bot, dp, state_manager, a0_client, job_manager, outbound)
 
-    try:
+
+async def receive_updates(config: BotConfig, dp: Dispatcher, bot: Bot) -> None:
+    """Receive updates with the configured run mode until stopped."""
+    logger.info("Run mode: %s", config.run_mode)
+    if config.run_mode == "webhook":
+        webhook_server = WebhookServer(dp, bot, config.webhook)
+        dp.workflow_data["webhook_server"] = webhook_server
+        await webhook_server.run()
+    else:
+        # getUpdates fails while a webhook is registered (e.g. after
+        # switching back from webhook mode)
+        await bot.delete_webhook()
         await dp.start_polling(bot)
+
+
+async def main() -> None:
+    """Main async entry point."""
+    setup_logging()
+    logger.info("Starting Agent Zero Telegram Bot...")
+
+    # Load configuration
+    config_path = Path("config.json")
+    config_provider = ConfigProvider(config_path)
+    try:
+        config = config_provider.get()
+    except Exception as e:
+        logger.error("Failed to load configuration: %s", e)
+        sys.exit(1)
+
+    logger.info("Configuration loaded. A0 endpoint: %s", config.agent_zero.base_url)
+
+    # Initialize state manager
+    state_manager = create_state_manager(config)
+    state_manager.load()
+    logger.info(
+        "State manager initialized (backend: %s, state file: %s)",
+        config.state_backend,
+        config.state_file,
+    )
+
+    runtime = create_runtime(config, config_path, config_provider, state_manager)
+    logger.info("Routers registered.")
+
+    try:
+        # Pick up detached jobs left over from the previous run
+        await runtime.job_manager.resume()
+        await receive_updates(config, runtime.dispatcher, runtime.bot)
     finally:
         logger.info("Shutting down...")
-        state_manager.save()
-        await a0_client.close()
-        await bot.session.close()
+        await runtime.close()
         logger.info("Shutdown complete.")
 
 
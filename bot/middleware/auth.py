@@ -2,37 +2,104 @@
 
 Outer middleware that gates all incoming updates based on user approval status.
 Unapproved users receive a verification code; pending users are silently dropped.
+Unapproved traffic is rate limited so a spam wave cannot turn into one state
+write and one Telegram reply per message.
 """
 
 import logging
 import secrets
-from datetime import datetime, timezone
-from pathlib import Path
+from collections import OrderedDict
 from typing import Any, Awaitable, Callable
 
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, Message, CallbackQuery
 
-from bot.config import load as load_config, BotConfig
+from bot.allowlist import Allowlist
+from bot.config import ConfigProvider
+from bot.ratelimit import TokenBucket
 from bot.state import StateManager
 
 logger = logging.getLogger(__name__)
 
 # Constants
 CODE_EXPIRY_MINUTES = 10
+# Unapproved senders whose rate limit state is kept (least recent evicted first)
+MAX_TRACKED_SENDERS = 10_000
 
 
 class AuthMiddleware(BaseMiddleware):
     """Outer middleware that enforces user approval before handlers run.
 
     Behavior:
-    - Approved users (in config.approved_users) pass through immediately.
+    - Approved users (in config.approved_users or the approved_users_file
+      allowlist) pass through immediately.
     - Unknown users receive a verification code and are dropped.
     - Pending users (with a non-expired code) are silently dropped.
-    - Config is re-read from disk on every call for hot-reload support.
-    - Expired codes are lazily cleaned up on each invocation.
+    - Unapproved updates over the per-sender or global rate, or arriving
+      while ``max_pending`` codes are outstanding, are silently dropped
+      before any state write or Telegram call.
+    - Config is hot-reloaded via ConfigProvider whenever config.json changes.
+    - Expired codes are lazily cleaned up before a new code is issued.
+
+    One instance should be shared by all update types so the limits apply
+    to the sender's traffic as a whole.
+
+    Args:
+        sender_rate: Unapproved updates per second accepted from one sender.
+        sender_burst: Back-to-back updates allowed for a quiet sender.
+        challenge_rate: New verification codes issued per second overall
+            (0 = unlimited).
+        challenge_burst: Codes that may be issued back to back.
+        max_pending: Outstanding verification codes (0 = unlimited).
     """
 
+    def __init__(
+        self,
+        sender_rate: float = 0.2,
+        sender_burst: int = 3,
+        challenge_rate: float = 1.0,
+        challenge_burst: int = 5,
+        max_pending: int = 100,
+    ) -> None:
+        self._sender_rate = sender_rate
+        self._sender_burst = sender_burst
+        self._max_pending = max_pending
+        self._challenge_bucket = (
+            TokenBucket(challenge_rate, challenge_burst) if challenge_rate > 0 else None
+        )
+        # sender_id -> bucket, least recently seen first
+        self._senders: OrderedDict[int, TokenBucket] = OrderedDict()
+        self._allowlist: Allowlist | None = None
+        self._allowlist_path: str | None = None
+        self._approved = 0
+        self._challenged = 0
+        self._dropped_pending = 0
+        self._dropped_rate = 0
+        self._dropped_full = 0
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Approved, challenged and dropped update counters."""
+        return {
+            "approved": self._approved,
+            "challenged": self._challenged,
+            "dropped": self._dropped_pending + self._dropped_rate + self._dropped_full,
+            "dropped_pending": self._dropped_pending,
+            "dropped_rate": self._dropped_rate,
+            "dropped_full": self._dropped_full,
+            "senders_tracked": len(self._senders),
+            "allowlist_members": self._allowlist.stats["members"] if self._allowlist else 0,
+        }
+
+    def _allowlist_for(self, path: str | None) -> Allowlist | None:
+        """Return the allowlist for the configured file (re-created if it changed)."""
+        if path is None:
+            self._allowlist = None
+        elif self._allowlist is None or self._allowlist_path != path:
+            self._allowlist = Allowlist(path)
+            self._allowlist_path = path
+        return self._allowlist
+
     async def __call__(
         self,
         handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
@@ -46,38 +113,65 @@ class AuthMiddleware(BaseMiddleware):
             return await handler(event, data)
 
         # Get dependencies from workflow_data
-        config_path: Path = data["config_path"]
+        config_provider: ConfigProvider = data["config_provider"]
         state_manager: StateManager = data["state_manager"]
 
-        # Hot-reload config from disk to pick up CLI changes immediately
+        # Hot-reload config to pick up CLI changes immediately. The provider
+        # only re-parses config.json when its stat identity has changed and
+        # keeps serving the last good snapshot if a reload fails.
         try:
-            config = load_config(config_path)
+            snapshot = config_provider.snapshot()
+            config, approved_users = snapshot.config, snapshot.approved_users
         except Exception as e:
-            logger.error("Failed to reload config from %s: %s", config_path, e)
+            logger.error("Failed to load config from %s: %s", config_provider.path, e)
             # Fall back to the config already in workflow_data
             config = data["config"]
+            approved_users = frozenset(config.telegram.approved_users)
 
-        # Update the config in workflow_data so handlers see the fresh version
+        # Hand handlers the current snapshot
         data["config"] = config
 
-        # Lazy cleanup of expired pending verifications
-        state_manager.cleanup_expired(max_age_minutes=CODE_EXPIRY_MINUTES)
-
         # 1. Check if user is approved
-        if sender_id in config.telegram.approved_users:
+        allowlist = self._allowlist_for(config.telegram.approved_users_file)
+        if sender_id in approved_users or (allowlist is not None and sender_id in allowlist):
+            self._approved += 1
             return await handler(event, data)
 
-        # 2. Check if user already has a pending (non-expired) verification
-        pending = self._find_pending_for_user(state_manager, sender_id)
+        # 2. Rate limit the sender before touching state
+        if not self._admit_sender(sender_id):
+            self._dropped_rate += 1
+            return None
+
+        # 3. Check if user already has a pending (non-expired) verification
+        pending = state_manager.get_pending_for_user(
+            sender_id, max_age_minutes=CODE_EXPIRY_MINUTES,
+        )
         if pending is not None:
             # Silently drop — user already has a pending code
             logger.debug(
                 "Dropping message from pending user %d (code: %s)",
                 sender_id, pending.code,
             )
+            self._dropped_pending += 1
             return None
 
-        # 3. Unknown user — generate a new verification code
+        # Lazy cleanup of expired pending verifications
+        state_manager.cleanup_expired(max_age_minutes=CODE_EXPIRY_MINUTES)
+
+        # 4. Cap the outstanding codes and the rate new ones are issued at
+        if self._max_pending and state_manager.pending_count() >= self._max_pending:
+            if self._dropped_full % 100 == 0:
+                logger.warning(
+                    "%d verification codes outstanding, dropping unapproved updates",
+                    self._max_pending,
+                )
+            self._dropped_full += 1
+            return None
+        if self._challenge_bucket is not None and not self._challenge_bucket.try_take():
+            self._dropped_rate += 1
+            return None
+
+        # 5. Unknown user — generate a new verification code
         code = secrets.token_hex(3).upper()  # 6 hex characters
         username = self._extract_username(event)
 
@@ -93,11 +187,25 @@ class AuthMiddleware(BaseMiddleware):
         )
 
         # Send the verification code to the user
+        self._challenged += 1
         await self._send_verification_message(event, code)
 
         # Drop the update — do not pass to handler
         return None
 
+    def _admit_sender(self, sender_id: int) -> bool:
+        """Take a token from the sender's bucket (unlimited if sender_rate is 0)."""
+        if self._sender_rate <= 0:
+            return True
+        bucket = self._senders.get(sender_id)
+        if bucket is None:
+            bucket = self._senders[sender_id] = TokenBucket(self._sender_rate, self._sender_burst)
+            if len(self._senders) > MAX_TRACKED_SENDERS:
+                self._senders.popitem(last=False)
+        else:
+            self._senders.move_to_end(sender_id)
+        return bucket.try_take()
+
     @staticmethod
     def _extract_sender_id(event: TelegramObject) -> int | None:
         """Extract the sender's Telegram user ID from the event."""
@@ -123,23 +231,6 @@ class AuthMiddleware(BaseMiddleware):
             return user.username
         return None
 
-    @staticmethod
-    def _find_pending_for_user(
-        state_manager: StateManager, user_id: int
-    ) -> Any | None:
-        """Find a pending verification for a given user ID.
-
-        Also enforces the rate limit: if a code was generated less than
-        """
-        now = datetime.now(timezone.utc)
-        for pv in state_manager.state.pending_verifications.values():
-            if pv.user_id == user_id:
-                age_seconds = (now - pv.created_at).total_seconds()
-                # Code is still valid (not expired) — treat as pending
-                if age_seconds < CODE_EXPIRY_MINUTES * 60:
-                    return pv
-        return None
-
     @staticmethod
     async def _send_verification_message(
         event: TelegramObject, code: str
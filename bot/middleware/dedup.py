@@ -0,0 +1,107 @@
+"""Duplicate update suppression.
+
+Telegram redelivers updates the bot did not confirm — after a crash or
+restart in polling mode, or when a webhook request is retried. Without
+this middleware each redelivered message would run through Agent Zero
+again and the user would get the answer twice.
+"""
+
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message, TelegramObject
+
+from bot.state import UPDATE_ID_RESET_GAP, StateManager
+
+logger = logging.getLogger(__name__)
+
+
+class DedupMiddleware(BaseMiddleware):
+    """Outer middleware that drops updates which were already handled.
+
+    Two checks, both O(1) per update:
+    - The highest update_id accepted is recorded in the state manager,
+      which persists it at most once a second (not once per update).
+      Updates at or below the offset stored when the bot started are
+      redeliveries from before the restart; after a crash, updates from
+      the last unwritten second can slip through once.
+    - Within a run, the last ``window`` messages are remembered by
+      (chat_id, message_id), which also catches retried webhook requests
+      and out-of-order redeliveries.
+
+    Register it after the auth middleware so unapproved traffic never
+    causes state writes.
+
+    Args:
+        state_manager: Persists the update offset.
+        window: Messages remembered for the in-memory check.
+    """
+
+    def __init__(self, state_manager: StateManager, window: int = 1000) -> None:
+        self._state_manager = state_manager
+        self._window = window
+        self._floor = state_manager.get_update_offset()
+        self._last_recorded = self._floor
+        self._keys: set[tuple[int, int]] = set()
+        self._order: deque[tuple[int, int]] = deque()
+        self._accepted = 0
+        self._stale = 0
+        self._duplicates = 0
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Accepted and dropped update counters."""
+        return {
+            "accepted": self._accepted,
+            "stale": self._stale,
+            "duplicates": self._duplicates,
+            "window": len(self._order),
+            "offset": self._last_recorded or 0,
+        }
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        update = data.get("event_update")
+        update_id = update.update_id if update is not None else None
+
+        if update_id is not None and self._floor is not None and (
+            self._floor - UPDATE_ID_RESET_GAP < update_id <= self._floor
+        ):
+            logger.info("Dropping update %d redelivered after restart", update_id)
+            self._stale += 1
+            return None
+
+        if isinstance(event, Message) and not self._remember((event.chat.id, event.message_id)):
+            logger.info(
+                "Dropping duplicate message %d in chat %d (update %s)",
+                event.message_id, event.chat.id, update_id,
+            )
+            self._duplicates += 1
+            return None
+
+        if update_id is not None and (
+            self._last_recorded is None
+            or update_id > self._last_recorded
+            or update_id <= self._last_recorded - UPDATE_ID_RESET_GAP
+        ):
+            self._last_recorded = update_id
+            self._state_manager.set_update_offset(update_id)
+
+        self._accepted += 1
+        return await handler(event, data)
+
+    def _remember(self, key: tuple[int, int]) -> bool:
+        """Add a message key to the window; False if it was already there."""
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        self._order.append(key)
+        if len(self._order) > self._window:
+            self._keys.discard(self._order.popleft())
+        return True
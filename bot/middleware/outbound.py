@@ -0,0 +1,285 @@
+"""Outbound scheduler for Telegram sends.
+
+Request (client session) middleware through which every send/edit the
+bot makes is paced, wherever it comes from — answers, progress edits,
+queue positions, job results, command replies:
+
+- A global token bucket keeps the bot under Telegram's ~30 messages/s.
+- A per-chat token bucket (with a small burst) keeps each chat under
+  ~1 message/s.
+- Requests for the same chat run one at a time. The chunks of a long
+  answer are sent one after another by the same task, so they can never
+  overtake each other.
+- Short replies go before bulk chunks — both across chats and within a
+  chat — so one long answer does not hold up everyone else's
+  "⏳ Processing..." or a command reply in the same chat. An edit never
+  overtakes an earlier request for the same message.
+- ``TelegramRetryAfter`` (HTTP 429) is honoured by sleeping for
+  ``retry_after`` while keeping the chat's turn, then retrying.
+
+Methods that are not sends or edits (getUpdates, getMe, ...) bypass it.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Any
+
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.exceptions import TelegramRetryAfter
+
+from bot.ratelimit import TokenBucket
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+    from aiogram.methods import Response, TelegramMethod
+
+logger = logging.getLogger(__name__)
+
+# Bot API methods that count against Telegram's message limits
+PACED_PREFIXES = ("send", "edit", "copy", "forward")
+
+
+class _Pending:
+    """One request waiting for its chat's turn."""
+
+    __slots__ = ("future", "priority", "message_id", "enqueued_at")
+
+    def __init__(self, future: asyncio.Future, priority: bool, message_id: int | None) -> None:
+        self.future = future
+        self.priority = priority
+        self.message_id = message_id
+        self.enqueued_at = time.monotonic()
+
+
+class _Chat:
+    """Per-chat pacing state."""
+
+    __slots__ = ("bucket", "waiting", "busy")
+
+    def __init__(self, bucket: TokenBucket | None) -> None:
+        self.bucket = bucket
+        self.waiting: deque[_Pending] = deque()
+        self.busy = False
+
+    def next_pending(self) -> _Pending | None:
+        """The request to grant next: the oldest short reply, else the oldest.
+
+        A short reply does not jump ahead of an earlier request that
+        edits the same message, so edits land in the order they were made.
+        """
+        # Drop requests cancelled before they were granted
+        while self.waiting and self.waiting[0].future.done():
+            self.waiting.popleft()
+        if not self.waiting:
+            return None
+        edited: set[int] = set()
+        for pending in self.waiting:
+            if pending.future.done():
+                continue
+            if pending.priority and pending.message_id not in edited:
+                return pending
+            if pending.message_id is not None:
+                edited.add(pending.message_id)
+        return self.waiting[0]
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    """Pace Telegram sends globally and per chat.
+
+    Args:
+        global_rate: Sends per second across all chats.
+        chat_rate: Sends per second per chat (0 = not limited per chat).
+        chat_burst: Sends a chat may make back-to-back after being idle.
+        priority_max_length: Texts up to this length are short replies
+            and go before longer chunks.
+        max_retry_after: How often a request is retried after a 429.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        chat_burst: int = 1,
+        priority_max_length: int = 500,
+        max_retry_after: int = 3,
+    ) -> None:
+        self._global = TokenBucket(global_rate)
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        self._priority_max_length = priority_max_length
+        self._max_retry_after = max_retry_after
+        self._chats: dict[int | str, _Chat] = {}
+        self._wakeup = asyncio.Event()
+        self._worker: asyncio.Task | None = None
+        self._sent = 0
+        self._priority_sent = 0
+        self._retry_after = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @property
+    def stats(self) -> dict[str, int | float]:
+        """Queue length, send counts, 429s and queue latency."""
+        return {
+            "queued": sum(len(c.waiting) for c in self._chats.values()),
+            "chats": len(self._chats),
+            "sent": self._sent,
+            "priority_sent": self._priority_sent,
+            "retry_after": self._retry_after,
+            "wait_avg_s": self._wait_total / self._sent if self._sent else 0.0,
+            "wait_max_s": self._wait_max,
+        }
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: "Bot",
+        method: "TelegramMethod[Any]",
+    ) -> "Response[Any]":
+        chat_id = self._paced_chat(method)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        chat = await self._acquire(chat_id, self._is_priority(method), self._edited_message(method))
+        try:
+            attempt = 0
+            while True:
+                try:
+                    return await make_request(bot, method)
+                except TelegramRetryAfter as e:
+                    self._retry_after += 1
+                    if attempt >= self._max_retry_after:
+                        raise
+                    attempt += 1
+                    logger.warning(
+                        "Telegram flood control in chat %s: retrying %s in %ds (%d/%d)",
+                        chat_id, method.__api_method__, e.retry_after,
+                        attempt, self._max_retry_after,
+                    )
+                    await asyncio.sleep(e.retry_after)
+        finally:
+            chat.busy = False
+            self._wakeup.set()
+
+    async def close(self) -> None:
+        """Stop the scheduling task."""
+        worker, self._worker = self._worker, None
+        if worker is not None:
+            worker.cancel()
+            await asyncio.gather(worker, return_exceptions=True)
+
+    @staticmethod
+    def _paced_chat(method: "TelegramMethod[Any]") -> int | str | None:
+        """Return the target chat of a send/edit, or None if not paced."""
+        if not method.__api_method__.startswith(PACED_PREFIXES):
+            return None
+        return getattr(method, "chat_id", None)
+
+    @staticmethod
+    def _edited_message(method: "TelegramMethod[Any]") -> int | None:
+        """Return the message an edit changes, or None for other methods."""
+        if not method.__api_method__.startswith("edit"):
+            return None
+        return getattr(method, "message_id", None)
+
+    def _is_priority(self, method: "TelegramMethod[Any]") -> bool:
+        """True for short replies (and sends without text)."""
+        text = getattr(method, "text", None) or getattr(method, "caption", None)
+        return not isinstance(text, str) or len(text) <= self._priority_max_length
+
+    async def _acquire(self, chat_id: int | str, priority: bool, message_id: int | None) -> _Chat:
+        """Wait until this request may be sent to its chat."""
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            bucket = TokenBucket(self._chat_rate, self._chat_burst) if self._chat_rate > 0 else None
+            chat = self._chats[chat_id] = _Chat(bucket)
+
+        pending = _Pending(asyncio.get_running_loop().create_future(), priority, message_id)
+        chat.waiting.append(pending)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run(), name="telegram-outbound")
+        self._wakeup.set()
+
+        try:
+            await pending.future
+        except asyncio.CancelledError:
+            if pending.future.done() and not pending.future.cancelled():
+                # Granted just before being cancelled — give the turn back
+                chat.busy = False
+            elif pending in chat.waiting:
+                chat.waiting.remove(pending)
+            self._wakeup.set()
+            raise
+
+        waited = time.monotonic() - pending.enqueued_at
+        self._sent += 1
+        self._priority_sent += priority
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        return chat
+
+    async def _run(self) -> None:
+        """Grant turns whenever tokens and chats allow."""
+        while True:
+            self._wakeup.clear()
+            delay = self._grant()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _grant(self) -> float | None:
+        """Start every request that may run now.
+
+        Returns:
+            Seconds until the next request could start, or None if
+            nothing is waiting.
+        """
+        now = time.monotonic()
+        while True:
+            best: _Chat | None = None
+            best_pending: _Pending | None = None
+            best_key: tuple[bool, float] | None = None
+            next_delay: float | None = None
+            for chat in self._chats.values():
+                if chat.busy:
+                    continue
+                pending = chat.next_pending()
+                if pending is None:
+                    continue
+                delay = chat.bucket.delay(now) if chat.bucket else 0.0
+                if delay > 0:
+                    next_delay = delay if next_delay is None else min(next_delay, delay)
+                    continue
+                key = (not pending.priority, pending.enqueued_at)
+                if best_key is None or key < best_key:
+                    best, best_pending, best_key = chat, pending, key
+
+            if best is None:
+                self._prune(now)
+                return next_delay
+
+            delay = self._global.delay(now)
+            if delay > 0:
+                return delay
+
+            self._global.try_take(now)
+            if best.bucket is not None:
+                best.bucket.try_take(now)
+            best.busy = True
+            best.waiting.remove(best_pending)
+            best_pending.future.set_result(None)
+
+    def _prune(self, now: float) -> None:
+        """Forget idle chats whose bucket has refilled completely."""
+        idle = [
+            chat_id for chat_id, chat in self._chats.items()
+            if not chat.busy and not chat.waiting and (chat.bucket is None or chat.bucket.full(now))
+        ]
+        for chat_id in idle:
+            del self._chats[chat_id]
@@ -0,0 +1,159 @@
+"""Live progress updates while Agent Zero works on a request.
+
+With ``agent_zero.progress_updates`` enabled, the bot polls A0's log API
+for the request's context and shows the latest step in the
+"⏳ Processing..." message. Polling is adaptive — it slows down while
+nothing changes and speeds up again when A0 makes progress — and edits
+are skipped when the step is unchanged and throttled to at most one per
+``progress_edit_interval_ms`` to stay under Telegram's edit limits.
+"""
+
+import asyncio
+import html
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+
+from bot.a0_client import A0APIError, A0Client, A0Error
+from bot.config import BotConfig
+from bot.relay import send_chunk
+
+logger = logging.getLogger(__name__)
+
+# Longest step text shown under the processing indicator
+MAX_STEP_LENGTH = 200
+
+# Backoff factor applied to the poll interval while nothing changes
+POLL_BACKOFF = 1.5
+
+
+def describe_step(log: dict[str, Any]) -> str | None:
+    """Return a short description of A0's current step, if any.
+
+    Prefers the log's ``progress`` line while it is active, else the
+    heading of the newest log item.
+    """
+    step = log.get("progress")
+    if not (isinstance(step, str) and step.strip() and log.get("progress_active", True)):
+        items = log.get("items") or []
+        last = items[-1] if items and isinstance(items[-1], dict) else {}
+        step = last.get("heading") or last.get("type")
+    if not isinstance(step, str) or not step.strip():
+        return None
+    step = " ".join(step.split())
+    if len(step) > MAX_STEP_LENGTH:
+        step = step[:MAX_STEP_LENGTH - 1] + "…"
+    return step
+
+
+class ProgressStreamer:
+    """Poll A0 progress and mirror it into processing messages.
+
+    Args:
+        a0_client: The A0 API client.
+    """
+
+    def __init__(self, a0_client: A0Client) -> None:
+        self._a0_client = a0_client
+        self._active = 0
+        self._polls = 0
+        self._poll_errors = 0
+        self._edits = 0
+        self._unchanged = 0
+        self._throttled = 0
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Counters for polls and for edits made, skipped and throttled."""
+        return {
+            "active": self._active,
+            "polls": self._polls,
+            "poll_errors": self._poll_errors,
+            "edits": self._edits,
+            "unchanged": self._unchanged,
+            "throttled": self._throttled,
+        }
+
+    def follower(
+        self, bot: Bot, chat_id: int, message_id: int, config: BotConfig,
+    ) -> Callable[[str], Awaitable[None]] | None:
+        """Build the ``progress`` callback for relay_to_a0(), or None if disabled."""
+        if not config.agent_zero.progress_updates:
+            return None
+
+        def _follow(context_id: str) -> Awaitable[None]:
+            return self.follow(context_id, bot, chat_id, message_id, config)
+
+        return _follow
+
+    async def follow(
+        self,
+        context_id: str,
+        bot: Bot,
+        chat_id: int,
+        message_id: int,
+        config: BotConfig,
+    ) -> None:
+        """Show a context's progress in a message until cancelled.
+
+        Args:
+            context_id: The A0 context the request runs in.
+            bot: Bot used to edit the message.
+            chat_id: Chat of the processing message.
+            message_id: The processing message to edit.
+            config: Current configuration snapshot.
+        """
+        agent = config.agent_zero
+        min_interval = max(agent.progress_poll_ms, 100) / 1000
+        max_interval = max(agent.progress_poll_max_ms / 1000, min_interval)
+        edit_interval = agent.progress_edit_interval_ms / 1000
+
+        interval = min_interval
+        shown: str | None = None
+        last_edit = float("-inf")
+        self._active += 1
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    log = await self._a0_client.get_log(context_id)
+                except A0APIError as e:
+                    if e.status == 404:
+                        logger.warning("A0 has no log API (404) — progress updates unavailable")
+                        return
+                    self._poll_errors += 1
+                    interval = min(interval * 2, max_interval)
+                    continue
+                except A0Error as e:
+                    logger.debug("Progress poll for %s failed: %s", context_id, e)
+                    self._poll_errors += 1
+                    interval = min(interval * 2, max_interval)
+                    continue
+                self._polls += 1
+
+                step = describe_step(log)
+                if step is None or step == shown:
+                    self._unchanged += 1
+                    interval = min(interval * POLL_BACKOFF, max_interval)
+                    continue
+
+                interval = min_interval
+                if time.monotonic() - last_edit < edit_interval:
+                    self._throttled += 1
+                    continue
+
+                shown = step
+                last_edit = time.monotonic()
+                try:
+                    await send_chunk(
+                        bot, chat_id, f"⏳ Processing...\n\n<i>{html.escape(step)}</i>",
+                        edit_message_id=message_id,
+                    )
+                    self._edits += 1
+                except TelegramAPIError as e:
+                    logger.debug("Progress edit in chat %d failed: %s", chat_id, e)
+        finally:
+            self._active -= 1
@@ -0,0 +1,51 @@
+"""Token bucket rate limiting."""
+
+import time
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, up to ``capacity``.
+
+    Starts full, so a burst of ``capacity`` is allowed right away.
+
+    Args:
+        rate: Tokens added per second.
+        capacity: Maximum number of stored tokens (burst size).
+    """
+
+    __slots__ = ("rate", "capacity", "_tokens", "_updated")
+
+    def __init__(self, rate: float, capacity: float = 1.0) -> None:
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        """Add the tokens accrued since the last update."""
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def delay(self, now: float | None = None) -> float:
+        """Seconds until a token is available (0.0 if one is available now)."""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self._tokens >= 1.0:
+            return 0.0
+        return (1.0 - self._tokens) / self.rate
+
+    def try_take(self, now: float | None = None) -> bool:
+        """Take a token if one is available."""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self._tokens < 1.0:
+            return False
+        self._tokens -= 1.0
+        return True
+
+    def full(self, now: float | None = None) -> bool:
+        """True when the bucket holds its full capacity (idle long enough)."""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        return self._tokens >= self.capacity
@@ -0,0 +1,264 @@
+"""Relay pipeline: run a request against Agent Zero and deliver the answer.
+
+Shared by the message handler (inline requests) and the job manager
+(detached requests that outlive their handler), so both use the same
+queueing, context routing, error messages and formatting.
+"""
+
+import asyncio
+import logging
+from contextlib import nullcontext
+from typing import Awaitable, Callable
+
+from aiogram import Bot
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest
+
+from bot.a0_client import (
+    A0Client,
+    A0CircuitOpenError,
+    A0ConnectionError,
+    A0Error,
+    A0TimeoutError,
+    A0APIError,
+)
+from bot.config import BotConfig
+from bot.contexts import ContextRouter, project_for
+from bot.dispatch import ContextDispatcher, PositionCallback, QueueFullError
+from bot.fair import FairScheduler, UserBacklogFullError
+from bot.formatters import HtmlValidator, iter_format_response, strip_html
+
+logger = logging.getLogger(__name__)
+
+# Exceptions relay_to_a0() raises that map to a user-facing message
+RELAY_ERRORS = (QueueFullError, A0Error)
+
+# Checks every chunk before it is sent; shared by all senders in the process
+html_validator = HtmlValidator()
+
+
+async def relay_to_a0(
+    text: str,
+    user_id: int,
+    config: BotConfig,
+    a0_client: A0Client,
+    context_router: ContextRouter,
+    context_dispatcher: ContextDispatcher,
+    fair_scheduler: FairScheduler | None = None,
+    on_position: PositionCallback | None = None,
+    on_start: Callable[[], None] | None = None,
+    progress: Callable[[str], Awaitable[None]] | None = None,
+    wait_forever: bool = False,
+) -> dict[str, str]:
+    """Send a user's text to Agent Zero on the right context.
+
+    Messages for the same conversation run one at a time in arrival
+    order; the one at the head then waits for its fair share of A0
+    capacity. If the context still has to be created, only one message
+    creates it and the others reuse it.
+
+    Args:
+        text: The message text.
+        user_id: Telegram user ID of the sender.
+        config: Current configuration snapshot.
+        a0_client: The A0 API client.
+        context_router: Resolves and persists contexts.
+        context_dispatcher: Per-conversation request queue.
+        fair_scheduler: Optional global in-flight cap shared across users,
+            which also bounds each user's outstanding messages.
+        on_position: Optional queue position callback.
+        on_start: Optional hook called right before the A0 request is sent.
+        progress: Optional coroutine function run with the context ID while
+            A0 works on the request; cancelled once the answer arrives.
+            Not used when the context is created by this request.
+        wait_forever: Ignore the configured A0 timeout for this request.
+
+    Returns:
+        Dict with "context_id" and "response" keys.
+
+    Raises:
+        QueueFullError / A0Error: See describe_error().
+    """
+    project_name = project_for(config)
+    conversation = context_router.conversation_key(config, user_id)
+
+    if fair_scheduler is not None:
+        admitted, fair_slot = fair_scheduler.admit(user_id), fair_scheduler.slot(user_id)
+    else:
+        admitted, fair_slot = nullcontext(), nullcontext()
+    async with admitted:
+        async with context_dispatcher.slot(conversation, on_position):
+            async with context_router.acquire(config, user_id) as (context_id, context_source):
+                async with fair_slot:
+                    logger.info(
+                        "Relaying message to A0 (project=%s, context=%s [%s])",
+                        project_name or "<default>",
+                        context_id or "<auto>",
+                        context_source,
+                    )
+                    if on_start is not None:
+                        on_start()
+                    follower = None
+                    if progress is not None and context_id:
+                        follower = asyncio.create_task(progress(context_id))
+                    try:
+                        result = await a0_client.send_message(
+                            message=text,
+                            context_id=context_id,
+                            project_name=project_name,
+                            wait_forever=wait_forever,
+                        )
+                    finally:
+                        if follower is not None:
+                            follower.cancel()
+                            await asyncio.gather(follower, return_exceptions=True)
+                # If A0 returned a new context_id (when we sent None), save it
+                context_router.remember(config, user_id, result.get("context_id", ""), project_name)
+
+    return result
+
+
+def queue_position_reporter(bot: Bot, chat_id: int, message_id: int) -> PositionCallback:
+    """Build a callback that shows the queue position in the processing message.
+
+    Updates can be delivered concurrently; a lock plus a "latest position"
+    check makes sure an older position never overwrites a newer one.
+    """
+    latest: list[int] = [-1]
+    lock = asyncio.Lock()
+
+    async def _report(position: int) -> None:
+        latest[0] = position
+        async with lock:
+            if latest[0] != position:
+                return  # Superseded by a newer update
+            if position:
+                text = f"⏳ Queued — position {position}. Waiting for earlier messages..."
+            else:
+                text = "⏳ Processing..."
+            await bot.edit_message_text(text=text, chat_id=chat_id, message_id=message_id)
+
+    return _report
+
+
+def describe_error(error: Exception, user_id: int) -> str:
+    """Log a relay failure and return the text to show the user."""
+    if isinstance(error, UserBacklogFullError):
+        logger.warning("Backlog full, shedding message from user %d: %s", user_id, error)
+        return (
+            "🚦 You already have several messages waiting for Agent Zero. "
+            "This one was dropped — please resend it once those are answered."
+        )
+    if isinstance(error, QueueFullError):
+        logger.warning("Queue full, rejecting message from user %d: %s", user_id, error)
+        return (
+            "🚦 Too many messages are waiting for Agent Zero. "
+            "Please wait for the earlier ones to finish."
+        )
+    if isinstance(error, A0CircuitOpenError):
+        logger.warning("A0 circuit breaker open, failing fast for user %d", user_id)
+        return "⚠️ Agent Zero is currently unreachable. Please try again in a moment."
+    if isinstance(error, A0ConnectionError):
+        logger.error("A0 connection error for user %d", user_id)
+        return "⚠️ Agent Zero is not reachable. Is it running?"
+    if isinstance(error, A0TimeoutError):
+        logger.error("A0 timeout for user %d", user_id)
+        return "⏰ Request timed out. Agent Zero may still be processing."
+    if isinstance(error, A0APIError):
+        logger.error("A0 API error for user %d: %s", user_id, error)
+        return "⚠️ Agent Zero returned an error. Please try again."
+    logger.error("Unexpected relay error for user %d: %s", user_id, error)
+    return "⚠️ Something went wrong. Please try again."
+
+
+async def send_chunk(
+    bot: Bot,
+    chat_id: int,
+    text: str,
+    edit_message_id: int | None = None,
+) -> None:
+    """Send or edit a message chunk with HTML fallback.
+
+    The HTML is first checked and repaired locally (see html_validator),
+    so Telegram should not have to reject it; a chunk whose text is over
+    the length limit goes out as several messages, the first one editing
+    ``edit_message_id``. If Telegram rejects the HTML anyway, retries
+    with plain text (all tags stripped).
+
+    Args:
+        bot: The bot to send with.
+        chat_id: Target chat.
+        text: HTML-formatted text to send.
+        edit_message_id: If set, edit this message instead of sending a new one.
+    """
+    for part in html_validator.prepare(text):
+        await _send_part(bot, chat_id, part, edit_message_id)
+        edit_message_id = None
+
+
+async def _send_part(
+    bot: Bot,
+    chat_id: int,
+    text: str,
+    edit_message_id: int | None,
+) -> None:
+    """Send or edit one message, falling back to plain text if it is rejected."""
+    edit = edit_message_id is not None
+
+    async def _put(body: str, parse_mode: str | None) -> None:
+        if edit:
+            await bot.edit_message_text(
+                text=body, chat_id=chat_id, message_id=edit_message_id, parse_mode=parse_mode,
+            )
+        else:
+            await bot.send_message(chat_id=chat_id, text=body, parse_mode=parse_mode)
+
+    try:
+        await _put(text, ParseMode.HTML)
+    except TelegramBadRequest as e:
+        # HTML parse error — fall back to plain text
+        logger.warning(
+            "Telegram rejected HTML (edit=%s): %s — falling back to plain text",
+            edit, e.message,
+        )
+        html_validator.record_fallback()
+        plain = strip_html(text)
+        try:
+            await _put(plain, None)
+        except TelegramBadRequest:
+            # Last resort: truncate if still failing
+            logger.error("Failed to send even plain text, truncating")
+            html_validator.record_truncation()
+            truncated = plain[:4000] + "\n\n[Message truncated]"
+            await _put(truncated, None)
+
+
+async def deliver_response(
+    bot: Bot,
+    chat_id: int,
+    processing_message_id: int,
+    response_text: str,
+) -> None:
+    """Format an A0 response and deliver it to a chat.
+
+    The first chunk replaces the "⏳ Processing..." message; the remaining
+    chunks are sent as new messages. Chunks are formatted as they are
+    sent, so a long answer starts arriving before all of it is formatted.
+    """
+    chunks = iter_format_response(response_text)
+    first = next(chunks, None)
+
+    if first is None:
+        await bot.edit_message_text(
+            text="✅ Task completed (no text response).",
+            chat_id=chat_id,
+            message_id=processing_message_id,
+        )
+        return
+
+    # Send first chunk by editing the processing message
+    await send_chunk(bot, chat_id, first, edit_message_id=processing_message_id)
+
+    # Send remaining chunks as new messages
+    for chunk in chunks:
+        await send_chunk(bot, chat_id, chunk)
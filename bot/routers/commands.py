@@ -1,20 +1,42 @@
 """Command handlers for the Telegram bot."""
 
+import html
 import logging
+from datetime import datetime, timezone
+from typing import Any
 
-import aiohttp
 from aiogram import Router
 from aiogram.filters import CommandStart, Command
 from aiogram.types import Message
 
 from bot.config import BotConfig
+from bot.contexts import ContextRouter, project_for
+from bot.a0_client import A0Client, A0Error
 from bot.state import StateManager
-from bot.a0_client import A0Client, A0ConnectionError
 
 logger = logging.getLogger(__name__)
 
 router = Router(name="commands")
 
+# workflow_data entries whose ``stats`` counters are shown by /stats,
+# as (data key, display title) pairs.
+STATS_SOURCES: tuple[tuple[str, str], ...] = (
+    ("config_provider", "Config"),
+    ("auth_middleware", "Auth"),
+    ("dedup_middleware", "Dedup"),
+    ("a0_client", "A0 Connections"),
+    ("state_manager", "State"),
+    ("context_router", "Contexts"),
+    ("context_dispatcher", "Queues"),
+    ("fair_scheduler", "Fairness"),
+    ("message_aggregator", "Bursts"),
+    ("job_manager", "Jobs"),
+    ("progress_streamer", "Progress"),
+    ("outbound_scheduler", "Outbound"),
+    ("html_validator", "HTML"),
+    ("webhook_server", "Webhook"),
+)
+
 
 @router.message(CommandStart())
 async def cmd_start(message: Message, config: BotConfig) -> None:
@@ -28,19 +50,22 @@ async def cmd_start(message: Message, config: BotConfig) -> None:
     logger.info("/start from user %s (id: %s)", user_name, user.id if user else "unknown")
 
     # Determine project name to display
-    project_display = config.agent_zero.fixed_project_name
-    if project_display is None:
-        project_display = config.agent_zero.default_project
-    project_display = project_display or "Default"
+    project_display = project_for(config) or "Default"
+    if ContextRouter.is_per_user(config):
+        sharing = "You have your own conversation."
+    else:
+        sharing = "All approved users share the same conversation."
 
     welcome_text = (
         f"🤖 <b>Welcome to Agent Zero Bot!</b>\n\n"
         f"Connected to project: <b>{project_display}</b>\n\n"
         f"Send me any message and I'll forward it to Agent Zero.\n"
-        f"All approved users share the same conversation.\n\n"
+        f"{sharing}\n\n"
         f"<b>Commands:</b>\n"
         f"/help - Show available commands\n"
-        f"/status - Show connection info"
+        f"/status - Show connection info\n"
+        f"/jobs - Show messages still being worked on\n"
+        f"/stats - Show internal counters"
     )
 
     await message.answer(welcome_text)
@@ -57,7 +82,9 @@ async def cmd_help(message: Message) -> None:
         "<b>Available Commands:</b>\n\n"
         "<b>/start</b> - Welcome message and project info\n"
         "<b>/help</b> - Show this help message\n"
-        "<b>/status</b> - Show connection status and configuration"
+        "<b>/status</b> - Show connection status and configuration\n"
+        "<b>/jobs</b> - Show detached messages still being worked on\n"
+        "<b>/stats</b> - Show internal counters (reloads, queues, ...)"
     )
 
     await message.answer(help_text)
@@ -67,8 +94,8 @@ async def cmd_help(message: Message) -> None:
 async def cmd_status(
     message: Message,
     config: BotConfig,
-    state_manager: StateManager,
     a0_client: A0Client,
+    context_router: ContextRouter,
 ) -> None:
     """Handle the /status command.
 
@@ -81,17 +108,10 @@ async def cmd_status(
     logger.info("/status from user %s (id: %s)", user_name, user_id)
 
     # Determine project name
-    project_name = config.agent_zero.fixed_project_name
-    if project_name is None:
-        project_name = config.agent_zero.default_project
-    project_display = project_name or "Default"
-
-    # Determine context ID source
-    context_id = config.agent_zero.fixed_context_id
-    context_source = "fixed"
-    if context_id is None:
-        context_id = state_manager.get_auto_context_id()
-        context_source = "auto"
+    project_display = project_for(config) or "Default"
+
+    # Determine context ID and its source (fixed / auto / user)
+    context_id, context_source = context_router.resolve(config, user_id)
 
     # Truncate context ID for display
     if context_id:
@@ -99,19 +119,15 @@ async def cmd_status(
     else:
         context_display = "Will auto-create on first message"
 
-    # Test A0 connectivity with a lightweight request
+    # Test A0 connectivity with a lightweight request (reuses the A0 pool)
     connection_status = "❌ Disconnected"
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                config.agent_zero.base_url,
-                timeout=aiohttp.ClientTimeout(total=5)
-            ) as response:
-                if response.status < 500:
-                    connection_status = "✅ Connected"
-                else:
-                    connection_status = "⚠️ Degraded"
-    except Exception as e:
+        status = await a0_client.health_check(timeout=5)
+        if status < 500:
+            connection_status = "✅ Connected"
+        else:
+            connection_status = "⚠️ Degraded"
+    except A0Error as e:
         logger.debug("A0 connectivity check failed: %s", e)
         connection_status = "❌ Disconnected"
 
@@ -120,7 +136,59 @@ async def cmd_status(
         f"<b>Project:</b> {project_display}\n"
         f"<b>Context:</b> {context_display} [{context_source}]\n"
         f"<b>Connection:</b> {connection_status}\n"
+        f"<b>Circuit breaker:</b> {a0_client.breaker_state}\n"
         f"<b>Your ID:</b> <code>{user_id}</code>"
     )
 
     await message.answer(status_text)
+
+
+@router.message(Command("jobs"))
+async def cmd_jobs(message: Message, state_manager: StateManager) -> None:
+    """Handle the /jobs command.
+
+    Lists the detached jobs of this chat that have not been answered yet.
+    """
+    logger.info("/jobs from user %s", message.from_user.id if message.from_user else "unknown")
+
+    jobs = state_manager.list_jobs(chat_id=message.chat.id)
+    if not jobs:
+        await message.answer("🗂 No jobs in progress.")
+        return
+
+    now = datetime.now(timezone.utc)
+    lines = [f"🗂 <b>Jobs in progress:</b> {len(jobs)}\n"]
+    for job in jobs:
+        minutes = int((now - job.created_at).total_seconds() // 60)
+        preview = job.message[:40] + "..." if len(job.message) > 40 else job.message
+        lines.append(
+            f"• <code>{job.job_id}</code> — {job.status}, {minutes} min — "
+            f"{html.escape(preview)}"
+        )
+
+    await message.answer("\n".join(lines))
+
+
+@router.message(Command("stats"))
+async def cmd_stats(message: Message, **data: Any) -> None:
+    """Handle the /stats command.
+
+    Shows the ``stats`` counters of every component listed in
+    STATS_SOURCES that is present in workflow_data.
+    """
+    logger.info("/stats from user %s", message.from_user.id if message.from_user else "unknown")
+
+    sections: list[str] = ["📈 <b>Bot Stats</b>"]
+    for key, title in STATS_SOURCES:
+        source = data.get(key)
+        stats = getattr(source, "stats", None)
+        if not stats:
+            continue
+        lines = [f"\n<b>{title}</b>"]
+        for name, value in stats.items():
+            if isinstance(value, float):
+                value = f"{value:.3f}"
+            lines.append(f"{name}: <code>{value}</code>")
+        sections.append("\n".join(lines))
+
+    await message.answer("\n".join(sections))
@@ -1,20 +1,34 @@
 """State management for the Agent Zero Telegram Bot.
 
-Tracks pending verifications and per-user session state with
+Tracks pending verifications, per-user session state and detached jobs with
 JSON file persistence using atomic writes.
 """
 
+import asyncio
+import heapq
 import json
 import logging
 import os
 import tempfile
+import threading
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, Literal
 
 from pydantic import BaseModel, Field
 
+if TYPE_CHECKING:
+    from bot.config import BotConfig
+
 logger = logging.getLogger(__name__)
 
+# Telegram restarts update IDs at a random value after a week without
+# updates; an ID this far below the stored offset starts a new sequence
+UPDATE_ID_RESET_GAP = 100_000
+
+# Deferred mutations (the update offset) are persisted at most this often
+DEFERRED_FLUSH_SECONDS = 1.0
+
 
 class PendingVerification(BaseModel):
     """A pending user verification request."""
@@ -37,28 +51,80 @@ class UserState(BaseModel):
     chats: list[ChatInfo] = Field(default_factory=list)
 
 
+class JobState(BaseModel):
+    """A detached A0 request whose result is delivered when it completes."""
+    job_id: str
+    chat_id: int
+    user_id: int
+    message: str
+    processing_message_id: int
+    status: Literal["queued", "running"] = "queued"
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
 class BotState(BaseModel):
     """Top-level bot state persisted to disk."""
     pending_verifications: dict[str, PendingVerification] = Field(default_factory=dict)
     users: dict[int, UserState] = Field(default_factory=dict)
+    jobs: dict[str, JobState] = Field(default_factory=dict)
     auto_context_id: str | None = None  # Persisted when fixed_context_id not configured
+    last_update_id: int | None = None  # Highest Telegram update_id accepted for handling
 
 
 class StateManager:
     """Manages bot state with automatic JSON file persistence.
 
-    Every mutation method auto-saves to disk.
+    Every mutation method auto-saves to disk. With ``flush_interval_ms``
+    set, saving becomes write-behind: mutations only mark the state dirty
+    and a background task writes it at most once per interval from a
+    thread executor, so bursts of mutations collapse into a single write.
+    Write-behind needs a running event loop; without one (e.g. the CLI)
+    every mutation is still saved synchronously. Call ``close()`` on
+    shutdown to force the final flush.
+
+    Pending verifications are additionally indexed by user ID and kept in
+    a min-heap ordered by creation time, so per-update lookups are O(1)
+    and expiry cleanup only touches entries that have actually expired.
     """
 
-    def __init__(self, path: str | Path) -> None:
+    def __init__(self, path: str | Path, flush_interval_ms: int = 0) -> None:
         self._path = Path(path)
         self._state = BotState()
+        self._flush_interval = max(flush_interval_ms, 0) / 1000
+        self._dirty = False
+        self._flush_task: asyncio.Task | None = None
+        self._write_lock: asyncio.Lock | None = None
+        # save() writes on the loop while flush() writes in an executor;
+        # snapshots are numbered so an older one never replaces a newer file
+        self._snapshot_version = 0
+        self._written_version = 0
+        self._replace_lock = threading.Lock()
+        self._writes_requested = 0
+        self._writes_performed = 0
+        # op -> latest record not persisted yet (see _mutate_deferred)
+        self._deferred: dict[str, dict[str, Any]] = {}
+        self._deferred_task: asyncio.Task | None = None
+        # user_id -> most recent pending code for that user
+        self._pending_by_user: dict[int, str] = {}
+        # (created_at timestamp, code); may hold stale entries for codes
+        # that were already removed — they are skipped lazily on pop.
+        self._expiry_heap: list[tuple[float, str]] = []
 
     @property
     def state(self) -> BotState:
         """Access the current state (read-only reference)."""
         return self._state
 
+    @property
+    def stats(self) -> dict[str, int]:
+        """Counters for persistence requested by mutations vs. disk writes."""
+        return {
+            "writes_requested": self._writes_requested,
+            "writes_performed": self._writes_performed,
+            "dirty": int(self._dirty),
+            "deferred": len(self._deferred),
+        }
+
     # ------------------------------------------------------------------
     # Persistence
     # ------------------------------------------------------------------
@@ -74,6 +140,7 @@ class StateManager:
         if not target.exists():
             logger.info("State file not found at %s — starting with empty state", target)
             self._state = BotState()
+            self._reindex_pending()
             return
 
         try:
@@ -87,20 +154,40 @@ class StateManager:
                 target, e,
             )
             self._state = BotState()
+        self._reindex_pending()
 
     def save(self) -> None:
         """Atomically write current state to disk."""
+        self._dirty = False
+        self._write(*self._snapshot())
+
+    def _snapshot(self) -> tuple[int, dict]:
+        """Dump the current state, numbered in the order snapshots are taken."""
+        self._snapshot_version += 1
+        return self._snapshot_version, self._state.model_dump(mode="json")
+
+    def _write(self, version: int, data: dict) -> None:
+        """Atomically write an already-dumped state dict to disk.
+
+        If a newer snapshot (higher ``version``) reached the disk while
+        this one was being encoded, this one is discarded.
+        """
         dir_ = self._path.parent
         dir_.mkdir(parents=True, exist_ok=True)
 
-        data = self._state.model_dump(mode="json")
-
         fd, tmp_path = tempfile.mkstemp(dir=str(dir_), suffix=".tmp")
         try:
             with os.fdopen(fd, "w", encoding="utf-8") as f:
                 json.dump(data, f, indent=2, default=str)
                 f.write("\n")
-            os.replace(tmp_path, str(self._path))
+            with self._replace_lock:
+                if version < self._written_version:
+                    os.unlink(tmp_path)
+                    logger.debug("Dropped state snapshot %d, %d is newer", version, self._written_version)
+                    return
+                os.replace(tmp_path, str(self._path))
+                self._written_version = version
+            self._writes_performed += 1
             logger.debug("State saved to %s", self._path)
         except Exception:
             try:
@@ -109,6 +196,156 @@ class StateManager:
                 pass
             raise
 
+    def _persist(self, op: str, record: dict[str, Any]) -> None:
+        """Persist after a mutation — immediately, or write-behind if enabled.
+
+        The JSON backend always rewrites the whole state, so the mutation
+        record itself is not needed here.
+        """
+        self._writes_requested += 1
+        if self._flush_interval <= 0:
+            self.save()
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (CLI, tests) — fall back to a synchronous save
+            self.save()
+            return
+
+        self._dirty = True
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        """Write the coalesced state once per interval until it is clean."""
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Write-behind flush of %s failed: %s", self._path, e)
+            # Mutations made while the write was in flight re-dirty the state
+            if not self._dirty:
+                break
+
+    async def flush(self) -> None:
+        """Write the state now if it has unsaved changes.
+
+        The snapshot is dumped on the event loop (so it is consistent);
+        encoding and file I/O run in a thread executor.
+        """
+        if self._write_lock is None:
+            self._write_lock = asyncio.Lock()
+        async with self._write_lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            version, data = self._snapshot()
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(None, self._write, version, data)
+            except BaseException:
+                # Failed, or cancelled by close() while the thread still
+                # runs: write again next time (the stale copy is dropped)
+                self._dirty = True
+                raise
+
+    async def close(self) -> None:
+        """Cancel any scheduled flush and write outstanding changes."""
+        await self._close_deferred()
+        task = self._flush_task
+        self._flush_task = None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    # ------------------------------------------------------------------
+    # Mutation Records
+    # ------------------------------------------------------------------
+
+    def _mutate(self, op: str, **record: Any) -> Any:
+        """Apply a mutation record to the in-memory state and persist it.
+
+        Every state change is expressed as an ``op`` name plus JSON-safe
+        fields, applied by the matching ``_apply_<op>`` method. Backends
+        that store changes instead of snapshots (journal, SQLite) receive
+        the same record in ``_persist``. Nothing is persisted when the
+        apply method reports that the state did not change.
+
+        Returns:
+            Whatever the apply method returned.
+        """
+        result = getattr(self, f"_apply_{op}")(**record)
+        if result:
+            self._persist(op, record)
+        return result
+
+    def _mutate_deferred(self, op: str, **record: Any) -> Any:
+        """Like ``_mutate``, but persist at most once per DEFERRED_FLUSH_SECONDS.
+
+        For bookkeeping that changes on every update and is cheap to lose
+        on a crash: only the latest record per op is kept, and a timer
+        hands it to ``_persist_deferred``. Without a running loop the
+        record is persisted right away.
+        """
+        result = getattr(self, f"_apply_{op}")(**record)
+        if not result:
+            return result
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._persist(op, record)
+            return result
+
+        self._deferred[op] = record
+        if self._deferred_task is None or self._deferred_task.done():
+            self._deferred_task = loop.create_task(self._flush_deferred_later())
+        return result
+
+    async def _flush_deferred_later(self) -> None:
+        """Persist the deferred records once the interval has passed."""
+        await asyncio.sleep(DEFERRED_FLUSH_SECONDS)
+        try:
+            await self._flush_deferred()
+        except Exception as e:
+            logger.error("Deferred state write to %s failed: %s", self._path, e)
+
+    async def _flush_deferred(self) -> None:
+        """Persist the latest record of every deferred op."""
+        deferred, self._deferred = self._deferred, {}
+        for op, record in deferred.items():
+            self._persist_deferred(op, record)
+        if deferred:
+            await self.flush()
+
+    def _persist_deferred(self, op: str, record: dict[str, Any]) -> None:
+        """Persist a deferred record.
+
+        The JSON backend only marks the state dirty, so the following
+        ``flush()`` writes it in a thread executor — even when
+        ``flush_interval_ms`` is 0.
+        """
+        self._writes_requested += 1
+        self._dirty = True
+
+    async def _close_deferred(self) -> None:
+        """Cancel the deferred-write timer and persist what it was holding."""
+        task = self._deferred_task
+        self._deferred_task = None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self._flush_deferred()
+
     # ------------------------------------------------------------------
     # Auto Context ID (for static configuration mode)
     # ------------------------------------------------------------------
@@ -119,8 +356,7 @@ class StateManager:
         Args:
             context_id: The A0 context ID to persist.
         """
-        self._state.auto_context_id = context_id
-        self.save()
+        self._mutate("set_auto_context_id", context_id=context_id)
         logger.info("Set auto_context_id: %s", context_id)
 
     def get_auto_context_id(self) -> str | None:
@@ -129,14 +365,69 @@ class StateManager:
 
     def clear_auto_context_id(self) -> None:
         """Clear the auto-created context ID."""
-        self._state.auto_context_id = None
-        self.save()
+        self._mutate("clear_auto_context_id")
         logger.info("Cleared auto_context_id")
 
+    def _apply_set_auto_context_id(self, context_id: str) -> bool:
+        """Store the auto-created context ID."""
+        self._state.auto_context_id = context_id
+        return True
+
+    def _apply_clear_auto_context_id(self) -> bool:
+        """Forget the auto-created context ID."""
+        self._state.auto_context_id = None
+        return True
+
+    # ------------------------------------------------------------------
+    # Update Offset (redelivery dedup across restarts)
+    # ------------------------------------------------------------------
+
+    def get_update_offset(self) -> int | None:
+        """Highest Telegram update_id recorded so far (None if none yet)."""
+        return self._state.last_update_id
+
+    def set_update_offset(self, update_id: int) -> None:
+        """Record an accepted update_id; IDs just below the stored one are ignored.
+
+        Called for every accepted update, so it is persisted deferred (at
+        most once per DEFERRED_FLUSH_SECONDS); a crash can lose the last
+        second of offsets.
+
+        Args:
+            update_id: Telegram update ID.
+        """
+        self._mutate_deferred("set_update_offset", update_id=update_id)
+
+    def _apply_set_update_offset(self, update_id: int) -> bool:
+        """Raise the stored update offset (out-of-order IDs do not lower it)."""
+        last = self._state.last_update_id
+        if last is not None and last - UPDATE_ID_RESET_GAP < update_id <= last:
+            return False
+        self._state.last_update_id = update_id
+        return True
+
     # ------------------------------------------------------------------
     # Pending Verifications
     # ------------------------------------------------------------------
 
+    def _reindex_pending(self) -> None:
+        """Rebuild the user index and expiry heap from pending_verifications."""
+        self._pending_by_user = {}
+        self._expiry_heap = []
+        ordered = sorted(
+            self._state.pending_verifications.values(), key=lambda pv: pv.created_at,
+        )
+        for pv in ordered:
+            self._pending_by_user[pv.user_id] = pv.code
+            self._expiry_heap.append((pv.created_at.timestamp(), pv.code))
+        # Already sorted by timestamp, which satisfies the heap invariant
+        heapq.heapify(self._expiry_heap)
+
+    def _unindex_pending(self, pv: PendingVerification) -> None:
+        """Drop a removed verification from the user index."""
+        if self._pending_by_user.get(pv.user_id) == pv.code:
+            del self._pending_by_user[pv.user_id]
+
     def add_pending(self, code: str, user_id: int, username: str | None = None) -> PendingVerification:
         """Add a pending verification entry.
 
@@ -148,9 +439,13 @@ class StateManager:
         Returns:
             The created PendingVerification.
         """
-        pv = PendingVerification(user_id=user_id, username=username, code=code)
-        self._state.pending_verifications[code] = pv
-        self.save()
+        pv = self._mutate(
+            "add_pending",
+            code=code,
+            user_id=user_id,
+            username=username,
+            created_at=datetime.now(timezone.utc).isoformat(),
+        )
         logger.info("Added pending verification for user %d (code: %s)", user_id, code)
         return pv
 
@@ -158,15 +453,40 @@ class StateManager:
         """Retrieve a pending verification by code."""
         return self._state.pending_verifications.get(code)
 
+    def pending_count(self) -> int:
+        """Number of stored pending verifications (expired ones included)."""
+        return len(self._state.pending_verifications)
+
+    def get_pending_for_user(
+        self, user_id: int, max_age_minutes: int = 10,
+    ) -> PendingVerification | None:
+        """Retrieve the newest non-expired pending verification for a user.
+
+        Args:
+            user_id: Telegram user ID.
+            max_age_minutes: Maximum age in minutes before a code is expired.
+
+        Returns:
+            The pending verification, or None if the user has no valid code.
+        """
+        code = self._pending_by_user.get(user_id)
+        if code is None:
+            return None
+        pv = self._state.pending_verifications.get(code)
+        if pv is None:
+            return None
+        age_seconds = (datetime.now(timezone.utc) - pv.created_at).total_seconds()
+        if age_seconds >= max_age_minutes * 60:
+            return None
+        return pv
+
     def remove_pending(self, code: str) -> bool:
         """Remove a pending verification by code.
 
         Returns:
             True if the code existed and was removed.
         """
-        if code in self._state.pending_verifications:
-            del self._state.pending_verifications[code]
-            self.save()
+        if self._mutate("remove_pending", code=code):
             logger.info("Removed pending verification code: %s", code)
             return True
         return False
@@ -174,24 +494,59 @@ class StateManager:
     def cleanup_expired(self, max_age_minutes: int = 10) -> int:
         """Remove expired pending verifications.
 
+        Pops entries off the expiry heap until the oldest remaining one is
+        still valid, so the cost is proportional to the number of expired
+        entries rather than the number of pending ones.
+
         Args:
             max_age_minutes: Maximum age in minutes before expiry.
 
         Returns:
             Number of expired entries removed.
         """
-        now = datetime.now(timezone.utc)
-        expired = [
-            code for code, pv in self._state.pending_verifications.items()
-            if (now - pv.created_at).total_seconds() > max_age_minutes * 60
-        ]
-        for code in expired:
-            del self._state.pending_verifications[code]
-
-        if expired:
-            self.save()
-            logger.info("Cleaned up %d expired verification(s)", len(expired))
-        return len(expired)
+        cutoff = datetime.now(timezone.utc).timestamp() - max_age_minutes * 60
+        heap = self._expiry_heap
+        pending = self._state.pending_verifications
+        expired: list[str] = []
+
+        while heap and heap[0][0] < cutoff:
+            created_ts, code = heapq.heappop(heap)
+            pv = pending.get(code)
+            # Skip stale heap entries (code removed or re-issued since)
+            if pv is None or pv.created_at.timestamp() != created_ts:
+                continue
+            expired.append(code)
+
+        if not expired:
+            return 0
+
+        removed = self._mutate("expire_pending", codes=expired)
+        logger.info("Cleaned up %d expired verification(s)", removed)
+        return removed
+
+    def _apply_add_pending(
+        self, code: str, user_id: int, username: str | None, created_at: str,
+    ) -> PendingVerification:
+        """Insert a pending verification and index it."""
+        pv = PendingVerification(
+            user_id=user_id, username=username, code=code, created_at=created_at,
+        )
+        self._state.pending_verifications[code] = pv
+        self._pending_by_user[user_id] = code
+        heapq.heappush(self._expiry_heap, (pv.created_at.timestamp(), code))
+        return pv
+
+    def _apply_remove_pending(self, code: str) -> bool:
+        """Delete a pending verification; False if it did not exist."""
+        pv = self._state.pending_verifications.pop(code, None)
+        if pv is None:
+            return False
+        self._unindex_pending(pv)
+        return True
+
+    def _apply_expire_pending(self, codes: list[str]) -> int:
+        """Delete a batch of expired codes; returns how many existed."""
+        return sum(1 for code in codes if self._apply_remove_pending(code))
 
     # ------------------------------------------------------------------
     # User State
@@ -199,9 +554,10 @@ class StateManager:
 
     def _ensure_user(self, user_id: int) -> UserState:
         """Get or create a UserState entry."""
-        if user_id not in self._state.users:
-            self._state.users[user_id] = UserState()
-        return self._state.users[user_id]
+        user = self.get_user(user_id)
+        if user is None:
+            user = self._state.users[user_id] = UserState()
+        return user
 
     def get_user(self, user_id: int) -> UserState | None:
         """Get user state, or None if user has no state."""
@@ -215,19 +571,27 @@ class StateManager:
             context_id: The A0 context/chat ID.
             project: Optional project name.
         """
-        user = self._ensure_user(user_id)
-        user.context_id = context_id
-        user.project = project
-        self.save()
+        self._mutate("set_user_context", user_id=user_id, context_id=context_id, project=project)
         logger.info("Set context for user %d: context=%s project=%s", user_id, context_id, project)
 
     def clear_user_context(self, user_id: int) -> None:
         """Clear a user's active chat context."""
+        self._mutate("clear_user_context", user_id=user_id)
+        logger.info("Cleared context for user %d", user_id)
+
+    def _apply_set_user_context(self, user_id: int, context_id: str, project: str | None) -> bool:
+        """Set a user's active context and project."""
+        user = self._ensure_user(user_id)
+        user.context_id = context_id
+        user.project = project
+        return True
+
+    def _apply_clear_user_context(self, user_id: int) -> bool:
+        """Reset a user's active context and project."""
         user = self._ensure_user(user_id)
         user.context_id = None
         user.project = None
-        self.save()
-        logger.info("Cleared context for user %d", user_id)
+        return True
 
     # ------------------------------------------------------------------
     # Chat Registry
@@ -235,7 +599,7 @@ class StateManager:
 
     def get_user_chats(self, user_id: int) -> list[ChatInfo]:
         """List all chats tracked for a user."""
-        user = self._state.users.get(user_id)
+        user = self.get_user(user_id)
         if user is None:
             return []
         return list(user.chats)
@@ -248,11 +612,7 @@ class StateManager:
             context_id: The A0 context/chat ID.
             project: Optional project name.
         """
-        user = self._ensure_user(user_id)
-        # Avoid duplicates
-        if not any(c.context_id == context_id for c in user.chats):
-            user.chats.append(ChatInfo(context_id=context_id, project=project))
-            self.save()
+        if self._mutate("add_chat", user_id=user_id, context_id=context_id, project=project):
             logger.info("Added chat %s for user %d", context_id, user_id)
 
     def remove_chat(self, user_id: int, context_id: str) -> bool:
@@ -261,19 +621,144 @@ class StateManager:
         Returns:
             True if the chat was found and removed.
         """
-        user = self._state.users.get(user_id)
+        if self._mutate("remove_chat", user_id=user_id, context_id=context_id):
+            logger.info("Removed chat %s for user %d", context_id, user_id)
+            return True
+        return False
+
+    def _apply_add_chat(self, user_id: int, context_id: str, project: str | None) -> bool:
+        """Append a chat to a user's registry unless already present."""
+        user = self._ensure_user(user_id)
+        # Avoid duplicates
+        if any(c.context_id == context_id for c in user.chats):
+            return False
+        user.chats.append(ChatInfo(context_id=context_id, project=project))
+        return True
+
+    def _apply_remove_chat(self, user_id: int, context_id: str) -> bool:
+        """Drop a chat from a user's registry, clearing it if active."""
+        user = self.get_user(user_id)
         if user is None:
             return False
 
         original_len = len(user.chats)
         user.chats = [c for c in user.chats if c.context_id != context_id]
+        if len(user.chats) == original_len:
+            return False
 
-        if len(user.chats) < original_len:
-            # If the removed chat was the active one, clear it
-            if user.context_id == context_id:
-                user.context_id = None
-                user.project = None
-            self.save()
-            logger.info("Removed chat %s for user %d", context_id, user_id)
+        # If the removed chat was the active one, clear it
+        if user.context_id == context_id:
+            user.context_id = None
+            user.project = None
+        return True
+
+    # ------------------------------------------------------------------
+    # Detached Jobs
+    # ------------------------------------------------------------------
+
+    def list_jobs(self, chat_id: int | None = None) -> list[JobState]:
+        """List tracked jobs, oldest first, optionally for one chat."""
+        jobs = sorted(self._state.jobs.values(), key=lambda j: j.created_at)
+        if chat_id is not None:
+            jobs = [j for j in jobs if j.chat_id == chat_id]
+        return jobs
+
+    def add_job(
+        self,
+        job_id: str,
+        chat_id: int,
+        user_id: int,
+        message: str,
+        processing_message_id: int,
+    ) -> JobState:
+        """Track a new detached job in the ``queued`` state.
+
+        Returns:
+            The created JobState.
+        """
+        job = self._mutate(
+            "add_job",
+            job_id=job_id,
+            chat_id=chat_id,
+            user_id=user_id,
+            message=message,
+            processing_message_id=processing_message_id,
+            created_at=datetime.now(timezone.utc).isoformat(),
+        )
+        logger.info("Added job %s for user %d in chat %d", job_id, user_id, chat_id)
+        return job
+
+    def set_job_status(self, job_id: str, status: str) -> bool:
+        """Move a job to ``queued`` or ``running``.
+
+        Returns:
+            True if the job exists and its status changed.
+        """
+        return bool(self._mutate("set_job_status", job_id=job_id, status=status))
+
+    def remove_job(self, job_id: str) -> bool:
+        """Stop tracking a finished job.
+
+        Returns:
+            True if the job existed and was removed.
+        """
+        if self._mutate("remove_job", job_id=job_id):
+            logger.info("Removed job %s", job_id)
             return True
         return False
+
+    def _apply_add_job(
+        self,
+        job_id: str,
+        chat_id: int,
+        user_id: int,
+        message: str,
+        processing_message_id: int,
+        created_at: str,
+    ) -> JobState:
+        """Insert a queued job."""
+        job = JobState(
+            job_id=job_id,
+            chat_id=chat_id,
+            user_id=user_id,
+            message=message,
+            processing_message_id=processing_message_id,
+            created_at=created_at,
+        )
+        self._state.jobs[job_id] = job
+        return job
+
+    def _apply_set_job_status(self, job_id: str, status: str) -> bool:
+        """Update a job's status; False if it does not exist or is unchanged."""
+        job = self._state.jobs.get(job_id)
+        if job is None or job.status == status:
+            return False
+        job.status = status
+        return True
+
+    def _apply_remove_job(self, job_id: str) -> bool:
+        """Delete a job; False if it did not exist."""
+        return self._state.jobs.pop(job_id, None) is not None
+
+
+def create_state_manager(config: "BotConfig", path: str | Path | None = None) -> StateManager:
+    """Build the StateManager for the configured ``state_backend``.
+
+    Args:
+        config: The bot configuration.
+        path: Override for ``config.state_file``.
+
+    Returns:
+        An unloaded StateManager (call ``load()`` before use).
+    """
+    path = path or config.state_file
+    backend = config.state_backend
+
+    if backend == "journal":
+        from bot.state_journal import JournalStateManager
+        return JournalStateManager(path, max_journal_bytes=config.state_journal_max_bytes)
+    if backend == "sqlite":
+        from bot.state_sqlite import SqliteStateManager
+        return SqliteStateManager(path)
+
+    return StateManager(path, flush_interval_ms=config.state_flush_interval_ms)
@@ -0,0 +1,251 @@
+"""Append-only journal backend for bot state.
+
+Instead of rewriting the whole state file on every change, each mutation
+record produced by StateManager is appended as one JSON line to a journal
+next to the state file. The state file itself becomes a snapshot that is
+only rewritten when the journal is compacted.
+
+On-disk layout (for ``state_file = /data/state.json``):
+
+    /data/state.json              snapshot + "journal_seq" watermark
+    /data/state.json.journal      active journal, one record per line
+    /data/state.json.journal.<N>  journal rotated out by a compaction
+                                  whose snapshot covers records <= N
+
+Crash safety:
+- Snapshots are written with the same mkstemp + os.replace path as the
+  JSON backend, so the state file is never torn.
+- Compaction first rotates the active journal, then writes the snapshot,
+  then deletes rotated journals. A crash at any point leaves a snapshot
+  plus journals that replay to the same state, because records carry a
+  sequence number and those already covered by the snapshot are skipped.
+- A torn last line (crash mid-append) is ignored on replay.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, TextIO
+
+from bot.state import BotState, StateManager
+
+logger = logging.getLogger(__name__)
+
+# Key under which the snapshot records the last journal sequence it covers.
+# BotState ignores unknown keys, so snapshots stay readable by the JSON backend.
+SEQ_KEY = "journal_seq"
+
+
+class JournalStateManager(StateManager):
+    """StateManager that appends mutation records to a journal file.
+
+    Each mutation costs one small append instead of a full state rewrite.
+    When the active journal grows past ``max_journal_bytes`` it is
+    compacted into a fresh snapshot — in a thread executor when an event
+    loop is running, synchronously otherwise.
+
+    As with the JSON backend, the running bot's in-memory state is
+    authoritative: records appended by another process (the admin CLI)
+    are only seen after a restart.
+
+    Args:
+        path: Path of the snapshot file.
+        max_journal_bytes: Journal size that triggers compaction.
+    """
+
+    def __init__(self, path: str | Path, max_journal_bytes: int = 1_048_576) -> None:
+        super().__init__(path)
+        self._journal_path = self._path.with_name(self._path.name + ".journal")
+        self._max_journal_bytes = max_journal_bytes
+        self._journal: TextIO | None = None
+        self._journal_bytes = 0
+        self._seq = 0
+        self._compaction_task: asyncio.Task | None = None
+        self._records_appended = 0
+        self._compactions = 0
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Counters for appended records, compactions and journal size."""
+        return {
+            **super().stats,
+            "records_appended": self._records_appended,
+            "compactions": self._compactions,
+            "journal_bytes": self._journal_bytes,
+            "seq": self._seq,
+        }
+
+    # ------------------------------------------------------------------
+    # Loading / Replay
+    # ------------------------------------------------------------------
+
+    def _rotated_journals(self) -> list[tuple[int, Path]]:
+        """List rotated journals as (covered seq, path), oldest first."""
+        prefix = self._journal_path.name + "."
+        rotated = []
+        for p in self._journal_path.parent.glob(prefix + "*"):
+            suffix = p.name[len(prefix):]
+            if suffix.isdigit():
+                rotated.append((int(suffix), p))
+        return sorted(rotated)
+
+    def load(self, path: str | Path | None = None) -> None:
+        """Load the snapshot, then replay rotated and active journals.
+
+        Args:
+            path: Override snapshot path (uses instance path if None).
+        """
+        super().load(path)
+
+        snapshot_seq = 0
+        target = Path(path) if path else self._path
+        try:
+            snapshot_seq = int(json.loads(target.read_text(encoding="utf-8")).get(SEQ_KEY, 0))
+        except (OSError, ValueError, AttributeError):
+            pass
+
+        self._seq = snapshot_seq
+        replayed = 0
+        journals = [p for _, p in self._rotated_journals()] + [self._journal_path]
+        for journal in journals:
+            replayed += self._replay(journal, snapshot_seq)
+
+        self._reindex_pending()
+        if self._journal_path.exists():
+            self._journal_bytes = self._journal_path.stat().st_size
+        if replayed:
+            logger.info("Replayed %d journal record(s) on top of snapshot seq %d", replayed, snapshot_seq)
+
+    def _replay(self, journal: Path, snapshot_seq: int) -> int:
+        """Apply the records of one journal file that the snapshot lacks."""
+        if not journal.exists():
+            return 0
+
+        applied = 0
+        with journal.open("r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, start=1):
+                if not line.endswith("\n"):
+                    logger.warning("Ignoring torn record at %s:%d", journal, line_no)
+                    break
+                try:
+                    record = json.loads(line)
+                    seq = record.pop("seq")
+                    op = record.pop("op")
+                except (ValueError, KeyError) as e:
+                    logger.warning("Skipping corrupt record at %s:%d: %s", journal, line_no, e)
+                    continue
+                if seq <= snapshot_seq:
+                    continue
+                try:
+                    getattr(self, f"_apply_{op}")(**record)
+                except Exception as e:
+                    logger.warning("Skipping unreplayable record at %s:%d: %s", journal, line_no, e)
+                    continue
+                self._seq = max(self._seq, seq)
+                applied += 1
+        return applied
+
+    # ------------------------------------------------------------------
+    # Appending
+    # ------------------------------------------------------------------
+
+    def _open_journal(self) -> TextIO:
+        """Return the append handle for the active journal, opening it lazily."""
+        if self._journal is None or self._journal.closed:
+            self._journal_path.parent.mkdir(parents=True, exist_ok=True)
+            self._journal = self._journal_path.open("a", encoding="utf-8")
+        return self._journal
+
+    def _persist(self, op: str, record: dict[str, Any]) -> None:
+        """Append one mutation record and compact if the journal got too big."""
+        self._writes_requested += 1
+        self._seq += 1
+        line = json.dumps({"seq": self._seq, "op": op, **record}, separators=(",", ":"), default=str)
+        journal = self._open_journal()
+        journal.write(line + "\n")
+        journal.flush()
+        self._journal_bytes += len(line) + 1
+        self._records_appended += 1
+
+        if self._journal_bytes >= self._max_journal_bytes:
+            self._schedule_compaction()
+
+    # ------------------------------------------------------------------
+    # Compaction
+    # ------------------------------------------------------------------
+
+    def _rotate(self) -> dict:
+        """Rotate the active journal and dump a snapshot covering it.
+
+        Runs on the caller's thread (the event loop) so the dumped state
+        and the sequence watermark are consistent with each other.
+        """
+        if self._journal is not None and not self._journal.closed:
+            self._journal.close()
+        self._journal = None
+        if self._journal_path.exists():
+            os.replace(self._journal_path, self._journal_path.with_name(
+                f"{self._journal_path.name}.{self._seq}",
+            ))
+        self._journal_bytes = 0
+
+        data = self._state.model_dump(mode="json")
+        data[SEQ_KEY] = self._seq
+        return data
+
+    def _write_snapshot(self, data: dict) -> None:
+        """Atomically write a snapshot, then drop the journals it covers."""
+        self._write(data[SEQ_KEY], data)
+        for seq, journal in self._rotated_journals():
+            if seq <= data[SEQ_KEY]:
+                try:
+                    journal.unlink()
+                except OSError as e:
+                    logger.warning("Could not remove compacted journal %s: %s", journal, e)
+        self._compactions += 1
+        logger.debug("Compacted state journal at seq %d", data[SEQ_KEY])
+
+    def _schedule_compaction(self) -> None:
+        """Compact in the background, or inline when no loop is running."""
+        if self._compaction_task is not None and not self._compaction_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.save()
+            return
+        self._compaction_task = loop.create_task(self._compact())
+
+    async def _compact(self) -> None:
+        """Rotate on the loop, then write the snapshot in a thread executor."""
+        data = self._rotate()
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self._write_snapshot, data)
+        except Exception as e:
+            # Rotated journals are kept, so nothing is lost; retry next time
+            logger.error("State journal compaction failed: %s", e)
+
+    def save(self) -> None:
+        """Compact synchronously: write a full snapshot and clear the journal."""
+        self._write_snapshot(self._rotate())
+
+    def _persist_deferred(self, op: str, record: dict[str, Any]) -> None:
+        """Append the deferred record like any other."""
+        self._persist(op, record)
+
+    async def flush(self) -> None:
+        """Records are flushed as they are appended; nothing to do."""
+
+    async def close(self) -> None:
+        """Wait for a running compaction, then close the journal handle."""
+        await self._close_deferred()
+        task = self._compaction_task
+        self._compaction_task = None
+        if task is not None and not task.done():
+            await task
+        if self._journal is not None and not self._journal.closed:
+            self._journal.close()
+        self._journal = None
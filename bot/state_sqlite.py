@@ -0,0 +1,339 @@
+"""SQLite backend for bot state.
+
+Stores pending verifications, users and their chat registries in indexed
+tables (stdlib ``sqlite3``, WAL mode) instead of one JSON document.
+
+- Pending verifications, detached jobs and ``auto_context_id`` are small
+  and read often, so they are loaded into memory on ``load()``.
+- Users are loaded lazily, one primary-key lookup the first time a user
+  is touched, and cached afterwards — startup does not materialise the
+  whole user table.
+- Mutations update the in-memory state immediately and are written by a
+  single writer thread, in order, off the event loop. Without a running
+  loop (the admin CLI) they are written synchronously.
+"""
+
+import asyncio
+import logging
+import sqlite3
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from bot.state import BotState, ChatInfo, JobState, PendingVerification, StateManager, UserState
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS pending_verifications (
+    code       TEXT PRIMARY KEY,
+    user_id    INTEGER NOT NULL,
+    username   TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_pending_user ON pending_verifications (user_id);
+CREATE TABLE IF NOT EXISTS users (
+    user_id    INTEGER PRIMARY KEY,
+    context_id TEXT,
+    project    TEXT
+);
+CREATE TABLE IF NOT EXISTS chats (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id    INTEGER NOT NULL,
+    context_id TEXT NOT NULL,
+    project    TEXT,
+    UNIQUE (user_id, context_id)
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id                TEXT PRIMARY KEY,
+    chat_id               INTEGER NOT NULL,
+    user_id               INTEGER NOT NULL,
+    message               TEXT NOT NULL,
+    processing_message_id INTEGER NOT NULL,
+    status                TEXT NOT NULL,
+    created_at            TEXT NOT NULL
+);
+"""
+
+_UPSERT_USER = (
+    "INSERT INTO users (user_id, context_id, project) VALUES (?, ?, ?) "
+    "ON CONFLICT (user_id) DO UPDATE SET context_id = excluded.context_id, "
+    "project = excluded.project"
+)
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    """Open a connection in WAL mode with the schema in place."""
+    conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class SqliteStateManager(StateManager):
+    """StateManager backed by an SQLite database.
+
+    ``state`` only contains the users that have been touched since
+    ``load()``; use ``get_user()`` / ``get_user_chats()`` rather than
+    iterating ``state.users``.
+
+    Args:
+        path: Path of the SQLite database file.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        super().__init__(path)
+        self._reader: sqlite3.Connection | None = None
+        self._writer: sqlite3.Connection | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        self._last_write: Future | None = None
+        self._user_loads = 0
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Counters for queued/performed writes and lazy user loads."""
+        return {
+            **super().stats,
+            "users_cached": len(self._state.users),
+            "user_loads": self._user_loads,
+        }
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    def load(self, path: str | Path | None = None) -> None:
+        """Open the database and load pending verifications, jobs and metadata.
+
+        Args:
+            path: Override database path (uses instance path if None).
+        """
+        if path:
+            self._path = Path(path)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._reader = _connect(self._path)
+        self._writer = _connect(self._path)
+
+        state = BotState()
+        row = self._reader.execute(
+            "SELECT value FROM meta WHERE key = 'auto_context_id'"
+        ).fetchone()
+        state.auto_context_id = row[0] if row else None
+        row = self._reader.execute(
+            "SELECT value FROM meta WHERE key = 'last_update_id'"
+        ).fetchone()
+        state.last_update_id = int(row[0]) if row else None
+
+        for code, user_id, username, created_at in self._reader.execute(
+            "SELECT code, user_id, username, created_at FROM pending_verifications"
+        ):
+            state.pending_verifications[code] = PendingVerification(
+                code=code, user_id=user_id, username=username, created_at=created_at,
+            )
+
+        for job_id, chat_id, user_id, message, processing_message_id, status, created_at in (
+            self._reader.execute(
+                "SELECT job_id, chat_id, user_id, message, processing_message_id, status, "
+                "created_at FROM jobs"
+            )
+        ):
+            state.jobs[job_id] = JobState(
+                job_id=job_id, chat_id=chat_id, user_id=user_id, message=message,
+                processing_message_id=processing_message_id, status=status,
+                created_at=created_at,
+            )
+
+        self._state = state
+        self._reindex_pending()
+        logger.info(
+            "State database opened at %s (%d pending verification(s))",
+            self._path, len(state.pending_verifications),
+        )
+
+    def get_user(self, user_id: int) -> UserState | None:
+        """Get user state from the cache, loading it from the database once."""
+        user = self._state.users.get(user_id)
+        if user is not None or self._reader is None:
+            return user
+
+        row = self._reader.execute(
+            "SELECT context_id, project FROM users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        chats = [
+            ChatInfo(context_id=context_id, project=project)
+            for context_id, project in self._reader.execute(
+                "SELECT context_id, project FROM chats WHERE user_id = ? ORDER BY id",
+                (user_id,),
+            )
+        ]
+        user = UserState(context_id=row[0], project=row[1], chats=chats)
+        self._state.users[user_id] = user
+        self._user_loads += 1
+        return user
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def _statements(self, op: str, record: dict[str, Any]) -> list[tuple[str, tuple]]:
+        """Translate a mutation record into SQL statements."""
+        if op == "set_auto_context_id":
+            return [("INSERT OR REPLACE INTO meta (key, value) VALUES ('auto_context_id', ?)",
+                     (record["context_id"],))]
+        if op == "clear_auto_context_id":
+            return [("DELETE FROM meta WHERE key = 'auto_context_id'", ())]
+        if op == "set_update_offset":
+            return [("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_update_id', ?)",
+                     (str(record["update_id"]),))]
+        if op == "add_pending":
+            return [("INSERT OR REPLACE INTO pending_verifications "
+                     "(code, user_id, username, created_at) VALUES (?, ?, ?, ?)",
+                     (record["code"], record["user_id"], record["username"], record["created_at"]))]
+        if op == "remove_pending":
+            return [("DELETE FROM pending_verifications WHERE code = ?", (record["code"],))]
+        if op == "expire_pending":
+            return [("DELETE FROM pending_verifications WHERE code = ?", (code,))
+                    for code in record["codes"]]
+        if op == "set_user_context":
+            return [(_UPSERT_USER, (record["user_id"], record["context_id"], record["project"]))]
+        if op == "clear_user_context":
+            return [(_UPSERT_USER, (record["user_id"], None, None))]
+        if op == "add_chat":
+            return [
+                ("INSERT OR IGNORE INTO users (user_id) VALUES (?)", (record["user_id"],)),
+                ("INSERT OR IGNORE INTO chats (user_id, context_id, project) VALUES (?, ?, ?)",
+                 (record["user_id"], record["context_id"], record["project"])),
+            ]
+        if op == "remove_chat":
+            return [
+                ("DELETE FROM chats WHERE user_id = ? AND context_id = ?",
+                 (record["user_id"], record["context_id"])),
+                ("UPDATE users SET context_id = NULL, project = NULL "
+                 "WHERE user_id = ? AND context_id = ?",
+                 (record["user_id"], record["context_id"])),
+            ]
+        if op == "add_job":
+            return [("INSERT OR REPLACE INTO jobs (job_id, chat_id, user_id, message, "
+                     "processing_message_id, status, created_at) "
+                     "VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+                     (record["job_id"], record["chat_id"], record["user_id"], record["message"],
+                      record["processing_message_id"], record["created_at"]))]
+        if op == "set_job_status":
+            return [("UPDATE jobs SET status = ? WHERE job_id = ?",
+                     (record["status"], record["job_id"]))]
+        if op == "remove_job":
+            return [("DELETE FROM jobs WHERE job_id = ?", (record["job_id"],))]
+        raise ValueError(f"Unknown state mutation: {op}")
+
+    def _execute(self, statements: list[tuple[str, tuple]]) -> None:
+        """Run statements in one transaction on the writer connection."""
+        conn = self._writer
+        if conn is None:
+            raise RuntimeError("State database is not open; call load() first")
+        conn.execute("BEGIN")
+        try:
+            for sql, params in statements:
+                conn.execute(sql, params)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._writes_performed += 1
+
+    def _persist(self, op: str, record: dict[str, Any]) -> None:
+        """Queue the record's SQL on the writer thread (or run it inline)."""
+        self._writes_requested += 1
+        statements = self._statements(op, record)
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._execute(statements)
+            return
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="state-sqlite")
+        future = self._executor.submit(self._execute, statements)
+        future.add_done_callback(self._log_write_error)
+        self._last_write = future
+
+    def _persist_deferred(self, op: str, record: dict[str, Any]) -> None:
+        """Queue the deferred record like any other."""
+        self._persist(op, record)
+
+    @staticmethod
+    def _log_write_error(future: Future) -> None:
+        """Report failures of fire-and-forget writes."""
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("State database write failed: %s", future.exception())
+
+    def import_state(self, state: BotState) -> None:
+        """Replace the database contents with a full BotState (migration)."""
+        statements: list[tuple[str, tuple]] = [
+            ("DELETE FROM meta", ()),
+            ("DELETE FROM pending_verifications", ()),
+            ("DELETE FROM users", ()),
+            ("DELETE FROM chats", ()),
+            ("DELETE FROM jobs", ()),
+        ]
+        if state.auto_context_id:
+            statements += self._statements("set_auto_context_id", {"context_id": state.auto_context_id})
+        if state.last_update_id is not None:
+            statements += self._statements("set_update_offset", {"update_id": state.last_update_id})
+        for pv in state.pending_verifications.values():
+            statements += self._statements("add_pending", {
+                "code": pv.code, "user_id": pv.user_id,
+                "username": pv.username, "created_at": pv.created_at.isoformat(),
+            })
+        for user_id, user in state.users.items():
+            statements.append((_UPSERT_USER, (user_id, user.context_id, user.project)))
+            for chat in user.chats:
+                statements += self._statements("add_chat", {
+                    "user_id": user_id, "context_id": chat.context_id, "project": chat.project,
+                })
+        for job in state.jobs.values():
+            statements += self._statements("add_job", {
+                "job_id": job.job_id, "chat_id": job.chat_id, "user_id": job.user_id,
+                "message": job.message, "processing_message_id": job.processing_message_id,
+                "created_at": job.created_at.isoformat(),
+            })
+            statements += self._statements("set_job_status", {
+                "job_id": job.job_id, "status": job.status,
+            })
+
+        self.save()
+        self._execute(statements)
+        self.load()
+
+    def save(self) -> None:
+        """Block until every queued write has been committed."""
+        future, self._last_write = self._last_write, None
+        if future is not None:
+            # Failures were already reported by _log_write_error
+            future.exception()
+
+    async def flush(self) -> None:
+        """Wait until every queued write has been committed."""
+        future, self._last_write = self._last_write, None
+        if future is not None:
+            await asyncio.wait([asyncio.wrap_future(future)])
+
+    async def close(self) -> None:
+        """Drain queued writes and close the database."""
+        await self._close_deferred()
+        await self.flush()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for conn in (self._reader, self._writer):
+            if conn is not None:
+                conn.close()
+        self._reader = self._writer = None
@@ -0,0 +1,120 @@
+"""A stub Agent Zero server for tests, served by aiohttp on localhost."""
+
+import asyncio
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable
+
+from aiohttp import web
+
+Handler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+
+class StubA0:
+    """Answers /api_message, creating a context when none is given.
+
+    Args:
+        delay: Seconds each /api_message call takes, so concurrent
+            requests overlap.
+    """
+
+    def __init__(self, delay: float = 0.05) -> None:
+        self.delay = delay
+        self.calls = 0
+        self.active = 0
+        self.active_max = 0
+        self.contexts: list[str] = []
+        self._ids = itertools.count(1)
+
+    async def api_message(self, request: web.Request) -> web.Response:
+        self.calls += 1
+        self.active += 1
+        self.active_max = max(self.active_max, self.active)
+        body = await request.json()
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        context_id = body.get("context_id")
+        if not context_id:
+            context_id = f"ctx-{next(self._ids)}"
+            self.contexts.append(context_id)
+        return web.json_response({"context_id": context_id, "response": f"echo: {body['message']}"})
+
+
+class StubLog:
+    """Answers /api_log_get from a script of log entries that change over time.
+
+    Args:
+        script: ``(seconds, entry)`` pairs in time order, counted from the
+            first poll. Each poll gets the latest entry that is due: a
+            string is served as the log's ``progress`` line, an int as
+            an HTTP error status.
+    """
+
+    def __init__(self, script: list[tuple[float, str | int]]) -> None:
+        self.script = script
+        self.polls: list[float] = []
+
+    async def api_log_get(self, request: web.Request) -> web.Response:
+        now = time.monotonic()
+        self.polls.append(now)
+        elapsed = now - self.polls[0]
+        entry = self.script[0][1]
+        for at, scripted in self.script:
+            if at > elapsed:
+                break
+            entry = scripted
+        if isinstance(entry, int):
+            return web.json_response({"error": "scripted"}, status=entry)
+        return web.json_response({"log": {"progress": entry, "progress_active": True, "items": []}})
+
+
+@asynccontextmanager
+async def serve(routes: dict[str, Handler]) -> AsyncIterator[str]:
+    """Serve ``routes`` (path -> POST/GET handler) and yield the base URL."""
+    app = web.Application()
+    for path, handler in routes.items():
+        app.router.add_route("*", path, handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        await runner.cleanup()
+
+
+class FlappingServer:
+    """A stub A0 that can be taken down and brought back on the same port.
+
+    Args:
+        routes: Path -> handler, as for ``serve()``.
+    """
+
+    def __init__(self, routes: dict[str, Handler]) -> None:
+        self._routes = routes
+        self._runner: web.AppRunner | None = None
+        self.port = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def up(self) -> None:
+        app = web.Application()
+        for path, handler in self._routes.items():
+            app.router.add_route("*", path, handler)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", self.port, reuse_address=True)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def down(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,178 @@
+"""Retries and circuit breaking against unreachable and flapping servers."""
+
+import asyncio
+import socket
+import time
+
+import pytest
+from aiohttp import web
+
+from bot.a0_client import A0APIError, A0CircuitOpenError, A0Client, A0ConnectionError
+from tests.stub_a0 import FlappingServer, StubA0, serve
+
+
+def _blackhole() -> tuple[socket.socket, list[socket.socket]]:
+    """A listener whose accept queue is full, so new connects hang."""
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(0)
+    fillers = []
+    for _ in range(4):
+        filler = socket.socket()
+        filler.setblocking(False)
+        try:
+            filler.connect(listener.getsockname())
+        except BlockingIOError:
+            pass
+        fillers.append(filler)
+    return listener, fillers
+
+
+def _client(base_url: str, **kwargs) -> A0Client:
+    kwargs.setdefault("retries", 0)
+    kwargs.setdefault("retry_backoff", 0.01)
+    return A0Client(base_url, "key", **kwargs)
+
+
+def test_connect_timeout_is_retried_and_opens_breaker():
+    listener, fillers = _blackhole()
+    port = listener.getsockname()[1]
+
+    async def _run():
+        client = _client(
+            f"http://127.0.0.1:{port}", connect_timeout=0.2, retries=2, breaker_threshold=3,
+        )
+        try:
+            with pytest.raises(A0ConnectionError) as raised:
+                await client.send_message("hello")
+            assert raised.value.connect_failed
+            assert client.stats["retries"] == 2
+            assert client.breaker_state == "open"
+        finally:
+            await client.close()
+
+    try:
+        asyncio.run(_run())
+    finally:
+        for sock in [listener, *fillers]:
+            sock.close()
+
+
+def test_breaker_follows_a_flapping_server():
+    stub = StubA0(delay=0)
+    server = FlappingServer({"/api_message": stub.api_message})
+
+    async def _run():
+        await server.up()
+        client = _client(server.base_url, breaker_threshold=2, breaker_reset_timeout=0.2)
+        try:
+            assert (await client.send_message("up"))["response"] == "echo: up"
+
+            await server.down()
+            for _ in range(2):
+                with pytest.raises(A0ConnectionError):
+                    await client.send_message("down")
+            assert client.breaker_state == "open"
+            with pytest.raises(A0CircuitOpenError):
+                await client.send_message("fail fast")
+
+            await server.up()
+            await asyncio.sleep(0.25)
+            assert (await client.send_message("back"))["response"] == "echo: back"
+            assert client.breaker_state == "closed"
+
+            await server.down()
+            for _ in range(2):
+                with pytest.raises(A0ConnectionError):
+                    await client.send_message("down again")
+            assert client.breaker_state == "open"
+            assert client.stats["breaker_opens"] == 2
+        finally:
+            await client.close()
+            await server.down()
+
+    asyncio.run(_run())
+
+
+def test_retries_ride_out_a_short_outage():
+    stub = StubA0(delay=0)
+    server = FlappingServer({"/api_message": stub.api_message})
+
+    async def _run():
+        await server.up()
+        await server.down()
+        client = _client(server.base_url, retries=6, retry_backoff=0.05, retry_backoff_max=0.1)
+
+        async def _come_back():
+            await asyncio.sleep(0.1)
+            await server.up()
+
+        revive = asyncio.create_task(_come_back())
+        try:
+            assert (await client.send_message("hello"))["response"] == "echo: hello"
+            assert client.stats["retries"] >= 1
+        finally:
+            await revive
+            await client.close()
+            await server.down()
+
+    asyncio.run(_run())
+
+
+def test_cancelled_probe_lets_the_next_request_probe():
+    stub = StubA0(delay=0.5)
+    server = FlappingServer({"/api_message": stub.api_message})
+
+    async def _run():
+        await server.up()
+        port = server.port
+        await server.down()
+        client = _client(server.base_url, breaker_threshold=1, breaker_reset_timeout=0.1)
+        try:
+            with pytest.raises(A0ConnectionError):
+                await client.send_message("down")
+            assert client.breaker_state == "open"
+
+            server.port = port
+            await server.up()
+            await asyncio.sleep(0.15)
+            probe = asyncio.create_task(client.send_message("slow probe"))
+            await asyncio.sleep(0.1)
+            probe.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await probe
+
+            stub.delay = 0
+            started = time.monotonic()
+            assert (await client.send_message("next"))["response"] == "echo: next"
+            assert time.monotonic() - started < 0.5
+            assert client.breaker_state == "closed"
+        finally:
+            await client.close()
+            await server.down()
+
+    asyncio.run(_run())
+
+
+def test_gateway_timeout_is_not_retried_by_default():
+    calls = {503: 0, 504: 0}
+
+    def _answer(status):
+        async def _handler(request: web.Request) -> web.Response:
+            calls[status] += 1
+            return web.Response(status=status)
+        return _handler
+
+    async def _run():
+        async with serve({"/api_message": _answer(503)}) as unavailable, \
+                serve({"/api_message": _answer(504)}) as gateway_timeout:
+            for base_url in (unavailable, gateway_timeout):
+                client = A0Client(base_url, "key", retries=2, retry_backoff=0.01)
+                try:
+                    with pytest.raises(A0APIError):
+                        await client.send_message("hello")
+                finally:
+                    await client.close()
+
+    asyncio.run(_run())
+    assert calls == {503: 3, 504: 1}
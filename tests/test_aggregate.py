@@ -0,0 +1,50 @@
+"""Merging the texts of a message burst."""
+
+from types import SimpleNamespace
+
+from bot.aggregate import CLIENT_SPLIT_LENGTH, merge_texts
+
+
+def _messages(*texts):
+    return [SimpleNamespace(text=text) for text in texts]
+
+
+def test_follow_ups_are_joined_by_newlines():
+    assert merge_texts(_messages("first", "second", "third")) == "first\nsecond\nthird"
+
+
+def _utf16_len(text):
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _client_split(paste):
+    """Split like a Telegram client: at the last space within the limit, trimmed."""
+    limit = CLIENT_SPLIT_LENGTH
+    while _utf16_len(paste[:limit]) > CLIENT_SPLIT_LENGTH:
+        limit -= 1
+    cut = paste.rindex(" ", 0, limit)
+    return paste[:cut].strip(), paste[cut:].strip()
+
+
+def test_client_split_paste_is_rejoined_at_the_word_break():
+    paste = ("word " * 3000).strip()
+    first, second = _client_split(paste)
+
+    assert merge_texts(_messages(first, second)) == paste
+
+
+def test_split_length_counts_utf16_units():
+    paste = " ".join(["😀" * 9] * 400)  # two UTF-16 units per emoji
+    first, second = _client_split(paste)
+    assert len(first) < CLIENT_SPLIT_LENGTH - 64  # short in code points
+
+    assert merge_texts(_messages(first, second)) == paste
+
+
+def test_follow_up_after_split_paste_starts_a_new_line():
+    first = "x" * CLIENT_SPLIT_LENGTH
+    assert merge_texts(_messages(first, "tail", "question?")) == first + " tail\nquestion?"
+
+
+def test_messages_without_text_are_skipped():
+    assert merge_texts(_messages(None, "a", "", "b")) == "a\nb"
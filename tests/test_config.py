@@ -0,0 +1,34 @@
+"""Configuration validation."""
+
+import pydantic
+import pytest
+
+from bot.config import BotConfig
+
+
+def _raw(**overrides) -> dict:
+    return {
+        "telegram": {"bot_token": "0:test"},
+        "agent_zero": {"api_key": "key"},
+        **overrides,
+    }
+
+
+def test_polling_needs_no_webhook_secret():
+    assert BotConfig.model_validate(_raw()).webhook.secret_token is None
+
+
+def test_webhook_mode_requires_a_secret_token():
+    with pytest.raises(pydantic.ValidationError, match="secret_token"):
+        BotConfig.model_validate(_raw(run_mode="webhook"))
+
+
+def test_webhook_mode_with_secret_token():
+    config = BotConfig.model_validate(_raw(run_mode="webhook", webhook={"secret_token": "s3cr-et_"}))
+    assert config.webhook.secret_token == "s3cr-et_"
+
+
+@pytest.mark.parametrize("secret", ["", "has space", "x" * 257, "quote\""])
+def test_secret_token_must_be_accepted_by_telegram(secret):
+    with pytest.raises(pydantic.ValidationError):
+        BotConfig.model_validate(_raw(run_mode="webhook", webhook={"secret_token": secret}))
@@ -0,0 +1,95 @@
+"""Context creation is single-flight under concurrent first messages."""
+
+import asyncio
+
+import pytest
+
+from bot.a0_client import A0Client
+from bot.config import AgentZeroConfig, BotConfig, TelegramConfig
+from bot.contexts import ContextRouter
+from bot.dispatch import ContextDispatcher
+from bot.fair import FairScheduler
+from bot.relay import relay_to_a0
+from bot.state import StateManager
+from tests.stub_a0 import StubA0, serve
+
+MESSAGES = 50
+
+
+def _config(context_mode: str, base_url: str) -> BotConfig:
+    return BotConfig(
+        telegram=TelegramConfig(bot_token="0:test"),
+        agent_zero=AgentZeroConfig(host=base_url, api_key="key", context_mode=context_mode),
+    )
+
+
+async def _first_messages(tmp_path, context_mode: str, senders: list[int]) -> tuple[StubA0, StateManager, list[dict]]:
+    stub = StubA0(delay=0.02)
+    state_manager = StateManager(tmp_path / "state.json")
+    router = ContextRouter(state_manager)
+    dispatcher = ContextDispatcher(max_depth=0)
+    scheduler = FairScheduler(max_in_flight=8, user_backlog=0)
+    async with serve({"/api_message": stub.api_message}) as base_url:
+        config = _config(context_mode, base_url)
+        client = A0Client(config.agent_zero.base_url, "key")
+        try:
+            results = await asyncio.gather(*(
+                relay_to_a0(f"hello {i}", user_id, config, client, router, dispatcher, scheduler)
+                for i, user_id in enumerate(senders)
+            ))
+        finally:
+            await client.close()
+    return stub, state_manager, results
+
+
+@pytest.mark.parametrize("context_mode", ["shared", "per_user"])
+def test_concurrent_first_messages_create_one_context(tmp_path, context_mode):
+    stub, state_manager, results = asyncio.run(
+        _first_messages(tmp_path, context_mode, [42] * MESSAGES)
+    )
+
+    assert stub.calls == MESSAGES
+    assert len(stub.contexts) == 1
+    assert {r["context_id"] for r in results} == set(stub.contexts)
+    if context_mode == "per_user":
+        assert state_manager.get_user(42).context_id == stub.contexts[0]
+    else:
+        assert state_manager.get_auto_context_id() == stub.contexts[0]
+
+
+def test_per_user_contexts_are_created_once_per_user(tmp_path):
+    senders = [user_id for user_id in range(1, 6) for _ in range(MESSAGES // 5)]
+    stub, state_manager, results = asyncio.run(_first_messages(tmp_path, "per_user", senders))
+
+    assert len(stub.contexts) == 5
+    for user_id in range(1, 6):
+        assert state_manager.get_user(user_id).context_id in stub.contexts
+
+
+async def _routed_without_queue(tmp_path) -> tuple[StubA0, StateManager]:
+    """Hit the router directly, without the per-conversation queue in front."""
+    stub = StubA0(delay=0.02)
+    state_manager = StateManager(tmp_path / "state.json")
+    router = ContextRouter(state_manager)
+
+    async with serve({"/api_message": stub.api_message}) as base_url:
+        config = _config("shared", base_url)
+        client = A0Client(config.agent_zero.base_url, "key")
+
+        async def _send(i: int) -> None:
+            async with router.acquire(config, 42) as (context_id, _):
+                result = await client.send_message(f"hello {i}", context_id=context_id)
+                router.remember(config, 42, result["context_id"], None)
+
+        try:
+            await asyncio.gather(*(_send(i) for i in range(MESSAGES)))
+        finally:
+            await client.close()
+    return stub, state_manager
+
+
+def test_router_single_flight_without_queue(tmp_path):
+    stub, state_manager = asyncio.run(_routed_without_queue(tmp_path))
+
+    assert stub.calls == MESSAGES
+    assert stub.contexts == [state_manager.get_auto_context_id()]
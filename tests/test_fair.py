@@ -0,0 +1,83 @@
+"""Fair sharing of A0 capacity, behind the per-conversation queue."""
+
+import asyncio
+
+import pytest
+
+from bot.a0_client import A0Client
+from bot.config import AgentZeroConfig, BotConfig, TelegramConfig
+from bot.contexts import ContextRouter
+from bot.dispatch import ContextDispatcher
+from bot.fair import FairScheduler, UserBacklogFullError
+from bot.relay import relay_to_a0
+from bot.state import StateManager
+from tests.stub_a0 import StubA0, serve
+
+
+async def _relay_all(tmp_path, scheduler: FairScheduler, messages: list[tuple[int, float]]) -> tuple[StubA0, list]:
+    """Send (user_id, start delay) messages in per_user mode; return results in order of completion."""
+    stub = StubA0(delay=0.1)
+    router = ContextRouter(StateManager(tmp_path / "state.json"))
+    dispatcher = ContextDispatcher(max_depth=0)
+    finished: list = []
+
+    async with serve({"/api_message": stub.api_message}) as base_url:
+        config = BotConfig(
+            telegram=TelegramConfig(bot_token="0:test"),
+            agent_zero=AgentZeroConfig(host=base_url, api_key="key", context_mode="per_user"),
+        )
+        client = A0Client(config.agent_zero.base_url, "key")
+
+        async def _send(user_id: int, delay: float) -> None:
+            await asyncio.sleep(delay)
+            try:
+                await relay_to_a0("hi", user_id, config, client, router, dispatcher, scheduler)
+                finished.append(user_id)
+            except UserBacklogFullError as e:
+                finished.append(e)
+
+        try:
+            await asyncio.gather(*(_send(user_id, delay) for user_id, delay in messages))
+        finally:
+            await client.close()
+    return stub, finished
+
+
+def test_queued_messages_do_not_hold_capacity(tmp_path):
+    scheduler = FairScheduler(max_in_flight=2, user_backlog=0)
+    # User 1 queues five messages on their conversation; user 2 arrives just after
+    messages = [(1, 0.0)] * 5 + [(2, 0.01)]
+
+    stub, finished = asyncio.run(_relay_all(tmp_path, scheduler, messages))
+
+    # Only one of user 1's messages can run at a time, so user 2 got the
+    # second slot at once and finished right after user 1's first message
+    assert finished.index(2) <= 1
+    assert scheduler.stats["in_flight_max"] == stub.active_max == 2
+    assert scheduler.stats["outstanding"] == 0
+
+
+def test_backlog_counts_queued_and_running_messages(tmp_path):
+    scheduler = FairScheduler(max_in_flight=8, user_backlog=3)
+
+    stub, finished = asyncio.run(_relay_all(tmp_path, scheduler, [(1, 0.0)] * 5))
+
+    shed = [r for r in finished if isinstance(r, UserBacklogFullError)]
+    assert len(shed) == 2
+    assert stub.calls == 3
+    assert scheduler.stats["shed"] == 2
+
+
+def test_backlog_frees_up_as_messages_finish():
+    async def _run():
+        scheduler = FairScheduler(max_in_flight=1, user_backlog=1)
+        async with scheduler.admit(1):
+            with pytest.raises(UserBacklogFullError):
+                async with scheduler.admit(1):
+                    pass
+            async with scheduler.admit(2):
+                pass
+        async with scheduler.admit(1):
+            return scheduler.stats
+
+    assert asyncio.run(_run())["outstanding"] == 1
@@ -0,0 +1,90 @@
+"""Golden-corpus tests for the markdown formatter.
+
+Every ``tests/golden/**/<name>.md`` is formatted and compared with
+``<name>.html``: the expected chunks, separated by CHUNK_SEPARATOR. The
+cases in ``golden/intentional/`` are where the output deliberately
+changed from the previous formatter, whose output is kept next to them
+as ``<name>.previous.html``; INTENTIONAL_DIFFS says why for each.
+
+After an intended change of output, rewrite the expected files with
+
+    python -m tests.test_formatters --regenerate
+
+and review the diff.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from bot.formatters import format_response, repair_html
+
+GOLDEN = Path(__file__).parent / "golden"
+CHUNK_SEPARATOR = "\n<!-- message break -->\n"
+
+INTENTIONAL_DIFFS = {
+    "bold_italic": "***x*** rendered <b><i>x</b></i>, which is misnested; delimiters now pair "
+                   "with a stack, so the unmatched * stays text",
+    "code_span_across_block": "an inline code span was paired across a fenced block, putting <pre> inside <code>",
+    "emphasis_in_url": "emphasis inside a link target rendered tags inside href",
+    "emphasis_across_link": "bold opened in link text and closed after it, misnesting <b> and <a>",
+    "empty_quote": "an empty quote rendered <blockquote></blockquote>, and the message was empty",
+    "empty_code_block": "an empty fence rendered <pre><code></code></pre>, and the message was empty",
+    "quote_in_url": "a \" in a link target ended the href attribute early; it is now &quot;",
+}
+
+CASES = sorted(GOLDEN.rglob("*.md"))
+
+
+def _render(markdown: str) -> str:
+    return CHUNK_SEPARATOR.join(format_response(markdown))
+
+
+def _expected(case: Path) -> str:
+    return case.with_suffix(".html").read_text(encoding="utf-8")
+
+
+@pytest.mark.parametrize("case", CASES, ids=lambda case: case.stem)
+def test_matches_golden_output(case):
+    assert _render(case.read_text(encoding="utf-8")) == _expected(case)
+
+
+@pytest.mark.parametrize("case", CASES, ids=lambda case: case.stem)
+def test_chunks_need_no_repair(case):
+    for chunk in format_response(case.read_text(encoding="utf-8")):
+        assert repair_html(chunk) == (chunk, [])
+
+
+def test_every_intentional_diff_is_documented():
+    cases = {case.stem for case in (GOLDEN / "intentional").glob("*.md")}
+    assert cases == set(INTENTIONAL_DIFFS)
+    for name in cases:
+        case = GOLDEN / "intentional" / f"{name}.md"
+        previous = case.with_suffix(".previous.html").read_text(encoding="utf-8")
+        assert previous != _expected(case)
+
+
+@pytest.mark.parametrize("markdown", [
+    "[a](b " * 15000,
+    "[a](b" * 15000,
+    "![x](" * 20000,
+    "[" * 100000,
+], ids=["unclosed_urls", "unclosed_urls_no_space", "unclosed_images", "open_brackets"])
+def test_unclosed_links_format_in_linear_time(markdown):
+    started = time.perf_counter()
+    chunks = format_response(markdown)
+    assert time.perf_counter() - started < 1.0
+    assert "<a " not in "".join(chunks)
+
+
+def _regenerate() -> None:
+    for case in CASES:
+        case.with_suffix(".html").write_text(_render(case.read_text(encoding="utf-8")), encoding="utf-8")
+        print(f"wrote {case.with_suffix('.html').relative_to(GOLDEN)}")
+
+
+if __name__ == "__main__":
+    if "--regenerate" in sys.argv:
+        _regenerate()
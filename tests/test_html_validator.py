@@ -0,0 +1,88 @@
+"""Local repair and splitting of HTML chunks before they are sent."""
+
+import html
+import re
+
+import pytest
+
+from bot.formatters import HtmlValidator, repair_html
+
+
+def _text(chunk: str) -> str:
+    """The text of a chunk as Telegram shows it."""
+    return html.unescape(re.sub(r"<[^>]*>", "", chunk))
+
+
+def _text_length(chunk: str) -> int:
+    """Length of a chunk's text in UTF-16 code units, as Telegram counts it."""
+    return len(_text(chunk).encode("utf-16-le")) // 2
+
+
+@pytest.mark.parametrize("broken, repaired, problems", [
+    ("<b>bold <i>both</b> italic</i>",
+     "<b>bold <i>both</i></b><i> italic</i>", ["misnested </b>"]),
+    ("<div>x</div> <span>y</span>",
+     "x y", ["unsupported tag <div>", "<span> without class=tg-spoiler"]),
+    ("a</b>c", "ac", ["stray </b>"]),
+    ("<b>open", "<b>open</b>", ["unclosed <b>"]),
+    ("x &nbsp; &foo; &amp; &#65;",
+     "x \xa0 &amp;foo; &amp; &#65;", ["unsupported entity &nbsp;", "unsupported entity &foo;"]),
+    ("a < b & c > d",
+     "a &lt; b &amp; c &gt; d", ["unescaped <", "unescaped &", "unescaped >"]),
+    ("<code><b>x</b></code>", "<code>x</code>", ["<b> inside <code>"]),
+    ("<a>no href</a>", "no href", ["link without a valid href"]),
+    ('<a href="u"><a href="v">x</a></a>', '<a href="u">x</a>', ["nested <a>"]),
+], ids=["misnested", "unknown_tags", "stray_close", "unclosed", "bad_entities",
+        "bare_specials", "tag_in_code", "link_without_href", "nested_links"])
+def test_repair_fixes_broken_html(broken, repaired, problems):
+    assert repair_html(broken) == (repaired, problems)
+    assert repair_html(repaired) == (repaired, [])
+
+
+def test_valid_html_is_returned_unchanged():
+    chunk = '<b>bold</b> <a href="https://x.y/?a=1&amp;b=2">link</a> &lt;tag&gt; <tg-spoiler>s</tg-spoiler>'
+    assert repair_html(chunk) == (chunk, [])
+
+
+def test_prepare_passes_short_valid_chunks_through():
+    validator = HtmlValidator(max_length=50)
+
+    assert validator.prepare("<b>short</b>") == ["<b>short</b>"]
+    assert validator.stats == {"checked": 1, "repaired": 0, "split": 0, "fallbacks": 0, "truncated": 0}
+
+
+@pytest.mark.parametrize("chunk", [
+    "<b>" + "word " * 30 + "</b>",
+    "<i>" + "😀 " * 40 + "</i>",
+], ids=["ascii", "astral"])
+def test_prepare_splits_over_long_chunks(chunk):
+    validator = HtmlValidator(max_length=50)
+    parts = validator.prepare(chunk)
+
+    assert len(parts) > 1
+    assert all(_text_length(part) <= 50 for part in parts)
+    assert all(repair_html(part) == (part, []) for part in parts)
+    assert "".join(map(_text, parts)).split() == _text(chunk).split()
+    assert validator.stats["split"] == 1
+    assert validator.stats["repaired"] == 0
+
+
+def test_prepare_repairs_then_splits_and_counts_both():
+    validator = HtmlValidator(max_length=50)
+    parts = validator.prepare("<b>" + "a < b " * 20)
+
+    assert len(parts) > 1
+    assert all(_text_length(part) <= 50 for part in parts)
+    assert all(repair_html(part) == (part, []) for part in parts)
+    assert validator.stats == {"checked": 1, "repaired": 1, "split": 1, "fallbacks": 0, "truncated": 0}
+
+
+def test_fallbacks_and_truncations_are_counted():
+    validator = HtmlValidator()
+    validator.record_fallback()
+    validator.record_fallback()
+    validator.record_truncation()
+
+    assert validator.stats["fallbacks"] == 2
+    assert validator.stats["truncated"] == 1
+    assert validator.stats["checked"] == 0
@@ -0,0 +1,54 @@
+"""Outbound scheduling order within a chat."""
+
+import asyncio
+
+from aiogram.methods import EditMessageText, SendMessage
+
+from bot.middleware.outbound import OutboundScheduler
+
+LONG = "x" * 1000
+
+
+async def _send_all(methods) -> list[str]:
+    """Queue ``methods`` behind a slow first send to one chat; return the send order."""
+    scheduler = OutboundScheduler(chat_rate=0, priority_max_length=500)
+    sent: list[str] = []
+
+    async def _make_request(bot, method):
+        await asyncio.sleep(0.05)
+        sent.append(method.text)
+
+    async def _send(method):
+        await scheduler(_make_request, None, method)
+
+    try:
+        first = asyncio.create_task(_send(SendMessage(chat_id=1, text="first")))
+        await asyncio.sleep(0.01)
+        queued = []
+        for method in methods:
+            queued.append(asyncio.create_task(_send(method)))
+            await asyncio.sleep(0)
+        await asyncio.gather(first, *queued)
+    finally:
+        await scheduler.close()
+    return sent
+
+
+def test_short_reply_goes_before_long_chunks_of_the_same_chat():
+    sent = asyncio.run(_send_all([
+        SendMessage(chat_id=1, text=LONG + "1"),
+        SendMessage(chat_id=1, text=LONG + "2"),
+        SendMessage(chat_id=1, text="short"),
+    ]))
+
+    assert sent == ["first", "short", LONG + "1", LONG + "2"]
+
+
+def test_edits_of_one_message_keep_their_order():
+    sent = asyncio.run(_send_all([
+        EditMessageText(chat_id=1, message_id=7, text=LONG),
+        EditMessageText(chat_id=1, message_id=7, text="done"),
+        EditMessageText(chat_id=1, message_id=8, text="other"),
+    ]))
+
+    assert sent == ["first", "other", LONG, "done"]
@@ -0,0 +1,88 @@
+"""Progress polling: edit throttling, unchanged steps and error backoff."""
+
+import asyncio
+import time
+
+from bot.a0_client import A0Client
+from bot.config import AgentZeroConfig, BotConfig, TelegramConfig
+from bot.progress import ProgressStreamer
+from tests.stub_a0 import StubLog, serve
+
+
+class _Bot:
+    """Records message edits and when they happened."""
+
+    def __init__(self) -> None:
+        self.edits: list[tuple[float, str]] = []
+
+    async def edit_message_text(self, text: str, **kwargs) -> None:
+        self.edits.append((time.monotonic(), text))
+
+
+def _config(base_url: str, **agent_zero) -> BotConfig:
+    agent_zero.setdefault("progress_poll_ms", 100)
+    agent_zero.setdefault("progress_poll_max_ms", 800)
+    agent_zero.setdefault("progress_edit_interval_ms", 0)
+    return BotConfig(
+        telegram=TelegramConfig(bot_token="0:test"),
+        agent_zero=AgentZeroConfig(host=base_url, api_key="key", progress_updates=True, **agent_zero),
+    )
+
+
+async def _follow(log: StubLog, seconds: float, **agent_zero) -> tuple[ProgressStreamer, _Bot, bool]:
+    """Follow the stub's log for up to ``seconds``; report whether it stopped on its own."""
+    bot = _Bot()
+    async with serve({"/api_log_get": log.api_log_get}) as base_url:
+        config = _config(base_url, **agent_zero)
+        client = A0Client(config.agent_zero.base_url, "key")
+        streamer = ProgressStreamer(client)
+        task = asyncio.create_task(streamer.follow("ctx-1", bot, 1, 10, config))
+        try:
+            done, _ = await asyncio.wait({task}, timeout=seconds)
+            if not done:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+            else:
+                task.result()
+        finally:
+            await client.close()
+    return streamer, bot, bool(done)
+
+
+def test_unchanged_step_is_edited_once_and_polling_slows_down():
+    log = StubLog([(0, "Searching the web")])
+    streamer, bot, stopped = asyncio.run(_follow(log, 1.5))
+
+    assert not stopped
+    assert [text for _, text in bot.edits] == ["⏳ Processing...\n\n<i>Searching the web</i>"]
+    assert streamer.stats["unchanged"] == len(log.polls) - 1 >= 2
+    gaps = [b - a for a, b in zip(log.polls, log.polls[1:])]
+    assert gaps[-1] > gaps[0] * 2
+    assert streamer.stats["active"] == 0
+
+
+def test_edits_are_throttled_while_steps_change():
+    log = StubLog([(i * 0.05, f"step {i}") for i in range(60)])
+    streamer, bot, _ = asyncio.run(_follow(log, 1.5, progress_edit_interval_ms=400))
+
+    stats = streamer.stats
+    assert stats["unchanged"] == 0
+    assert stats["throttled"] > 0
+    assert 2 <= stats["edits"] == len(bot.edits) <= 4
+    assert stats["edits"] + stats["throttled"] == stats["polls"]
+    times = [at for at, _ in bot.edits]
+    assert all(b - a >= 0.35 for a, b in zip(times, times[1:]))
+
+
+def test_errors_back_off_then_missing_log_api_stops_cleanly():
+    log = StubLog([(0, 500), (1.0, 404)])
+    streamer, bot, stopped = asyncio.run(_follow(log, 5))
+
+    assert stopped
+    assert bot.edits == []
+    stats = streamer.stats
+    assert stats["poll_errors"] == len(log.polls) - 1 == 3
+    assert stats["polls"] == 0
+    assert stats["active"] == 0
+    gaps = [b - a for a, b in zip(log.polls, log.polls[1:])]
+    assert all(later > earlier * 1.5 for earlier, later in zip(gaps, gaps[1:]))
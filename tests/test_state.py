@@ -0,0 +1,109 @@
+"""Persistence of the per-update offset and ordering of state writes."""
+
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from bot import state as state_module
+from bot.state import StateManager
+from bot.state_journal import JournalStateManager
+from bot.state_sqlite import SqliteStateManager
+
+UPDATES = 200
+
+
+@pytest.fixture(autouse=True)
+def _short_deferral(monkeypatch):
+    monkeypatch.setattr(state_module, "DEFERRED_FLUSH_SECONDS", 0.05)
+
+
+async def _record_offsets(state_manager: StateManager) -> dict[str, int]:
+    for update_id in range(1000, 1000 + UPDATES):
+        state_manager.set_update_offset(update_id)
+    during = dict(state_manager.stats)
+    await asyncio.sleep(0.2)
+    return during
+
+
+def test_json_offset_is_not_written_per_update(tmp_path):
+    sm = StateManager(tmp_path / "state.json")
+
+    async def _run():
+        during = await _record_offsets(sm)
+        after = dict(sm.stats)
+        await sm.close()
+        return during, after
+
+    during, after = asyncio.run(_run())
+
+    assert during["writes_performed"] == 0
+    assert after["writes_performed"] == 1
+    saved = json.loads((tmp_path / "state.json").read_text())
+    assert saved["last_update_id"] == 1000 + UPDATES - 1
+
+
+@pytest.mark.parametrize("backend", [JournalStateManager, SqliteStateManager])
+def test_change_based_backends_persist_the_latest_offset_once(tmp_path, backend):
+    sm = backend(tmp_path / "state.db")
+    sm.load()
+
+    async def _run():
+        during = await _record_offsets(sm)
+        await sm.close()
+        return during
+
+    during = asyncio.run(_run())
+    assert during["writes_requested"] == 0
+
+    reloaded = backend(tmp_path / "state.db")
+    reloaded.load()
+    assert reloaded.get_update_offset() == 1000 + UPDATES - 1
+
+
+def test_close_persists_a_pending_offset(tmp_path):
+    sm = StateManager(tmp_path / "state.json")
+
+    async def _run():
+        sm.set_update_offset(5)
+        await sm.close()
+
+    asyncio.run(_run())
+    assert json.loads((tmp_path / "state.json").read_text())["last_update_id"] == 5
+
+
+def test_offset_is_saved_at_once_without_a_loop(tmp_path):
+    sm = StateManager(tmp_path / "state.json")
+    sm.set_update_offset(5)
+    assert sm.stats["writes_performed"] == 1
+
+
+class _SlowExecutorWrites(StateManager):
+    """Writes from executor threads stall, so a later synchronous save finishes first."""
+
+    def _write(self, version, data):
+        if threading.current_thread() is not threading.main_thread():
+            time.sleep(0.2)
+        super()._write(version, data)
+
+
+@pytest.mark.parametrize("close_early", [False, True])
+def test_stale_executor_write_never_replaces_a_newer_save(tmp_path, close_early):
+    sm = _SlowExecutorWrites(tmp_path / "state.json")
+
+    async def _run():
+        sm.set_update_offset(5)
+        await asyncio.sleep(0.1)  # the deferred flush is now writing in a thread
+        sm.set_user_context(7, "ctx-7")
+        if not close_early:
+            await asyncio.sleep(0.3)
+        await sm.close()
+
+    asyncio.run(_run())
+
+    saved = json.loads((tmp_path / "state.json").read_text())
+    assert saved["users"]["7"]["context_id"] == "ctx-7"
+    assert saved["last_update_id"] == 5
+    assert list(tmp_path.glob("*.tmp")) == []